@@ -29,12 +29,38 @@ if __name__ == "__main__":
         result = unittest.TextTestRunner().run(suite)
         if not result.wasSuccessful():
             sys.exit(1)
+    elif "--benchmark" in sys.argv[1:]:
+        from rlprojectlib.benchmark import main
+        sys.exit(main(sys.argv[1:]))
     else:
         import os
         path = "rlproject.py"
+        trace_path = None
+        telemetry_path = None
+        root = None
         for arg in sys.argv[1:]:
-            if os.path.exists(arg):
+            if arg.startswith("--trace="):
+                trace_path = arg[len("--trace="):]
+            elif arg.startswith("--telemetry="):
+                telemetry_path = arg[len("--telemetry="):]
+            elif arg.startswith("--root="):
+                root = arg[len("--root="):]
+            elif os.path.exists(arg):
                 path = arg
         from rlprojectlib.drivers.wxterminal import WxTerminalDriver
         from rlprojectlib.projections.terminal.editor import Editor
-        WxTerminalDriver.run(Editor.create_driver(path))
+        from rlprojectlib.projections.trace import TRACER
+        driver = Editor.create_driver(
+            path,
+            journal="--journal" in sys.argv[1:],
+            root=root
+        )
+        if "--async" in sys.argv[1:]:
+            from rlprojectlib.drivers.document import AsyncDocumentProjectionDriver
+            driver = AsyncDocumentProjectionDriver(driver)
+        WxTerminalDriver.run(driver)
+        driver.close()
+        if trace_path:
+            TRACER.dump_chrome_trace(trace_path)
+        if telemetry_path:
+            driver.telemetry.export(telemetry_path)
@@ -0,0 +1,217 @@
+"""
+I replay scripted editing sessions through the HeadlessTerminalDriver and
+report latency per event type.
+
+Run with:
+
+    ./rlproject.py --benchmark [--sizes 1,10,100] [--save-baseline]
+
+Results are compared with a stored baseline (benchmark_baseline.json by
+default) and the exit code is non-zero if something got slower than the
+allowed tolerance.
+"""
+
+from collections import namedtuple
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from rlprojectlib.domains.generic import Selections
+from rlprojectlib.domains.string import Selection
+from rlprojectlib.domains.string import String
+from rlprojectlib.domains.terminal import Terminal
+from rlprojectlib.domains.terminal import TextFragment
+from rlprojectlib.drivers.document import DocumentProjectionDriver
+from rlprojectlib.drivers.headless import HeadlessTerminalDriver
+from rlprojectlib.drivers.telemetry import percentile
+from rlprojectlib.projections.terminal.editor import Editor
+from rlprojectlib.projections.terminal.split import Pane
+from rlprojectlib.projections.terminal.split import SplitIntoColumns
+from rlprojectlib.projections.terminal.split import SplitIntoRows
+from rlprojectlib.projections.trace import TRACER
+
+MB = 1024*1024
+
+class Summary(
+    namedtuple("Summary", "count p50 p99")
+):
+    pass
+
+class LatencyRecorder:
+
+    """
+    >>> recorder = LatencyRecorder()
+    >>> for _ in range(10):
+    ...     recorder.measure("noop", lambda: None)
+    >>> recorder.summary()["noop"].count
+    10
+    """
+
+    def __init__(self):
+        self.samples = {}
+
+    def measure(self, name, fn):
+        t1 = time.perf_counter_ns()
+        fn()
+        t2 = time.perf_counter_ns()
+        self.samples.setdefault(name, []).append(t2-t1)
+
+    def summary(self):
+        return {
+            name: Summary(
+                count=len(samples),
+                p50=percentile(samples, 0.50)/1e6,
+                p99=percentile(samples, 0.99)/1e6
+            )
+            for name, samples in self.samples.items()
+        }
+
+def generate_text(size):
+    """
+    >>> len(generate_text(1000))
+    1000
+    """
+    block = "".join(
+        f"{index:06d} the quick brown fox jumps over the lazy dog\n"
+        for index in range(20000)
+    )
+    return (block * (size // len(block) + 1))[:size]
+
+def editor_session(recorder, size):
+    name = f"{size // MB}MB"
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "document.txt")
+        with open(path, "w") as f:
+            f.write(generate_text(size))
+        drivers = []
+        recorder.measure(f"{name} open", lambda:
+            drivers.append(Editor.create_driver(path))
+        )
+    driver = HeadlessTerminalDriver(drivers[0], width=120, height=40)
+    for _ in range(100):
+        recorder.measure(f"{name} keyboard", lambda: driver.keyboard_event("x"))
+    for _ in range(50):
+        recorder.measure(f"{name} move", lambda: driver.keyboard_event("\x06"))
+    for _ in range(50):
+        recorder.measure(f"{name} page", lambda: driver.keyboard_event("\x00", "PAGE_DOWN"))
+    for width in range(80, 120):
+        recorder.measure(f"{name} size", lambda: driver.size_event(width, 40))
+
+def multi_cursor_session(recorder, cursors):
+    text = generate_text(MB)
+    step = len(text) // cursors
+    driver = HeadlessTerminalDriver(
+        DocumentProjectionDriver(
+            Editor.create_document(String.from_string(text)._replace(
+                selections=Selections(
+                    Selection(start=index*step, length=0)
+                    for index in range(cursors)
+                )
+            )),
+            Editor.project
+        ),
+        width=120,
+        height=40
+    )
+    name = f"{cursors} cursors"
+    for _ in range(20):
+        recorder.measure(f"{name} keyboard", lambda: driver.keyboard_event("x"))
+    recorder.measure(f"{name} paste 1MB", lambda: driver.text_event(text))
+    for _ in range(20):
+        recorder.measure(f"{name} move", lambda: driver.keyboard_event("\x06"))
+
+def split_session(recorder, depth):
+    terminal = Terminal.create(fragments=[
+        TextFragment(x=0, y=y, text=f"{y:03d} "*30)
+        for y in range(60)
+    ])
+    pane = Pane.create(terminal, active=True)
+    for level in range(depth):
+        split = SplitIntoRows if level % 2 else SplitIntoColumns
+        pane = Pane.create(
+            split.project_partial([pane, Pane.create(terminal)]),
+            active=True
+        )
+    for _ in range(50):
+        recorder.measure(f"split depth {depth}", lambda: SplitIntoRows.project(
+            [pane],
+            width=200,
+            height=60
+        ).get_rows())
+
+class Comparison(
+    namedtuple("Comparison", "p50 p99 regressed")
+):
+
+    """
+    Ratios of p50 and p99 to the baseline and whether either is more than
+    the tolerance slower.
+    """
+
+def compare(summary, baseline, tolerance):
+    """
+    >>> compare(
+    ...     {"a": Summary(1, 2.0, 2.0), "b": Summary(1, 1.0, 1.0), "c": Summary(1, 1.0, 3.0)},
+    ...     {"a": {"p50": 1.0, "p99": 1.0}, "b": {"p50": 1.0, "p99": 1.0}, "c": {"p50": 1.0, "p99": 2.0}},
+    ...     0.25
+    ... )
+    {'a': Comparison(p50=2.0, p99=2.0, regressed=True), 'b': Comparison(p50=1.0, p99=1.0, regressed=False), 'c': Comparison(p50=1.0, p99=1.5, regressed=True)}
+    """
+    comparisons = {}
+    for name, result in summary.items():
+        if name in baseline:
+            p50 = result.p50 / max(baseline[name]["p50"], 1e-6)
+            p99 = result.p99 / max(baseline[name]["p99"], 1e-6)
+            comparisons[name] = Comparison(
+                p50=p50,
+                p99=p99,
+                regressed=max(p50, p99) > 1 + tolerance
+            )
+    return comparisons
+
+def main(args):
+    parser = argparse.ArgumentParser(prog="rlproject.py --benchmark")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--sizes", default="1,10,100", help="file sizes in MB")
+    parser.add_argument("--cursors", type=int, default=10000)
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--trace", help="write a Chrome trace of the last frames")
+    options = parser.parse_args(args)
+    recorder = LatencyRecorder()
+    for size in options.sizes.split(","):
+        editor_session(recorder, int(size)*MB)
+    multi_cursor_session(recorder, options.cursors)
+    split_session(recorder, options.depth)
+    summary = recorder.summary()
+    if options.trace:
+        TRACER.dump_chrome_trace(options.trace)
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as f:
+            comparisons = compare(summary, json.load(f), options.tolerance)
+    else:
+        comparisons = {}
+    regressions = []
+    print(f"{'event':<24} {'count':>6} {'p50 ms':>10} {'p99 ms':>10} {'vs baseline (p50/p99)':>24}")
+    for name, result in summary.items():
+        if name in comparisons:
+            comparison = comparisons[name]
+            change = f"{comparison.p50:.2f}x/{comparison.p99:.2f}x"
+            if comparison.regressed:
+                regressions.append(name)
+                change += " SLOWER"
+        else:
+            change = "-"
+        print(f"{name:<24} {result.count:>6} {result.p50:>10.3f} {result.p99:>10.3f} {change:>24}")
+    if options.save_baseline:
+        with open(options.baseline, "w") as f:
+            json.dump({
+                name: {"p50": result.p50, "p99": result.p99}
+                for name, result in summary.items()
+            }, f, indent=4)
+        print(f"Baseline saved to {options.baseline}")
+    return 1 if regressions else 0
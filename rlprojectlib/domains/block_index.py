@@ -0,0 +1,259 @@
+import bisect
+import itertools
+
+from rlprojectlib.domains.rope import Rope
+
+class RowBlocks:
+
+    """
+    I split the lines of a rope into blocks of at most block_lines lines and
+    keep the blocks in step with edits of the rope. I only remember how many
+    lines every block has, so building the blocks reads no text.
+
+    When the rope is edited, only the blocks that the edits touched are
+    replaced:
+
+    >>> blocks = RowBlocks(block_lines=2)
+    >>> rope = Rope.from_string("ab\\ncd\\nef")
+    >>> blocks.update(rope)
+    >>> [blocks.rows[block_id] for block_id in blocks.blocks]
+    [2, 1]
+    >>> first_block = blocks.blocks[0]
+    >>> blocks.update(rope.edit([(6, 6, "x\\n")]))
+    >>> [blocks.rows[block_id] for block_id in blocks.blocks]
+    [2, 2]
+    >>> blocks.blocks[0] == first_block, blocks.block(3)
+    (True, 1)
+    """
+
+    def __init__(self, block_lines=64):
+        self.block_lines = block_lines
+        self.rope = None
+        self.blocks = []
+        self.rows = {}
+        self.id_counter = itertools.count()
+        self.starts = None
+
+    def update(self, rope):
+        rope = Rope.create(rope)
+        if self.rope is None:
+            self._replace_blocks(rope, 0, 0, 0, rope.line_count()-1)
+        elif self.rope is not rope:
+            edits = self.rope.diff(rope)
+            if len(edits) > len(self.blocks):
+                # Locating every edit would cost more than building again
+                self._clear()
+                self._replace_blocks(rope, 0, 0, 0, rope.line_count()-1)
+            else:
+                for first, stop, new_first, new_last in reversed(self._changed_blocks(rope, edits)):
+                    self._replace_blocks(rope, first, stop, new_first, new_last)
+        self.rope = rope
+
+    def block(self, row):
+        """
+        Return the position of the block that contains row.
+        """
+        starts = self._starts()
+        return max(0, min(bisect.bisect_right(starts, row) - 1, len(self.blocks)-1))
+
+    def _changed_blocks(self, rope, edits):
+        """
+        Return the blocks that edits from my rope to rope touch and the
+        (first, last) rows of the new rope that replace them. Edits in the
+        same block are merged.
+        """
+        starts = self._starts()
+        regions = []
+        delta = 0
+        for start, end, text in edits:
+            first, _ = self.rope.row_col(start)
+            last, _ = self.rope.row_col(end)
+            new_first, _ = rope.row_col(start+delta)
+            delta += len(text) - (end - start)
+            new_last, _ = rope.row_col(end+delta)
+            first_block = bisect.bisect_right(starts, first) - 1
+            last_block = bisect.bisect_right(starts, last) - 1
+            new_first -= first - starts[first_block]
+            new_last += starts[last_block+1] - 1 - last
+            if regions and first_block < regions[-1][1]:
+                regions[-1][1] = last_block + 1
+                regions[-1][3] = new_last
+            else:
+                regions.append([first_block, last_block+1, new_first, new_last])
+        return regions
+
+    def _replace_blocks(self, rope, first, stop, first_row, last_row):
+        """
+        Replace the blocks from first to stop with blocks for rows first_row
+        to last_row of rope.
+        """
+        self._remove_blocks(first, stop)
+        for block_id in self.blocks[first:stop]:
+            del self.rows[block_id]
+        block_ids = []
+        for row in range(first_row, last_row+1, self.block_lines):
+            block_id = next(self.id_counter)
+            self.rows[block_id] = min(self.block_lines, last_row+1-row)
+            block_ids.append(block_id)
+        self.blocks[first:stop] = block_ids
+        self.starts = None
+        self._add_blocks(rope, block_ids, first_row, last_row)
+
+    def _clear(self):
+        self.blocks = []
+        self.rows = {}
+        self.starts = None
+
+    def _remove_blocks(self, first, stop):
+        pass
+
+    def _add_blocks(self, rope, block_ids, first_row, last_row):
+        pass
+
+    def _starts(self):
+        """
+        The first row of every block, followed by the number of rows.
+        """
+        if self.starts is None:
+            self.starts = [0]
+            self.starts.extend(itertools.accumulate(
+                self.rows[block_id] for block_id in self.blocks
+            ))
+        return self.starts
+
+class BlockIndex(RowBlocks):
+
+    """
+    I map keys (given by the keys method) to the blocks of lines that
+    contain them.
+
+    I do not keep the text of the blocks. It is read from the rope when a
+    block is indexed or searched, so a memory mapped rope stays on disk.
+
+    >>> class CharIndex(BlockIndex):
+    ...     def keys(self, text):
+    ...         return set(text)
+    >>> index = CharIndex(block_lines=2)
+    >>> rope = Rope.from_string("ab\\ncd\\nef")
+    >>> index.update(rope)
+    >>> sorted(index.candidates(["e"])), index.offsets()
+    ([1], [0, 6, 9])
+    >>> index.update(rope.edit([(0, 0, "x\\n")]))
+    >>> [index.block_text(position) for position in range(len(index.blocks))]
+    ['x\\nab', 'cd', 'ef']
+    >>> index.candidates(["e"]), index.candidates(["x", "a"]), index.candidates([])
+    ([2], [0], [0, 1, 2])
+    >>> index.line(2), list(index._rows_texts([0, 3]))
+    ('cd', [(0, 'x'), (3, 'ef')])
+    """
+
+    def __init__(self, block_lines=64):
+        RowBlocks.__init__(self, block_lines)
+        self.sizes = {}
+        self.postings = {}
+        self.positions = None
+        self.char_starts = None
+
+    def keys(self, text):
+        raise NotImplementedError()
+
+    def candidates(self, keys):
+        """
+        Return the sorted positions of the blocks that contain all keys.
+        """
+        postings = sorted(
+            (self.postings.get(key, set()) for key in keys),
+            key=len
+        )
+        if not postings:
+            return list(range(len(self.blocks)))
+        positions = self._positions()
+        return sorted(
+            positions[block_id]
+            for block_id in postings[0].intersection(*postings[1:])
+        )
+
+    def line(self, row):
+        return self.rope[self.rope.line_start(row):self.rope.line_end(row)]
+
+    def block_text(self, index):
+        offsets = self.offsets()
+        return self.rope[offsets[index]:offsets[index+1]-1]
+
+    def offsets(self):
+        """
+        The position in the rope where every block starts, followed by the
+        length of the rope plus one.
+        """
+        if self.char_starts is None:
+            self.char_starts = [0]
+            self.char_starts.extend(itertools.accumulate(
+                self.sizes[block_id] for block_id in self.blocks
+            ))
+        return self.char_starts
+
+    def _replace_blocks(self, rope, first, stop, first_row, last_row):
+        RowBlocks._replace_blocks(self, rope, first, stop, first_row, last_row)
+        self.positions = None
+        self.char_starts = None
+
+    def _clear(self):
+        RowBlocks._clear(self)
+        self.sizes = {}
+        self.postings = {}
+        self.positions = None
+        self.char_starts = None
+
+    def _remove_blocks(self, first, stop):
+        # Blocks before first are unchanged, so the offsets of the removed
+        # blocks are still offsets in my (old) rope
+        for index in range(first, stop):
+            block_id = self.blocks[index]
+            for key in self.keys(self.block_text(index)):
+                self.postings[key].discard(block_id)
+            del self.sizes[block_id]
+
+    def _add_blocks(self, rope, block_ids, first_row, last_row):
+        lines = iter_lines(rope, first_row, last_row)
+        for block_id in block_ids:
+            text = "\n".join(itertools.islice(lines, self.rows[block_id]))
+            self.sizes[block_id] = len(text) + 1
+            for key in self.keys(text):
+                if key not in self.postings:
+                    self.postings[key] = set()
+                self.postings[key].add(block_id)
+
+    def _rows_texts(self, rows):
+        """
+        Yield (row, text) for sorted rows, reading every block once.
+        """
+        starts = self._starts()
+        index = None
+        for row in rows:
+            if index is None or row >= starts[index+1]:
+                index = bisect.bisect_right(starts, row) - 1
+                texts = self.block_text(index).split("\n")
+            yield row, texts[row-starts[index]]
+
+    def _positions(self):
+        if self.positions is None:
+            self.positions = {
+                block_id: index
+                for index, block_id in enumerate(self.blocks)
+            }
+        return self.positions
+
+def iter_lines(rope, first_row, last_row):
+    """
+    Yield the lines from first_row to last_row of rope, reading one chunk at
+    a time.
+
+    >>> list(iter_lines(Rope.from_string("ab\\n" * 1000), 1, 2))
+    ['ab', 'ab']
+    """
+    partial = ""
+    for _, text in rope.chunks(rope.line_start(first_row), rope.line_end(last_row)):
+        lines = (partial + text).split("\n")
+        partial = lines.pop()
+        yield from lines
+    yield partial
@@ -18,13 +18,111 @@ class Coordinate:
     def move(self, dx=0, dy=0):
         return self._replace(x=self.x+dx, y=self.y+dy)
 
-class ImmutableList(tuple):
+class ImmutableList:
+
+    """
+    I am a persistent vector: a 32-way trie of tuples plus a tail buffer.
+
+    Adding, updating and looking up items cost O(log32 n). New versions share
+    all untouched nodes with the old version.
+
+    >>> items = ImmutableList(range(5))
+    >>> items
+    ImmutableList(0, 1, 2, 3, 4)
+    >>> items.add(5)
+    ImmutableList(0, 1, 2, 3, 4, 5)
+    >>> items.set(0, "zero")
+    ImmutableList('zero', 1, 2, 3, 4)
+    >>> items
+    ImmutableList(0, 1, 2, 3, 4)
+    >>> items.merge((5, 6)).map(lambda x: x*10).filter(lambda x: x > 30)
+    ImmutableList(40, 50, 60)
+
+    Items beyond the tail are stored in the trie:
+
+    >>> big = ImmutableList()
+    >>> for index in range(2000):
+    ...     big = big.add(index)
+    >>> len(big), big[0], big[1023], big[1999], big[-1], big.shift
+    (2000, 0, 1023, 1999, 1999, 10)
+    >>> list(big.set(1500, "x"))[1499:1502]
+    [1499, 'x', 1501]
+    >>> list(big) == list(range(2000)) == list(ImmutableList(range(2000)))
+    True
+    >>> big[10:13]
+    ImmutableList(10, 11, 12)
+    """
+
+    __slots__ = ["count", "shift", "root", "tail"]
+
+    def __init__(self, items=()):
+        items = tuple(items)
+        tail_offset = max(0, (len(items)-1) // 32 * 32)
+        nodes = [items[index:index+32] for index in range(0, tail_offset, 32)]
+        shift = BITS
+        while len(nodes) > 32:
+            nodes = [tuple(nodes[index:index+32]) for index in range(0, len(nodes), 32)]
+            shift += BITS
+        self.count = len(items)
+        self.shift = shift
+        self.root = tuple(nodes)
+        self.tail = items[tail_offset:]
+
+    def _create(self, count, shift, root, tail):
+        items = object.__new__(self.__class__)
+        items.count = count
+        items.shift = shift
+        items.root = root
+        items.tail = tail
+        return items
+
+    def _tail_offset(self):
+        return self.count - len(self.tail)
+
+    def _leaf_for(self, index):
+        if index >= self._tail_offset():
+            return self.tail
+        node = self.root
+        for level in range(self.shift, 0, -BITS):
+            node = node[(index >> level) & MASK]
+        return node
 
     def add(self, item):
-        return self.merge((item,))
+        if len(self.tail) < 32:
+            return self._create(self.count+1, self.shift, self.root, self.tail+(item,))
+        if (self.count >> BITS) > (1 << self.shift):
+            root = (self.root, _new_path(self.shift, self.tail))
+            shift = self.shift + BITS
+        else:
+            root = _push_tail(self.count, self.shift, self.root, self.tail)
+            shift = self.shift
+        return self._create(self.count+1, shift, root, (item,))
+
+    def set(self, index, item):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("list index out of range")
+        if index >= self._tail_offset():
+            position = index - self._tail_offset()
+            return self._create(
+                self.count,
+                self.shift,
+                self.root,
+                self.tail[:position]+(item,)+self.tail[position+1:]
+            )
+        return self._create(
+            self.count,
+            self.shift,
+            _set(self.shift, self.root, index, item),
+            self.tail
+        )
 
     def merge(self, items):
-        return self.__class__(self+items)
+        result = self
+        for item in items:
+            result = result.add(item)
+        return result
 
     def map(self, fn):
         return self.__class__(fn(x) for x in self)
@@ -36,6 +134,76 @@ class ImmutableList(tuple):
         for item in self:
             print(item)
 
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.__class__(self[x] for x in range(*index.indices(self.count)))
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("list index out of range")
+        return self._leaf_for(index)[index & MASK]
+
+    def __iter__(self):
+        yield from _iter_node(self.shift, self.root)
+        yield from self.tail
+
+    def __add__(self, items):
+        return self.merge(items)
+
+    def __radd__(self, items):
+        return self.__class__(items).merge(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (ImmutableList, tuple, list)):
+            return len(self) == len(other) and all(
+                x == y for x, y in zip(self, other)
+            )
+        else:
+            return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({', '.join(repr(x) for x in self)})"
+
+BITS = 5
+MASK = (1 << BITS) - 1
+
+def _new_path(level, node):
+    if level == 0:
+        return node
+    else:
+        return (_new_path(level-BITS, node),)
+
+def _push_tail(count, level, parent, tail):
+    index = ((count - 1) >> level) & MASK
+    if level == BITS:
+        child = tail
+    elif index < len(parent):
+        child = _push_tail(count, level-BITS, parent[index], tail)
+    else:
+        child = _new_path(level-BITS, tail)
+    return parent[:index] + (child,) + parent[index+1:]
+
+def _set(level, node, index, item):
+    position = (index >> level) & MASK
+    if level == 0:
+        child = item
+    else:
+        child = _set(level-BITS, node[position], index, item)
+    return node[:position] + (child,) + node[position+1:]
+
+def _iter_node(level, node):
+    if level == 0:
+        yield from node
+    else:
+        for child in node:
+            yield from _iter_node(level-BITS, child)
+
 class Selections(ImmutableList):
 
     def __repr__(self):
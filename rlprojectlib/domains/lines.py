@@ -28,7 +28,16 @@ class Lines(
     def move_cursor_back(self):
         raise NotImplementedError()
 
-    def select_next_word(self):
+    def move_cursor_down(self, rows=1):
+        raise NotImplementedError()
+
+    def move_cursor_up(self, rows=1):
+        raise NotImplementedError()
+
+    def select_next_word(self, words):
+        raise NotImplementedError()
+
+    def select_all_occurrences(self, words):
         raise NotImplementedError()
 
     def replace(self, text):
@@ -39,6 +48,14 @@ class Line(
 ):
     pass
 
+class StyledLine(
+    namedtuple("StyledLine", "text number styles")
+):
+
+    """
+    A line with sorted (start, end, fg) styles that color parts of it.
+    """
+
 class Selection(
     namedtuple("Selection", "start end")
 ):
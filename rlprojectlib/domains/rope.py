@@ -0,0 +1,579 @@
+from collections import namedtuple
+import mmap
+
+LEAF_SIZE = 1024
+EDITS_PER_LEAF = 4
+FILE_CHUNK_SIZE = 65536
+
+class Rope:
+
+    """
+    I am an immutable string stored as a balanced tree of text chunks.
+
+    Edits return a new rope that shares all untouched chunks with the old one.
+
+    >>> rope = Rope.from_string("hello world")
+    >>> rope
+    'hello world'
+    >>> rope.replace(0, 5, "goodbye")
+    'goodbye world'
+    >>> rope
+    'hello world'
+
+    I behave like a string in the places where projections use one:
+
+    >>> len(rope), rope[4], rope[-1], rope[2:7], rope.find("o", 5)
+    (11, 'o', 'd', 'llo w', 7)
+    >>> rope == "hello world"
+    True
+
+    Large strings are split into chunks:
+
+    >>> big = Rope.from_string("abcdefghij"*1000)
+    >>> big.root.height > 0
+    True
+    >>> big.insert(5000, "X")[4998:5003]
+    'ijXab'
+    >>> big.delete(10, 9990) == "abcdefghij"*2
+    True
+    """
+
+    __slots__ = ["root", "base", "edits"]
+
+    def __init__(self, root, base=None, edits=None):
+        self.root = root
+        self.base = base
+        self.edits = edits
+
+    @staticmethod
+    def create(string):
+        if isinstance(string, Rope):
+            return string
+        else:
+            return Rope.from_string(string)
+
+    @staticmethod
+    def from_string(string):
+        return Rope(_build([
+            Leaf.create(string[index:index+LEAF_SIZE])
+            for index in range(0, len(string), LEAF_SIZE)
+        ]))
+
+    @staticmethod
+    def from_file(path, chunk_size=FILE_CHUNK_SIZE):
+        """
+        I memory map a UTF-8 file and only decode the chunks that are read.
+
+        Opening the file counts characters and newlines of every chunk,
+        which does not decode ASCII chunks. Chunks end on character
+        boundaries:
+
+        >>> import tempfile
+        >>> with tempfile.NamedTemporaryFile("wb", delete=False) as f:
+        ...     _ = f.write("abc\\nå\\nö\\n".encode("utf-8"))
+        >>> rope = Rope.from_file(f.name, chunk_size=4)
+        >>> [type(leaf).__name__ for leaf in rope.leaves()]
+        ['FileLeaf', 'FileLeaf', 'FileLeaf']
+        >>> len(rope), rope.line_count(), rope.line_start(2), rope[4:7]
+        (8, 4, 6, 'å\\nö')
+
+        Lines and characters of files larger than one chunk are found by
+        decoding only the chunk they are in (characters of ASCII chunks not
+        even that):
+
+        >>> with open(f.name, "wb") as f:
+        ...     _ = f.write(("".join(f"line {row}\\n" for row in range(20000))).encode("utf-8"))
+        >>> rope = Rope.from_file(f.name)
+        >>> len(list(rope.leaves())) > 1
+        True
+        >>> start = rope.line_start(15000)
+        >>> rope[start:rope.line_end(15000)], rope.row_col(start+5), rope[start]
+        ('line 15000', (15000, 5), 'l')
+
+        Carriage returns are translated like files opened in text mode:
+
+        >>> with open(f.name, "wb") as f:
+        ...     _ = f.write(b"one\\r\\ntwo\\r")
+        >>> Rope.from_file(f.name, chunk_size=4)
+        'one\\ntwo\\n'
+
+        >>> with open(f.name, "wb") as f:
+        ...     pass
+        >>> Rope.from_file(f.name)
+        ''
+        """
+        with open(path, "rb") as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return Rope.from_string("")
+        leaves = []
+        start = 0
+        while start < len(data):
+            end = min(start + chunk_size, len(data))
+            # Do not split characters or \r\n pairs
+            while end < len(data) and (
+                0x80 <= data[end] < 0xC0 or
+                data[end-1] == 0x0D
+            ):
+                end += 1
+            chunk = data[start:end]
+            if b"\r" in chunk:
+                leaves.append(Leaf.create(_decode(chunk).replace(
+                    "\r\n", "\n"
+                ).replace(
+                    "\r", "\n"
+                )))
+            else:
+                leaves.append(FileLeaf(
+                    data=data,
+                    start=start,
+                    end=end,
+                    length=len(chunk) if chunk.isascii() else len(_decode(chunk)),
+                    newlines=chunk.count(b"\n")
+                ))
+            start = end
+        return Rope(_build(leaves))
+
+    def leaves(self):
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.height == 0:
+                yield node
+            else:
+                stack.append(node.right)
+                stack.append(node.left)
+
+    def insert(self, index, text):
+        return self.replace(index, index, text)
+
+    def delete(self, start, end):
+        return self.replace(start, end, "")
+
+    def replace(self, start, end, text):
+        return self.edit([(start, end, text)])
+
+    def edit(self, edits):
+        """
+        Apply many non-overlapping (start, end, text) edits, sorted by start
+        and given in old positions, in one pass.
+
+        >>> Rope.from_string("a-b-c").edit([(1, 2, "+"), (3, 4, "++")])
+        'a+b++c'
+
+        Few edits in a large rope split and join the tree around each edit.
+        Many small edits rebuild the text in one linear scan instead:
+
+        >>> big = Rope.from_string("ab"*5000)
+        >>> big.edit([(0, 1, "x")])[:4]
+        'xbab'
+        >>> big.edit([(index, index+1, "") for index in range(0, 10000, 2)])[:4]
+        'bbbb'
+
+        Inserting the same large text in many places (pasting with many
+        cursors) shares the chunks of the text between all places:
+
+        >>> paste = "x"*10000
+        >>> pasted = Rope.from_string("ab").edit([(0, 0, paste), (1, 1, paste)])
+        >>> len(pasted), pasted[9999:10002]
+        (20002, 'xax')
+        """
+        inserted = sum(len(text) for _, _, text in edits)
+        if len(edits) * EDITS_PER_LEAF > len(self) // LEAF_SIZE and inserted <= len(self):
+            string = str(self)
+            parts = []
+            last_pos = 0
+            for start, end, text in edits:
+                parts.append(string[last_pos:start])
+                parts.append(text)
+                last_pos = end
+            parts.append(string[last_pos:])
+            return Rope(
+                Rope.from_string("".join(parts)).root,
+                base=self.root,
+                edits=tuple(edits)
+            )
+        root = EMPTY
+        rest = self.root
+        last_pos = 0
+        texts = {}
+        for start, end, text in edits:
+            if text not in texts:
+                texts[text] = Rope.from_string(text).root
+            left, rest = _split(rest, start-last_pos)
+            _, rest = _split(rest, end-start)
+            root = _join(_join(root, left), texts[text])
+            last_pos = end
+        return Rope(_join(root, rest), base=self.root, edits=tuple(edits))
+
+    def diff(self, other):
+        """
+        Return edits, in the form that edit takes, that turn me into other.
+
+        If other was made by editing me, I return those edits:
+
+        >>> rope = Rope.from_string("hello world")
+        >>> rope.diff(rope.replace(0, 5, "goodbye").insert(0, "oh "))
+        [(0, 5, 'oh goodbye')]
+
+        >>> edited = rope.edit([(0, 1, "H"), (6, 7, "W")])
+        >>> rope.diff(edited)
+        [(0, 1, 'H'), (6, 7, 'W')]
+
+        Otherwise I find the changed region by skipping the chunks that the
+        two trees share at the start and at the end:
+
+        >>> big = Rope.from_string("abcdefghij"*10000)
+        >>> changed = big.insert(50000, "X").delete(70000, 70005)
+        >>> [(start, end, len(text)) for start, end, text in big.diff(changed)]
+        [(50000, 70004, 20000)]
+        >>> big.edit(big.diff(changed)) == changed
+        True
+        """
+        if other.base is self.root and other.edits is not None:
+            return list(other.edits)
+        if self.root is other.root:
+            return []
+        prefix = _common_length(self.root, other.root, reverse=False)
+        suffix = min(
+            _common_length(self.root, other.root, reverse=True),
+            len(self)-prefix,
+            len(other)-prefix
+        )
+        return [(prefix, len(self)-suffix, other[prefix:len(other)-suffix])]
+
+    def split(self, index):
+        left, right = _split(self.root, index)
+        return (Rope(left), Rope(right))
+
+    def __add__(self, other):
+        return Rope(_join(self.root, Rope.create(other).root))
+
+    def chunks(self, start=0, end=None):
+        """
+        >>> list(Rope.from_string("abc"*1000).chunks(1020, 1030))
+        [(1020, 'abca'), (1024, 'bcabca')]
+        """
+        if end is None or end > self.root.length:
+            end = self.root.length
+        stack = [(self.root, 0)]
+        while stack:
+            node, offset = stack.pop()
+            if offset >= end or offset + node.length <= start:
+                continue
+            if node.height == 0:
+                text_start = max(start-offset, 0)
+                if isinstance(node, FileLeaf) and node.is_ascii:
+                    # Decode only the part that is read
+                    yield (offset+text_start, node.data[
+                        node.start+text_start:node.start+min(end-offset, node.length)
+                    ].decode("ascii"))
+                else:
+                    yield (offset+text_start, node.text[text_start:end-offset])
+            else:
+                stack.append((node.right, offset+node.left.length))
+                stack.append((node.left, offset))
+
+    def find(self, sub, start=0):
+        """
+        >>> Rope.from_string("ab"*1000+"needle").find("bne")
+        1999
+        >>> Rope.from_string("hello").find("x")
+        -1
+        """
+        if start < 0:
+            start = max(start+len(self), 0)
+        if not sub:
+            return start if start <= len(self) else -1
+        keep = len(sub) - 1
+        carry = ""
+        for offset, text in self.chunks(start):
+            window = carry + text
+            index = window.find(sub)
+            if index >= 0:
+                return offset - len(carry) + index
+            carry = window[len(window)-keep:] if keep else ""
+        return -1
+
+    def line_count(self):
+        """
+        >>> Rope.from_string("one\\ntwo\\n").line_count()
+        3
+        """
+        return self.root.newlines + 1
+
+    def line_start(self, row):
+        """
+        Return the position where line `row` starts by descending the tree
+        using the newline count stored in every node.
+
+        >>> rope = Rope.from_string("one\\ntwo\\nthree")
+        >>> [rope.line_start(row) for row in range(3)]
+        [0, 4, 8]
+
+        >>> big = Rope.from_string("line\\n"*10000)
+        >>> big.line_start(9000)
+        45000
+        """
+        if row <= 0:
+            return 0
+        if row > self.root.newlines:
+            return len(self)
+        node = self.root
+        offset = 0
+        while node.height > 0:
+            if row <= node.left.newlines:
+                node = node.left
+            else:
+                row -= node.left.newlines
+                offset += node.left.length
+                node = node.right
+        # The text of a file leaf is decoded every time it is read
+        text = node.text
+        index = -1
+        for _ in range(row):
+            index = text.find("\n", index+1)
+        return offset + index + 1
+
+    def line_end(self, row):
+        """
+        Return the position of the newline that ends line `row` (or the end of
+        the rope for the last line).
+
+        >>> rope = Rope.from_string("one\\ntwo")
+        >>> rope.line_end(0), rope.line_end(1)
+        (3, 7)
+        """
+        if row >= self.root.newlines:
+            return len(self)
+        return self.line_start(row+1) - 1
+
+    def row_col(self, index):
+        """
+        Return the (row, col) of a position.
+
+        >>> rope = Rope.from_string("one\\ntwo\\nthree")
+        >>> [rope.row_col(index) for index in [0, 3, 4, 9, 13]]
+        [(0, 0), (0, 3), (1, 0), (2, 1), (2, 5)]
+
+        >>> Rope.from_string("line\\n"*10000).row_col(45002)
+        (9000, 2)
+        """
+        index = max(0, min(index, len(self)))
+        node = self.root
+        offset = 0
+        row = 0
+        while node.height > 0:
+            if index < node.left.length:
+                node = node.left
+            else:
+                index -= node.left.length
+                offset += node.left.length
+                row += node.left.newlines
+                node = node.right
+        text = node.text
+        row += text.count("\n", 0, index)
+        newline = text.rfind("\n", 0, index)
+        if newline != -1:
+            return (row, index - newline - 1)
+        return (row, offset + index - self.line_start(row))
+
+    def __len__(self):
+        return self.root.length
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, end, step = key.indices(len(self))
+            if step != 1:
+                return str(self)[key]
+            return "".join(text for _, text in self.chunks(start, end))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("rope index out of range")
+        node = self.root
+        while node.height > 0:
+            if key < node.left.length:
+                node = node.left
+            else:
+                key -= node.left.length
+                node = node.right
+        if isinstance(node, FileLeaf) and node.is_ascii:
+            return chr(node.data[node.start+key])
+        return node.text[key]
+
+    def __iter__(self):
+        for _, text in self.chunks():
+            yield from text
+
+    def __str__(self):
+        return self[:]
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __eq__(self, other):
+        if isinstance(other, Rope):
+            return self.root is other.root or (
+                len(self) == len(other) and str(self) == str(other)
+            )
+        elif isinstance(other, str):
+            return len(self) == len(other) and str(self) == other
+        else:
+            return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
+
+class Leaf(
+    namedtuple("Leaf", "text length newlines")
+):
+
+    height = 0
+
+    @staticmethod
+    def create(text):
+        return Leaf(text=text, length=len(text), newlines=text.count("\n"))
+
+class FileLeaf(
+    namedtuple("FileLeaf", "data start end length newlines")
+):
+
+    """
+    I am a leaf whose text is decoded from a memory mapped file every time it
+    is needed, so that only the text that is shown is ever in memory.
+    """
+
+    height = 0
+
+    @property
+    def text(self):
+        return _decode(self.data[self.start:self.end])
+
+    @property
+    def is_ascii(self):
+        # Characters of ASCII chunks are bytes
+        return self.length == self.end - self.start
+
+class Node(
+    namedtuple("Node", "left right length newlines height")
+):
+    pass
+
+EMPTY = Leaf.create("")
+
+def _decode(data):
+    return str(data, "utf-8", "replace")
+
+def _common_length(a, b, reverse):
+    """
+    Length of the common prefix (or suffix) of two trees. Subtrees that are
+    shared at the same offset are skipped without looking at their text.
+    """
+    xs = [a]
+    ys = [b]
+    length = 0
+    while xs and ys:
+        x = xs.pop()
+        y = ys.pop()
+        if x is y:
+            length += x.length
+        elif not x.length:
+            ys.append(y)
+        elif not y.length:
+            xs.append(x)
+        elif x.height > 0 and x.height >= y.height:
+            xs.extend([x.left, x.right] if reverse else [x.right, x.left])
+            ys.append(y)
+        elif y.height > 0:
+            xs.append(x)
+            ys.extend([y.left, y.right] if reverse else [y.right, y.left])
+        else:
+            x_text = x.text
+            y_text = y.text
+            if reverse:
+                x_text = x_text[::-1]
+                y_text = y_text[::-1]
+            size = min(len(x_text), len(y_text))
+            index = 0
+            while index < size and x_text[index] == y_text[index]:
+                index += 1
+            length += index
+            if index < size:
+                return length
+            if len(x_text) > size:
+                xs.append(Leaf.create(x_text[size:][::-1] if reverse else x_text[size:]))
+            if len(y_text) > size:
+                ys.append(Leaf.create(y_text[size:][::-1] if reverse else y_text[size:]))
+    return length
+
+def _node(left, right):
+    return Node(
+        left=left,
+        right=right,
+        length=left.length+right.length,
+        newlines=left.newlines+right.newlines,
+        height=max(left.height, right.height)+1
+    )
+
+def _build(leaves):
+    if not leaves:
+        return EMPTY
+    elif len(leaves) == 1:
+        return leaves[0]
+    else:
+        middle = len(leaves) // 2
+        return _node(_build(leaves[:middle]), _build(leaves[middle:]))
+
+def _split(node, index):
+    if index <= 0:
+        return (EMPTY, node)
+    elif index >= node.length:
+        return (node, EMPTY)
+    elif node.height == 0:
+        return (Leaf.create(node.text[:index]), Leaf.create(node.text[index:]))
+    elif index < node.left.length:
+        left, right = _split(node.left, index)
+        return (left, _join(right, node.right))
+    elif index == node.left.length:
+        return (node.left, node.right)
+    else:
+        left, right = _split(node.right, index-node.left.length)
+        return (_join(node.left, left), right)
+
+def _join(left, right):
+    """
+    Join two trees keeping them balanced. Small neighbouring leaves are merged
+    so that typing one character at a time does not fragment the tree.
+    """
+    if not left.length:
+        return right
+    elif not right.length:
+        return left
+    elif left.height > right.height + 1 or (right.height == 0 and left.height > 0):
+        return _balance(left.left, _join(left.right, right))
+    elif right.height > left.height + 1 or (left.height == 0 and right.height > 0):
+        return _balance(_join(left, right.left), right.right)
+    elif left.height == 0 and right.height == 0 and left.length + right.length <= LEAF_SIZE:
+        return Leaf.create(left.text+right.text)
+    else:
+        return _node(left, right)
+
+def _balance(left, right):
+    if left.height > right.height + 1:
+        if left.left.height >= left.right.height:
+            return _node(left.left, _node(left.right, right))
+        return _node(
+            _node(left.left, left.right.left),
+            _node(left.right.right, right)
+        )
+    elif right.height > left.height + 1:
+        if right.right.height >= right.left.height:
+            return _node(_node(left, right.left), right.right)
+        return _node(
+            _node(left, right.left.left),
+            _node(right.left.right, right.right)
+        )
+    else:
+        return _node(left, right)
@@ -2,6 +2,7 @@ from collections import namedtuple
 
 from rlprojectlib.domains.generic import Document
 from rlprojectlib.domains.generic import Selections
+from rlprojectlib.domains.rope import Rope
 
 class String(
     namedtuple("String", "meta string selections"),
@@ -10,14 +11,13 @@ class String(
 
     @staticmethod
     def from_file(path):
-        with open(path) as f:
-            return String.from_string(f.read())
+        return String.from_string(Rope.from_file(path))
 
     @staticmethod
     def from_string(string, selection_start=0, selection_length=0):
         return String(
             meta=None,
-            string=string,
+            string=Rope.create(string),
             selections=Selections([Selection(selection_start, selection_length)])
         )
 
@@ -26,19 +26,11 @@ class String(
         >>> String.from_string("hello", selection_length=1).replace("1").string
         '1ello'
         """
-        parts = []
-        selections = []
-        last_pos = 0
+        edit = MultiEdit(self)
         for selection in self.selections:
-            parts.append(self.string[last_pos:selection.pos_start])
-            last_pos = selection.pos_end
-            parts.append(text)
-            selections.append(Selection(start=len("".join(parts)), length=0))
-        parts.append(self.string[last_pos:])
-        return self._replace(
-            string="".join(parts),
-            selections=Selections(selections)
-        )
+            start = edit.replace(selection, text)
+            edit.select(Selection(start=start+len(text), length=0))
+        return edit.apply()
 
     def move_cursor_back(self):
         return self._replace(
@@ -52,34 +44,206 @@ class String(
             selections=Selections([self.selections[-1].move_cursor_forward()])
         )
 
-    def select_next_word(self):
+    def move_cursor_down(self, rows=1):
+        """
+        >>> String.from_string("one\\ntwo\\nx", 2).move_cursor_down()
+        String(meta=None, string='one\\ntwo\\nx', selections=Selections(Selection(start=6, length=0)))
+
+        >>> String.from_string("one\\ntwo\\nx", 2).move_cursor_down(2)
+        String(meta=None, string='one\\ntwo\\nx', selections=Selections(Selection(start=9, length=0)))
+        """
+        string = Rope.create(self.string)
+        row, col = string.row_col(self.selections[-1].start)
+        row = max(0, min(row+rows, string.line_count()-1))
+        return self._replace(selections=Selections([Selection(
+            start=min(string.line_start(row)+col, string.line_end(row)),
+            length=0
+        )]))
+
+    def move_cursor_up(self, rows=1):
+        """
+        >>> String.from_string("one\\ntwo", 6).move_cursor_up()
+        String(meta=None, string='one\\ntwo', selections=Selections(Selection(start=2, length=0)))
+        """
+        return self.move_cursor_down(-rows)
+
+    def select_next_word(self, words):
+        """
+        Select the word at the cursor, or if a text is selected, add a
+        selection of its next occurrence. Words is the WordIndex that is kept
+        for the string:
+
+        >>> from rlprojectlib.domains.word_index import WordIndex
+        >>> words = WordIndex()
+        >>> string = String.from_string("hello there, hello").select_next_word(words)
+        >>> string
+        String(meta=None, string='hello there, hello', selections=Selections(Selection(start=5, length=-5)))
+        >>> string = string.select_next_word(words)
+        >>> string.selections
+        Selections(Selection(start=5, length=-5), Selection(start=18, length=-5))
+        >>> string.select_next_word(words) is string
+        True
+        """
+        selection = self.selections[-1]
+        if selection.length == 0:
+            found = words.word_at(self.string, selection.start)
+            if found is None:
+                return self
+            return self._replace(selections=Selections([Selection.from_range(*found)]))
+        found = words.next_occurrence(
+            self.string,
+            self.string[selection.pos_start:selection.pos_end],
+            selection.pos_end
+        )
+        if found is None:
+            return self
+        return self._replace(selections=self.selections.add(Selection.from_range(*found)))
+
+    def select_all_occurrences(self, words):
         """
-        >>> String.from_string("hello there").select_next_word()
-        String(meta=None, string='hello there', selections=Selections(Selection(start=5, length=-5)))
+        Select every occurrence of the selected text, or of the word at the
+        cursor:
+
+        >>> from rlprojectlib.domains.word_index import WordIndex
+        >>> String.from_string("a foo, foobar, foo", 4).select_all_occurrences(WordIndex()).selections
+        Selections(Selection(start=5, length=-3), Selection(start=18, length=-3))
         """
-        if abs(self.selections[-1].length) > 0:
-            return self._replace(selections=Selections(
-                list(self.selections)+[self.selections[-1].move_forward(abs(self.selections[-1].length)+3)]
-            ))
+        selection = self.selections[-1]
+        if selection.length == 0:
+            found = words.word_at(self.string, selection.start)
+            if found is None:
+                return self
+            start, end = found
         else:
-            return self._replace(selections=Selections([Selection(
-                start=self.selections[-1].start+5,
-                length=-5
-            )]))
+            start, end = selection.pos_start, selection.pos_end
+        return self._replace(selections=Selections(
+            Selection.from_range(start, end)
+            for start, end in words.occurrences(self.string, self.string[start:end])
+        ))
 
     def delete_back(self):
         """
         >>> String.from_string("hello", 1).delete_back()
         String(meta=None, string='ello', selections=Selections(Selection(start=0, length=0)))
         """
-        return self._replace(selections=self.selections.map(lambda x:
-            x.delete_back()
-        )).replace("")
+        edit = MultiEdit(self)
+        for selection in self.selections:
+            start = edit.replace(selection.delete_back(), "")
+            edit.select(Selection(start=start, length=0))
+        return edit.apply()
+
+    def replace_lines(self, lines):
+        """
+        Replace rows given as (row, old line, new line). Rows that no longer
+        contain the old line are left alone. Selections after a replaced
+        line move with the text:
+
+        >>> String.from_string("one\\ntwo\\nthree", 9).replace_lines([
+        ...     (0, "one", "1"),
+        ...     (1, "changed", "2"),
+        ... ])
+        String(meta=None, string='1\\ntwo\\nthree', selections=Selections(Selection(start=7, length=0)))
+        """
+        string = Rope.create(self.string)
+        edits = []
+        for row, old, new in sorted(lines):
+            if row < string.line_count():
+                start = string.line_start(row)
+                end = string.line_end(row)
+                if string[start:end] == old:
+                    edits.append((start, end, new))
+        if not edits:
+            return self
+        def move(position):
+            delta = 0
+            for start, end, text in edits:
+                if position < start:
+                    break
+                if position <= end:
+                    return start + delta + min(position-start, len(text))
+                delta += len(text) - (end - start)
+            return position + delta
+        return self._replace(
+            string=string.edit(edits),
+            selections=Selections(
+                Selection(
+                    start=move(selection.start),
+                    length=move(selection.start+selection.length)-move(selection.start)
+                )
+                for selection in self.selections
+            )
+        )
+
+class MultiEdit:
+
+    """
+    I apply one edit per selection in a single pass.
+
+    Selections are visited in order and positions of new selections are
+    calculated from a running delta, so the cost is linear in the number of
+    selections and does not depend on the length of the string.
+
+    >>> string = String.from_string("a b c")._replace(selections=Selections([
+    ...     Selection(start=0, length=1),
+    ...     Selection(start=2, length=1),
+    ...     Selection(start=4, length=1),
+    ... ]))
+    >>> edit = MultiEdit(string)
+    >>> for selection in string.selections:
+    ...     edit.select(Selection(start=edit.replace(selection, "xy"), length=2))
+    >>> edit.apply()
+    String(meta=None, string='xy xy xy', selections=Selections(Selection(start=0, length=2), Selection(start=3, length=2), Selection(start=6, length=2)))
+    """
+
+    def __init__(self, string):
+        self.string = string
+        self.edits = []
+        self.selections = []
+        self.delta = 0
+
+    def replace(self, selection, text):
+        """
+        Replace the text of a selection (in old positions) and return where
+        the replacement starts in the new string.
+        """
+        start = selection.pos_start + self.delta
+        self.edits.append((selection.pos_start, selection.pos_end, text))
+        self.delta += len(text) - selection.abs_lenght
+        return start
+
+    def select(self, selection):
+        """
+        Add a selection given in new positions.
+        """
+        self.selections.append(selection)
+
+    def keep(self, selection):
+        """
+        Add a selection given in old positions.
+        """
+        self.select(selection.move_forward(self.delta))
+
+    def apply(self):
+        if self.edits:
+            string = Rope.create(self.string.string).edit(self.edits)
+        else:
+            string = self.string.string
+        return self.string._replace(
+            string=string,
+            selections=Selections(self.selections)
+        )
 
 class Selection(
     namedtuple("Selection", "start length")
 ):
 
+    @staticmethod
+    def from_range(start, end):
+        """
+        Select from start to end with the cursor at the end.
+        """
+        return Selection(start=end, length=start-end)
+
     @property
     def abs_lenght(self):
         return abs(self.length)
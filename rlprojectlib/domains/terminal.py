@@ -1,5 +1,11 @@
+from array import array
 from collections import namedtuple
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from rlprojectlib.domains.generic import Coordinate
 from rlprojectlib.domains.generic import ImmutableList
 from rlprojectlib.domains.generic import Document
@@ -13,10 +19,16 @@ class Terminal(
     def create(cls, fragments=[], cursors=[], meta=None):
         return cls(
             meta=meta,
-            fragments=ImmutableList(fragments),
+            fragments=Fragments.create(fragments),
             cursors=ImmutableList(cursors)
         )
 
+    def compact(self):
+        """
+        Store my fragments in columns. See FragmentColumns.
+        """
+        return self._replace(fragments=FragmentColumns.create(self.fragments))
+
     def print_fragments_and_cursors(self):
         self.fragments.print()
         self.cursors.print()
@@ -53,17 +65,31 @@ class Terminal(
             print("".join(char_buffer))
             line_number += 1
 
+    def get_rows(self):
+        """
+        Group fragments by row:
+
+        >>> Terminal.create(fragments=[
+        ...     TextFragment(x=0, y=1, text="b"),
+        ...     TextFragment(x=0, y=0, text="a"),
+        ...     TextFragment(x=1, y=1, text="c"),
+        ... ]).get_rows()
+        {1: (TextFragment(x=0, y=1, text='b', bold=None, bg=None, fg=None), TextFragment(x=1, y=1, text='c', bold=None, bg=None, fg=None)), 0: (TextFragment(x=0, y=0, text='a', bold=None, bg=None, fg=None),)}
+        """
+        rows = {}
+        for fragment in self.fragments:
+            rows.setdefault(fragment.y, []).append(fragment)
+        return {y: tuple(fragments) for y, fragments in rows.items()}
+
     def translate(self, dx=0, dy=0):
         return self._replace(
-            fragments=self.fragments.map(lambda x: x.move(dx=dx, dy=dy)),
+            fragments=self.fragments.translate(dx=dx, dy=dy),
             cursors=self.cursors.map(lambda x: x.move(dx=dx, dy=dy))
         )
 
     def clip(self, width, height):
         return self._replace(
-            fragments=self.fragments.filter(lambda fragment:
-                fragment.y < height
-            ).map(lambda fragment: fragment.clip(width)),
+            fragments=self.fragments.clip(width, height),
             cursors=self.cursors.filter(lambda cursor:
                 cursor.x >= 0 and cursor.x < width and
                 cursor.y >= 0 and cursor.y < height
@@ -85,7 +111,7 @@ class Terminal(
         )
 
     def style(self, **kwargs):
-        return self._replace(fragments=self.fragments.map(lambda x: x._replace(**kwargs)))
+        return self._replace(fragments=self.fragments.style(**kwargs))
 
     def get_width(self):
         """
@@ -105,7 +131,7 @@ class Terminal(
         return max(
             tuple([1])
             +
-            self.fragments.map(lambda fragment: fragment.x+len(fragment.text))
+            tuple(fragment.x+len(fragment.text) for fragment in self.fragments)
             +
             self.cursors.map(lambda cursor: cursor.x+1)
         )
@@ -123,7 +149,7 @@ class Terminal(
         return max(
             tuple([0])
             +
-            self.fragments.map(lambda fragment: fragment.y)
+            tuple(fragment.y for fragment in self.fragments)
             +
             self.cursors.map(lambda cursor: cursor.y)
         ) + 1
@@ -153,6 +179,9 @@ class TextFragment(
 
         >>> TextFragment(1, 0, "hello").clip(2)
         TextFragment(x=1, y=0, text='h', bold=None, bg=None, fg=None)
+
+        >>> TextFragment(3, 0, "hello").clip(2)
+        TextFragment(x=3, y=0, text='', bold=None, bg=None, fg=None)
         """
         if self.x < 0:
             start = -self.x
@@ -160,7 +189,7 @@ class TextFragment(
             x = 0
         else:
             start = 0
-            end = width - self.x
+            end = max(width - self.x, 0)
             x = self.x
         return self._replace(text=self.text[start:end], x=x)
 
@@ -200,13 +229,420 @@ class TextFragmentsBuilder:
         return sum(self.add(x) for x in fragments)
 
     def get(self):
-        return ImmutableList(self.fragments)
+        return Fragments(self.fragments)
+
+class Fragments(ImmutableList):
+
+    """
+    I am a list of text fragments.
+
+    Translating and clipping me is lazy. See FragmentView.
+    """
+
+    @staticmethod
+    def create(fragments):
+        if isinstance(fragments, (Fragments, FragmentColumns, FragmentView)):
+            return fragments
+        else:
+            return Fragments(fragments)
+
+    @staticmethod
+    def concat(fragments_list):
+        """
+        Put fragments after each other, dropping empty ones:
+
+        >>> Fragments.concat([
+        ...     Fragments([TextFragment(0, 0, "a"), TextFragment(0, 0, "")]),
+        ...     Fragments([TextFragment(0, 1, "b")]),
+        ... ]).print()
+        TextFragment(x=0, y=0, text='a', bold=None, bg=None, fg=None)
+        TextFragment(x=0, y=1, text='b', bold=None, bg=None, fg=None)
+        """
+        return FragmentView(fragments_list)
+
+    def translate(self, dx=0, dy=0):
+        return FragmentView([self]).translate(dx=dx, dy=dy)
+
+    def clip(self, width, height):
+        return FragmentView([self]).clip(width, height)
+
+    def style(self, **kwargs):
+        return self.map(lambda x: x._replace(**kwargs))
+
+    def walk(self, dx=0, dy=0, rect=None):
+        for fragment in self:
+            if dx or dy:
+                fragment = fragment.move(dx=dx, dy=dy)
+            if rect is not None:
+                fragment = rect.clip_fragment(fragment)
+            if fragment is not None and fragment.text:
+                yield fragment
+
+class FragmentView:
+
+    """
+    I am fragments with a pending translation and clip rectangle.
+
+    Consecutive translations and clips collapse into one view and fragments
+    are not touched until someone walks them:
+
+    >>> fragments = Fragments([
+    ...     TextFragment(0, 0, "hello"),
+    ...     TextFragment(0, 3, "below"),
+    ... ])
+    >>> view = fragments.translate(dx=-1).clip(3, 2).translate(dx=2, dy=1)
+    >>> view.parts[0] is fragments, view.dx, view.dy, view.rect
+    (True, 1, 1, ClipRect(left=2, right=5, bottom=3))
+    >>> view.print()
+    TextFragment(x=2, y=1, text='ell', bold=None, bg=None, fg=None)
+
+    Views of views are walked in one pass, with the transformations combined
+    before they reach the fragments:
+
+    >>> Fragments.concat([
+    ...     view,
+    ...     Fragments([TextFragment(0, 0, "abc")]).clip(1, 1),
+    ... ]).translate(dy=1).print()
+    TextFragment(x=2, y=2, text='ell', bold=None, bg=None, fg=None)
+    TextFragment(x=0, y=1, text='a', bold=None, bg=None, fg=None)
+    """
+
+    __slots__ = ["parts", "dx", "dy", "rect"]
+
+    def __init__(self, parts, dx=0, dy=0, rect=None):
+        self.parts = parts
+        self.dx = dx
+        self.dy = dy
+        self.rect = rect
+
+    def translate(self, dx=0, dy=0):
+        return FragmentView(
+            self.parts,
+            self.dx+dx,
+            self.dy+dy,
+            None if self.rect is None else self.rect.move(dx=dx, dy=dy)
+        )
+
+    def clip(self, width, height):
+        return FragmentView(
+            self.parts,
+            self.dx,
+            self.dy,
+            ClipRect(left=0, right=width, bottom=height).intersect(self.rect)
+        )
+
+    def style(self, **kwargs):
+        return Fragments(self).style(**kwargs)
+
+    def merge(self, fragments):
+        return FragmentView([self, fragments])
+
+    def walk(self, dx=0, dy=0, rect=None):
+        if self.rect is not None:
+            rect = self.rect.move(dx=dx, dy=dy).intersect(rect)
+        for part in self.parts:
+            yield from Fragments.create(part).walk(self.dx+dx, self.dy+dy, rect)
+
+    def print(self):
+        for fragment in self:
+            print(fragment)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __iter__(self):
+        return self.walk()
+
+class ClipRect(
+    namedtuple("ClipRect", "left right bottom")
+):
+
+    """
+    I keep fragments with y above bottom and cut their text to the columns
+    between left and right.
+
+    >>> ClipRect(left=1, right=3, bottom=1).clip_fragment(TextFragment(0, 0, "hello"))
+    TextFragment(x=1, y=0, text='el', bold=None, bg=None, fg=None)
+    >>> ClipRect(left=1, right=3, bottom=1).clip_fragment(TextFragment(0, 1, "hello")) is None
+    True
+    """
+
+    def move(self, dx=0, dy=0):
+        return self._replace(
+            left=self.left+dx,
+            right=self.right+dx,
+            bottom=self.bottom+dy
+        )
+
+    def intersect(self, other):
+        if other is None:
+            return self
+        return ClipRect(
+            left=max(self.left, other.left),
+            right=min(self.right, other.right),
+            bottom=min(self.bottom, other.bottom)
+        )
+
+    def clip_fragment(self, fragment):
+        if fragment.y >= self.bottom:
+            return None
+        start = max(self.left-fragment.x, 0)
+        end = max(self.right-fragment.x, start)
+        return fragment._replace(
+            text=fragment.text[start:end],
+            x=max(fragment.x, self.left)
+        )
+
+class FragmentColumns:
+
+    """
+    I store text fragments as parallel columns of x, y, style id and start/end
+    offsets into one shared text buffer. Styles are interned in a table.
+
+    Translating, clipping and merging work on whole columns (with NumPy if it
+    is installed) and never copy or slice the text:
+
+    >>> columns = FragmentColumns.create([
+    ...     TextFragment(0, 0, "hello", fg="RED"),
+    ...     TextFragment(-2, 1, "there"),
+    ...     TextFragment(1, 5, "below"),
+    ... ])
+    >>> columns.transform(dx=1, rect=ClipRect(left=0, right=4, bottom=2)).print()
+    TextFragment(x=1, y=0, text='hel', bold=None, bg=None, fg='RED')
+    TextFragment(x=0, y=1, text='here', bold=None, bg=None, fg=None)
+
+    >>> columns.style(bg="GREEN").merge([TextFragment(0, 2, "!")]).print()
+    TextFragment(x=0, y=0, text='hello', bold=None, bg='GREEN', fg='RED')
+    TextFragment(x=-2, y=1, text='there', bold=None, bg='GREEN', fg=None)
+    TextFragment(x=1, y=5, text='below', bold=None, bg='GREEN', fg=None)
+    TextFragment(x=0, y=2, text='!', bold=None, bg=None, fg=None)
+
+    I can be used in a terminal:
+
+    >>> Terminal.create(fragments=[
+    ...     TextFragment(x=0, y=0, text="1111111111"),
+    ...     TextFragment(x=0, y=0, text="2"),
+    ... ]).compact().translate(dx=1).print_ascii_layout()
+     2111111111
+    """
+
+    __slots__ = ["xs", "ys", "style_ids", "starts", "ends", "styles", "text"]
+
+    def __init__(self, xs, ys, style_ids, starts, ends, styles, text):
+        self.xs = xs
+        self.ys = ys
+        self.style_ids = style_ids
+        self.starts = starts
+        self.ends = ends
+        self.styles = styles
+        self.text = text
+
+    @staticmethod
+    def create(fragments):
+        if isinstance(fragments, FragmentColumns):
+            return fragments
+        styles = {}
+        columns = ([], [], [], [], [])
+        texts = []
+        pos = 0
+        for fragment in fragments:
+            for column, value in zip(columns, (
+                fragment.x,
+                fragment.y,
+                styles.setdefault((fragment.bold, fragment.bg, fragment.fg), len(styles)),
+                pos,
+                pos+len(fragment.text),
+            )):
+                column.append(value)
+            texts.append(fragment.text)
+            pos += len(fragment.text)
+        return FragmentColumns(
+            *(_column(column) for column in columns),
+            styles=tuple(styles),
+            text="".join(texts)
+        )
+
+    @staticmethod
+    def concat(fragments_list):
+        columns_list = [FragmentColumns.create(x) for x in fragments_list]
+        styles = {}
+        style_ids = []
+        starts = []
+        ends = []
+        pos = 0
+        for columns in columns_list:
+            style_map = _column([
+                styles.setdefault(style, len(styles))
+                for style in columns.styles
+            ])
+            style_ids.append(_take(style_map, columns.style_ids))
+            starts.append(_add(columns.starts, pos))
+            ends.append(_add(columns.ends, pos))
+            pos += len(columns.text)
+        result = FragmentColumns(
+            xs=_concat([x.xs for x in columns_list]),
+            ys=_concat([x.ys for x in columns_list]),
+            style_ids=_concat(style_ids),
+            starts=_concat(starts),
+            ends=_concat(ends),
+            styles=tuple(styles),
+            text="".join(x.text for x in columns_list)
+        )
+        return result._select(_nonempty(result.starts, result.ends))
+
+    def merge(self, fragments):
+        return FragmentColumns.concat([self, fragments])
+
+    def translate(self, dx=0, dy=0):
+        return FragmentView([self]).translate(dx=dx, dy=dy)
+
+    def clip(self, width, height):
+        return FragmentView([self]).clip(width, height)
+
+    def transform(self, dx=0, dy=0, rect=None):
+        """
+        Translate and then clip all fragments right away.
+        """
+        if dx or dy:
+            columns = self._replace(xs=_add(self.xs, dx), ys=_add(self.ys, dy))
+        else:
+            columns = self
+        if rect is None:
+            return columns
+        visible = columns._select(_less(columns.ys, rect.bottom))
+        skip = _maximum(_add(_negate(visible.xs), rect.left), 0)
+        starts = _minimum(_add(visible.starts, skip), visible.ends)
+        ends = _maximum(
+            starts,
+            _minimum(
+                visible.ends,
+                _add(_add(visible.starts, rect.right), _negate(visible.xs))
+            )
+        )
+        clipped = visible._replace(
+            xs=_maximum(visible.xs, rect.left),
+            starts=starts,
+            ends=ends
+        )
+        return clipped._select(_nonempty(starts, ends))
+
+    def walk(self, dx=0, dy=0, rect=None):
+        columns = self.transform(dx, dy, rect)
+        return iter(columns._select(_nonempty(columns.starts, columns.ends)))
+
+    def style(self, **kwargs):
+        return self._replace(styles=tuple(
+            tuple(TextFragment(0, 0, "", *style)._replace(**kwargs)[3:])
+            for style in self.styles
+        ))
+
+    def print(self):
+        for fragment in self:
+            print(fragment)
+
+    def _replace(self, **kwargs):
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(kwargs)
+        return FragmentColumns(**fields)
+
+    def _select(self, mask):
+        return self._replace(**{
+            name: _compress(getattr(self, name), mask)
+            for name in ["xs", "ys", "style_ids", "starts", "ends"]
+        })
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __iter__(self):
+        text = self.text
+        styles = self.styles
+        for x, y, style_id, start, end in zip(
+            self.xs, self.ys, self.style_ids, self.starts, self.ends
+        ):
+            yield TextFragment(int(x), int(y), text[start:end], *styles[style_id])
+
+def changed_rows(old_rows, new_rows):
+    """
+    Return the rows (see Terminal.get_rows) that differ between two frames:
+
+    >>> changed_rows({0: ("a",), 1: ("b",)}, {1: ("b",), 2: ("c",)})
+    [0, 2]
+    """
+    return sorted(
+        y
+        for y in old_rows.keys() | new_rows.keys()
+        if old_rows.get(y) != new_rows.get(y)
+    )
+
+if numpy is not None:
+    def _column(values):
+        return numpy.array(values, dtype=numpy.int64)
+    def _concat(columns):
+        return numpy.concatenate(columns) if columns else _column([])
+    _add = numpy.add
+    _negate = numpy.negative
+    _maximum = numpy.maximum
+    _minimum = numpy.minimum
+    _less = numpy.less
+    def _take(values, indices):
+        return values[indices]
+    def _compress(values, mask):
+        return values[mask]
+    def _nonempty(starts, ends):
+        return starts < ends
+else:
+    def _column(values):
+        return array("q", values)
+    def _concat(columns):
+        result = array("q")
+        for column in columns:
+            result.extend(column)
+        return result
+    def _add(values, other):
+        if isinstance(other, int):
+            return array("q", [x+other for x in values])
+        return array("q", [x+y for x, y in zip(values, other)])
+    def _negate(values):
+        return array("q", [-x for x in values])
+    def _maximum(values, other):
+        if isinstance(other, int):
+            return array("q", [max(x, other) for x in values])
+        return array("q", [max(x, y) for x, y in zip(values, other)])
+    def _minimum(values, other):
+        if isinstance(other, int):
+            return array("q", [min(x, other) for x in values])
+        return array("q", [min(x, y) for x, y in zip(values, other)])
+    def _less(values, limit):
+        return [x < limit for x in values]
+    def _take(values, indices):
+        return array("q", [values[x] for x in indices])
+    def _compress(values, mask):
+        return array("q", [x for x, keep in zip(values, mask) if keep])
+    def _nonempty(starts, ends):
+        return [start < end for start, end in zip(starts, ends)]
 
 class KeyboardEvent(
-    namedtuple("KeyboardEvent", "unicode_character")
+    namedtuple("KeyboardEvent", "unicode_character key", defaults=[None])
 ):
     pass
 
+class TextEvent(
+    namedtuple("TextEvent", "text")
+):
+
+    """
+    I insert a whole string at once, for example when pasting.
+
+    >>> TextEvent("x"*100)
+    TextEvent(text='xxxxxxxxxxxxxxxxxxxx'..., 100 characters)
+    """
+
+    def __repr__(self):
+        if len(self.text) > 20:
+            return f"TextEvent(text={self.text[:20]!r}..., {len(self.text)} characters)"
+        return super().__repr__()
+
 class SizeEvent(
     namedtuple("SizeEvent", "width height")
 ):
@@ -215,8 +651,3 @@ class SizeEvent(
         return self._replace(
             height=(self.height if height is None else height)+dh
         )
-
-class MeasurementEvent(
-    namedtuple("MeasurementEvent", "ms_project ms_repaint")
-):
-    pass
@@ -0,0 +1,102 @@
+from collections import namedtuple
+import os
+
+from rlprojectlib.domains.generic import Document
+from rlprojectlib.domains.generic import ImmutableList
+from rlprojectlib.domains.generic import Selections
+from rlprojectlib.domains.string import Selection
+from rlprojectlib.domains.string import String
+
+class SearchTree(
+    namedtuple("SearchTree", "meta root files edits"),
+    Document
+):
+
+    """
+    I am the result of a search across files: the files under root with
+    lines that matched, and the matches selected in those lines.
+
+    Editing me edits all selected matches. The edits that made me are kept
+    in edits as (path, row, old line, new line) so that they can be written
+    back to the files.
+
+    >>> tree = SearchTree.create("/project").merge([
+    ...     FileHits.create("./foo.py", [(0, "this foo is cool", [(5, 3)])]),
+    ...     FileHits.create("./foo/sub.py", [(4, "a sub foo is also foo", [(6, 3), (18, 3)])]),
+    ... ])
+    >>> tree.hit_count
+    3
+    >>> for character in "bar":
+    ...     tree = tree.replace(character)
+    >>> [str(line.string.string) for file in tree.files for line in file.lines]
+    ['this bar is cool', 'a sub bar is also bar']
+    >>> for edit in tree.edits:
+    ...     print(edit)
+    ('/project/foo.py', 0, 'this ba is cool', 'this bar is cool')
+    ('/project/foo/sub.py', 4, 'a sub ba is also ba', 'a sub bar is also bar')
+    """
+
+    @staticmethod
+    def create(root, files=(), meta=None):
+        return SearchTree(
+            meta=meta,
+            root=root,
+            files=ImmutableList(files),
+            edits=()
+        )
+
+    @property
+    def hit_count(self):
+        return sum(
+            len(line.string.selections)
+            for file in self.files
+            for line in file.lines
+        )
+
+    def merge(self, files):
+        return self._replace(files=self.files.merge(files), edits=())
+
+    def replace(self, text):
+        files = []
+        edits = []
+        for file in self.files:
+            lines = []
+            for line in file.lines:
+                new_line = line._replace(string=line.string.replace(text))
+                edits.append((
+                    os.path.normpath(os.path.join(self.root, file.path)),
+                    line.row,
+                    str(line.string.string),
+                    str(new_line.string.string)
+                ))
+                lines.append(new_line)
+            files.append(file._replace(lines=tuple(lines)))
+        return self._replace(files=ImmutableList(files), edits=tuple(edits))
+
+class FileHits(
+    namedtuple("FileHits", "path lines")
+):
+
+    @staticmethod
+    def create(path, lines):
+        """
+        Lines are given as (row, text, [(start, length), ...]).
+        """
+        return FileHits(
+            path=path,
+            lines=tuple(
+                HitLine(
+                    row=row,
+                    string=String.from_string(text)._replace(selections=Selections(
+                        Selection(start=start, length=length)
+                        for start, length in matches
+                    ))
+                )
+                for row, text, matches in lines
+            )
+        )
+
+class HitLine(
+    namedtuple("HitLine", "row string")
+):
+    pass
@@ -0,0 +1,112 @@
+import bisect
+import re
+
+from rlprojectlib.domains.block_index import BlockIndex
+from rlprojectlib.domains.rope import Rope
+
+WORD = re.compile(r"\w+")
+
+class WordIndex(BlockIndex):
+
+    """
+    I find words and occurrences of text in a rope.
+
+    Every word maps to the blocks of lines that contain it, so finding the
+    occurrences of a text only scans the blocks that contain all of its
+    words. Words never span lines, so the word at a position is found in
+    the block of that position.
+
+    >>> index = WordIndex(block_lines=2)
+    >>> rope = Rope.from_string("foo bar\\nbaz\\n\\nfoo foobar foo")
+    >>> index.word_at(rope, 0), index.word_at(rope, 3), index.word_at(rope, 12)
+    ((0, 3), (0, 3), (13, 16))
+    >>> index.word_at(rope, 100) is None
+    True
+    >>> index.occurrences(rope, "foo")
+    [(0, 3), (13, 16), (24, 27)]
+    >>> index.next_occurrence(rope, "foo", 4)
+    (13, 16)
+    >>> index.next_occurrence(rope, "foo", 25) is None
+    True
+
+    Only ends of text that are word characters must be at word boundaries:
+
+    >>> index.occurrences(rope, " foo")
+    [(23, 27)]
+    >>> index.occurrences(rope, "\\nbaz")
+    [(7, 11)]
+
+    Text with newlines is found across blocks:
+
+    >>> index.occurrences(rope, "baz\\n\\nfoo"), index.occurrences(rope, "\\n")
+    ([(8, 16)], [(7, 8), (11, 12), (12, 13)])
+
+    Edits re-index only the blocks they touch:
+
+    >>> index.occurrences(rope.edit([(4, 7, "foo")]), "foo")
+    [(0, 3), (4, 7), (13, 16), (24, 27)]
+    """
+
+    def keys(self, text):
+        return set(WORD.findall(text))
+
+    def word_at(self, rope, index):
+        """
+        Return (start, end) of the word that contains (or ends at) index, or
+        of the first word after it.
+        """
+        self.update(rope)
+        offsets = self.offsets()
+        position = max(0, bisect.bisect_right(offsets, index) - 1)
+        while position < len(self.blocks):
+            for match in WORD.finditer(self.block_text(position)):
+                start = offsets[position] + match.start()
+                end = offsets[position] + match.end()
+                if end >= index:
+                    return (start, end)
+            position += 1
+        return None
+
+    def occurrences(self, rope, text):
+        """
+        Return (start, end) of all occurrences of text that are not parts of
+        longer words.
+        """
+        return list(self._find(rope, text, 0))
+
+    def next_occurrence(self, rope, text, index):
+        """
+        Return (start, end) of the first occurrence of text that starts at or
+        after index.
+        """
+        return next(self._find(rope, text, index), None)
+
+    def _find(self, rope, text, index):
+        self.update(rope)
+        if not text:
+            return
+        # Lookbehind after the text keeps the fast search for its prefix
+        regex = re.compile(
+            re.escape(text) +
+            (r"(?<!\w" + re.escape(text) + ")" if WORD.match(text[:1]) else "") +
+            (r"(?!\w)" if WORD.match(text[-1:]) else "")
+        )
+        offsets = self.offsets()
+        # Occurrences start in a block that has the words of the first line
+        # of text
+        candidates = self.candidates(self.keys(text.split("\n", 1)[0]))
+        first = bisect.bisect_left(
+            candidates,
+            bisect.bisect_right(offsets, index) - 1
+        )
+        for position in candidates[first:]:
+            offset = offsets[position]
+            if "\n" in text:
+                # Text with newlines can go on past the end of the block
+                block = self.rope[offset:offsets[position+1]+len(text)]
+            else:
+                block = self.block_text(position)
+            for match in regex.finditer(block, max(0, index-offset)):
+                if match.start() >= offsets[position+1] - offset:
+                    break
+                yield (offset+match.start(), offset+match.end())
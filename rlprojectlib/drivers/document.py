@@ -0,0 +1,297 @@
+import threading
+import time
+import traceback
+
+from rlprojectlib.domains.terminal import TextEvent
+from rlprojectlib.drivers.telemetry import Telemetry
+from rlprojectlib.projections.trace import TRACER
+
+class DocumentProjectionDriver:
+
+    """
+    I hold a document and its projection and turn events into new documents.
+
+    I know nothing about how the projection is shown. See WxTerminalDriver
+    and HeadlessTerminalDriver.
+
+    I record how long projections take in telemetry that the drivers showing
+    the projection add their own measurements to.
+
+    If I have a journal, I record changes to the document string in it. If I
+    have a history, I record them there too so that they can be undone.
+
+    Resources (workers that the document uses) are closed when I am closed.
+    Idle workers (such as a Highlighter) do their work in slices when idle
+    is called.
+
+    Background work that the projection shows (such as a running search)
+    calls invalidate when it has progressed. I pass that on to on_invalidate
+    so that whoever shows the projection can refresh it.
+    """
+
+    def __init__(self, document, projection_fn, telemetry=None, journal=None, history=None, resources=(), idle_workers=()):
+        self.document = document
+        self.projection_fn = projection_fn
+        self.telemetry = Telemetry() if telemetry is None else telemetry
+        self.journal = journal
+        self.history = history
+        self.resources = resources
+        self.idle_workers = idle_workers
+        self.on_invalidate = None
+        self._project()
+
+    def size_event(self, event):
+        with TRACER.frame("SizeEvent"):
+            self._set_document(self.terminal.size_event(event))
+            return self._project()
+
+    def keyboard_event(self, event):
+        with TRACER.frame("KeyboardEvent"):
+            self._set_document(self.terminal.keyboard_event(event))
+            return self._project()
+
+    def text_event(self, event):
+        with TRACER.frame("TextEvent"):
+            self._set_document(self.terminal.text_event(event))
+            return self._project()
+
+    def save(self):
+        if self.journal is not None:
+            self.journal.compact(self.document.string)
+        return self.terminal
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+        for resource in self.resources:
+            resource.close()
+
+    def invalidate(self):
+        """
+        Can be called from any thread.
+        """
+        if self.on_invalidate is not None:
+            self.on_invalidate()
+
+    def idle(self):
+        """
+        Let every idle worker do a slice of its work and project the document
+        again if any of them did something. Return True if they did, so that
+        idle is called again when there is nothing more urgent to do.
+        """
+        with TRACER.frame("Idle"):
+            if not any([worker.idle() for worker in self.idle_workers]):
+                return False
+            self._project()
+            return True
+
+    def _set_document(self, document):
+        if self.journal is not None:
+            self.journal.record(self.document.string, document.string)
+        if self.history is not None:
+            self.history.record(self.document, document)
+        self.document = document
+
+    def refresh(self):
+        """
+        Project the same document again. Cached panes are reused, so this is
+        cheap, and it shows the latest telemetry in the status bar.
+        """
+        with TRACER.frame("Refresh"):
+            return self._project()
+
+    def _project(self):
+        self.terminal = self.telemetry.measure(
+            "project",
+            lambda: self.projection_fn(self.document)
+        )
+        return self.terminal
+
+class AsyncDocumentProjectionDriver:
+
+    """
+    I wrap a DocumentProjectionDriver and run it on a worker thread so that
+    the thread posting events never waits for a projection.
+
+    Events that arrive while a projection is running are applied together
+    in the next batch. When no events are waiting, I let the driver do its
+    idle work. Frames for documents that are already out of date are
+    dropped unless no frame has been published for max_delay seconds, so
+    that the screen keeps up even when input never stops.
+
+    >>> from rlprojectlib.domains.string import String
+    >>> from rlprojectlib.domains.terminal import KeyboardEvent
+    >>> from rlprojectlib.projections.terminal.editor import Editor
+    >>> frames = []
+    >>> driver = AsyncDocumentProjectionDriver(
+    ...     DocumentProjectionDriver(
+    ...         Editor.create_document(String.from_string("")),
+    ...         Editor.project
+    ...     ),
+    ...     on_frame=frames.append
+    ... )
+    >>> for character in "hello":
+    ...     _ = driver.keyboard_event(KeyboardEvent(unicode_character=character))
+    >>> driver.wait_idle()
+    >>> driver.document.string
+    'hello'
+    >>> frames[-1] is driver.terminal
+    True
+    >>> 1 <= len(frames) <= 5
+    True
+    >>> driver.stop()
+    """
+
+    def __init__(self, driver, on_frame=None, max_delay=0.05):
+        self.driver = driver
+        self.driver.on_invalidate = self.invalidate
+        self.on_invalidate = None
+        self.on_frame = on_frame
+        self.max_delay = max_delay
+        self.telemetry = driver.telemetry
+        self.terminal = driver.terminal
+        self.pending = []
+        self.busy = False
+        self.idle_work = True
+        self.stopped = False
+        self.published_at = time.perf_counter()
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @property
+    def document(self):
+        return self.terminal.document
+
+    def size_event(self, event):
+        return self._post(self.driver.size_event, event)
+
+    def keyboard_event(self, event):
+        return self._post(self.driver.keyboard_event, event)
+
+    def text_event(self, event):
+        return self._post(self.driver.text_event, event)
+
+    def refresh(self):
+        return self._post(lambda event: self.driver.refresh(), None)
+
+    def save(self):
+        return self._post(lambda event: self.driver.save(), None)
+
+    def close(self):
+        self.stop()
+        self.driver.close()
+
+    def invalidate(self):
+        if self.on_invalidate is not None:
+            self.on_invalidate()
+
+    def wait_idle(self):
+        with self.condition:
+            while self.pending or self.busy or self.idle_work:
+                self.condition.wait()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def _post(self, fn, event):
+        """
+        I return the latest published frame. The frame for this event is
+        passed to on_frame when it is ready.
+        """
+        with self.condition:
+            self.pending.append((fn, event, time.perf_counter_ns()))
+            self.condition.notify_all()
+        return self.terminal
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.idle_work and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                batch = self._coalesce(self.pending)
+                self.pending = []
+                self.busy = bool(batch)
+            if not batch:
+                try:
+                    idle_work = self.driver.idle()
+                except Exception:
+                    traceback.print_exc()
+                    idle_work = False
+                if idle_work:
+                    self._publish(None)
+                with self.condition:
+                    self.idle_work = idle_work
+                    self.condition.notify_all()
+                continue
+            unpublished_since = None
+            for index, (fn, event, posted_at) in enumerate(batch):
+                if unpublished_since is None:
+                    unpublished_since = posted_at
+                try:
+                    fn(event)
+                except Exception:
+                    traceback.print_exc()
+                with self.condition:
+                    up_to_date = index == len(batch) - 1 and not self.pending
+                if up_to_date or time.perf_counter() - self.published_at >= self.max_delay:
+                    self._publish(unpublished_since)
+                    unpublished_since = None
+            with self.condition:
+                self.busy = False
+                # The events may have given the idle workers more to do
+                self.idle_work = True
+                self.condition.notify_all()
+
+    def _coalesce(self, batch):
+        """
+        Runs of typed characters are inserted with one text event.
+        """
+        coalesced = []
+        for fn, event, posted_at in batch:
+            if fn == self.driver.keyboard_event and is_printable(event):
+                if coalesced and coalesced[-1][0] == self.driver.text_event:
+                    _, text_event, first_posted_at = coalesced.pop()
+                    fn, event, posted_at = (
+                        self.driver.text_event,
+                        TextEvent(text_event.text+event.unicode_character),
+                        first_posted_at
+                    )
+                else:
+                    fn, event = (
+                        self.driver.text_event,
+                        TextEvent(event.unicode_character)
+                    )
+            coalesced.append((fn, event, posted_at))
+        return coalesced
+
+    def _publish(self, posted_at):
+        """
+        Frames made by idle work have no posted_at and no latency.
+        """
+        if posted_at is not None:
+            self.telemetry.record("latency", time.perf_counter_ns() - posted_at)
+        self.published_at = time.perf_counter()
+        with self.condition:
+            self.terminal = self.driver.terminal
+        if self.on_frame is not None:
+            self.on_frame(self.terminal)
+
+def is_printable(event):
+    """
+    >>> from rlprojectlib.domains.terminal import KeyboardEvent
+    >>> is_printable(KeyboardEvent("a")), is_printable(KeyboardEvent("\\x07"))
+    (True, False)
+    >>> is_printable(KeyboardEvent("\\x00", key="PAGE_DOWN"))
+    False
+    """
+    return (
+        event.key is None and
+        len(event.unicode_character) == 1 and
+        ord(event.unicode_character) >= 32
+    )
@@ -0,0 +1,126 @@
+from collections import namedtuple
+
+from rlprojectlib.domains.terminal import KeyboardEvent
+from rlprojectlib.domains.terminal import SizeEvent
+from rlprojectlib.domains.terminal import TextEvent
+from rlprojectlib.domains.terminal import changed_rows
+
+class Cell(
+    namedtuple("Cell", "character bold bg fg")
+):
+    pass
+
+EMPTY_CELL = Cell(" ", None, None, None)
+
+class HeadlessTerminalDriver:
+
+    """
+    I feed events to a DocumentProjectionDriver and composite the frames it
+    produces into an in-memory grid of cells. I need no GUI, so I can be used
+    to test and benchmark the editor anywhere.
+
+    >>> from rlprojectlib.domains.string import String
+    >>> from rlprojectlib.drivers.document import DocumentProjectionDriver
+    >>> from rlprojectlib.projections.terminal.editor import Editor
+    >>> driver = HeadlessTerminalDriver(
+    ...     DocumentProjectionDriver(
+    ...         Editor.create_document(String.from_string("hello\\nworld")),
+    ...         Editor.project
+    ...     ),
+    ...     width=12,
+    ...     height=6
+    ... )
+    >>> driver.print_grid()
+    SizeEvent(wi
+    1 hello
+    2 world
+    <BLANKLINE>
+    ------------
+    hello\\nworld
+
+    >>> driver.type_text("hi ")
+    >>> driver.print_grid()
+    KeyboardEven
+    1 hi hello
+    2 world
+    <BLANKLINE>
+    ------------
+    hi hello\\nwo
+    >>> driver.cursors
+    [(5, 1)]
+
+    >>> driver.text_event("a\\nb ")
+    >>> driver.get_lines()[1:4]
+    ['1 hi a', '2 b hello', '3 world']
+
+    Only rows that changed are composited again:
+
+    >>> driver.keyboard_event("\\x06")
+    >>> driver.damaged_rows
+    [0, 2, 5]
+    """
+
+    def __init__(self, driver, width=80, height=24):
+        self.driver = driver
+        self.rows = {}
+        self.grid = []
+        self.cursors = []
+        self.damaged_rows = []
+        self.size_event(width, height)
+
+    def size_event(self, width, height):
+        self.width = width
+        self.height = height
+        self.grid = [[EMPTY_CELL]*width for _ in range(height)]
+        self.rows = {}
+        self.driver.size_event(SizeEvent(width=width, height=height))
+        self.driver.telemetry.measure("composite", self.composite)
+
+    def keyboard_event(self, unicode_character, key=None):
+        self.driver.keyboard_event(KeyboardEvent(
+            unicode_character=unicode_character,
+            key=key
+        ))
+        self.driver.telemetry.measure("composite", self.composite)
+
+    def text_event(self, text):
+        self.driver.text_event(TextEvent(text=text))
+        self.driver.telemetry.measure("composite", self.composite)
+
+    def type_text(self, text):
+        for character in text:
+            self.keyboard_event(character)
+
+    def composite(self):
+        terminal = self.driver.terminal
+        rows = terminal.get_rows()
+        self.damaged_rows = [
+            y
+            for y in changed_rows(self.rows, rows)
+            if 0 <= y < self.height
+        ]
+        for y in self.damaged_rows:
+            line = [EMPTY_CELL]*self.width
+            for fragment in rows.get(y, []):
+                for index, character in enumerate(fragment.text):
+                    x = fragment.x + index
+                    if 0 <= x < self.width:
+                        line[x] = Cell(
+                            character,
+                            fragment.bold,
+                            fragment.bg,
+                            fragment.fg
+                        )
+            self.grid[y] = line
+        self.rows = rows
+        self.cursors = [(cursor.x, cursor.y) for cursor in terminal.cursors]
+
+    def get_lines(self):
+        return [
+            "".join(cell.character for cell in line).rstrip()
+            for line in self.grid
+        ]
+
+    def print_grid(self):
+        for line in self.get_lines():
+            print(line)
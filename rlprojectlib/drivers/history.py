@@ -0,0 +1,157 @@
+from collections import deque
+from collections import namedtuple
+import time
+
+from rlprojectlib.domains.generic import ImmutableList
+from rlprojectlib.domains.rope import Rope
+
+EDIT_SIZE = 32
+
+class UndoGroup(
+    namedtuple("UndoGroup", "steps selections_before selections_after size")
+):
+
+    """
+    Steps are (edits, inverse edits) in the order they were made.
+    """
+
+class EditHistory:
+
+    """
+    I remember how the string of a document changed so that changes can be
+    undone and redone.
+
+    I store the edits of every change and the edits that revert it, not
+    copies of the string, so undoing or redoing costs as much as the change
+    did. Changes made within group_interval seconds of each other are undone
+    together. When the edits I store take up more than max_size characters,
+    the oldest groups are forgotten.
+
+    >>> from rlprojectlib.domains.string import String
+    >>> clock = iter([0, 0.1, 5, 10]).__next__
+    >>> history = EditHistory(group_interval=1, clock=clock)
+    >>> document = String.from_string("hello")
+    >>> for text in ["a", "b", "c"]:
+    ...     new_document = document.replace(text)
+    ...     history.record(document, new_document)
+    ...     document = new_document
+    >>> document.string
+    'abchello'
+    >>> document = history.undo(document)
+    >>> document
+    String(meta=None, string='abhello', selections=Selections(Selection(start=2, length=0)))
+    >>> document = history.undo(document)
+    >>> document.string
+    'hello'
+    >>> history.undo(document) is document
+    True
+    >>> document = history.redo(document)
+    >>> document.string
+    'abhello'
+
+    A new change forgets what was undone:
+
+    >>> new_document = document.replace("x")
+    >>> history.record(document, new_document)
+    >>> history.redo(new_document) is new_document
+    True
+
+    Documents that undo and redo returned are not recorded again:
+
+    >>> history.record(new_document, history.undo(new_document))
+    >>> len(history.undo_groups), len(history.redo_groups)
+    (1, 1)
+
+    The oldest groups are forgotten when the history grows too big:
+
+    >>> history = EditHistory(group_interval=0, max_size=2*EDIT_SIZE+10)
+    >>> document = String.from_string("")
+    >>> for text in ["one", "two", "three"]:
+    ...     new_document = document.replace(text)
+    ...     history.record(document, new_document)
+    ...     document = new_document
+    >>> len(history.undo_groups), history.size
+    (2, 72)
+    """
+
+    def __init__(self, group_interval=1.0, max_size=16*1024*1024, clock=time.monotonic):
+        self.group_interval = group_interval
+        self.max_size = max_size
+        self.clock = clock
+        self.undo_groups = deque()
+        self.redo_groups = []
+        self.size = 0
+        self.current = None
+        self.recorded_at = None
+
+    def record(self, document, new_document):
+        old = Rope.create(document.string)
+        new = Rope.create(new_document.string)
+        if new is self.current or old.root is new.root:
+            return
+        edits = old.diff(new)
+        inverse = []
+        delta = 0
+        for start, end, text in edits:
+            inverse.append((start+delta, start+delta+len(text), old[start:end]))
+            delta += len(text) - (end - start)
+        size = sum(
+            len(text) + len(old_text) + EDIT_SIZE
+            for (_, _, text), (_, _, old_text) in zip(edits, inverse)
+        )
+        now = self.clock()
+        self.redo_groups = []
+        if (
+            self.undo_groups and
+            self.current is old and
+            self.recorded_at is not None and
+            now - self.recorded_at < self.group_interval
+        ):
+            group = self.undo_groups.pop()
+            self.size -= group.size
+            group = group._replace(
+                steps=group.steps.add((edits, inverse)),
+                selections_after=new_document.selections,
+                size=group.size+size
+            )
+        else:
+            group = UndoGroup(
+                steps=ImmutableList([(edits, inverse)]),
+                selections_before=document.selections,
+                selections_after=new_document.selections,
+                size=size
+            )
+        self.undo_groups.append(group)
+        self.size += group.size
+        while self.undo_groups and self.size > self.max_size:
+            self.size -= self.undo_groups.popleft().size
+        self.current = new
+        self.recorded_at = now
+
+    def undo(self, document):
+        if not self.undo_groups:
+            return document
+        group = self.undo_groups.pop()
+        self.size -= group.size
+        self.redo_groups.append(group)
+        rope = Rope.create(document.string)
+        for _, inverse in reversed(group.steps):
+            rope = rope.edit(inverse)
+        return self._restore(document, rope, group.selections_before)
+
+    def redo(self, document):
+        if not self.redo_groups:
+            return document
+        group = self.redo_groups.pop()
+        self.undo_groups.append(group)
+        self.size += group.size
+        rope = Rope.create(document.string)
+        for edits, _ in group.steps:
+            rope = rope.edit(edits)
+        return self._restore(document, rope, group.selections_after)
+
+    def _restore(self, document, rope, selections):
+        self.current = rope
+        # The next change starts a new group
+        self.recorded_at = None
+        return document._replace(string=rope, selections=selections)
@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+import time
+import zlib
+
+from rlprojectlib.domains.rope import Rope
+
+class EditJournal:
+
+    """
+    I make edits to a file durable without rewriting the file. Edits are
+    appended to a journal next to it by a background thread that syncs them
+    to disk in batches. After a crash, opening the file again replays the
+    journal.
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "document.txt")
+    >>> with open(path, "w") as f:
+    ...     _ = f.write("hello world\\n")
+
+    >>> journal = EditJournal.open(path)
+    >>> rope = journal.rope
+    >>> edited = rope.replace(0, 5, "goodbye")
+    >>> journal.record(rope, edited)
+    >>> journal.record(edited, edited.insert(0, "oh "))
+    >>> journal.close()
+
+    The file is untouched, but the edits are replayed when it is opened again:
+
+    >>> open(path).read()
+    'hello world\\n'
+    >>> journal = EditJournal.open(path)
+    >>> journal.rope
+    'oh goodbye world\\n'
+
+    A record that was only partly written when the editor crashed is ignored:
+
+    >>> with open(journal.journal_path, "a") as f:
+    ...     _ = f.write('0badc0de [[0, 0, "lost"')
+    >>> journal.close()
+    >>> journal = EditJournal.open(path)
+    >>> journal.rope
+    'oh goodbye world\\n'
+
+    Compaction writes the document to the file and empties the journal:
+
+    >>> journal.compact(journal.rope.insert(0, "> "))
+    >>> journal.close()
+    >>> open(path).read()
+    '> oh goodbye world\\n'
+    >>> EditJournal.open(path).rope
+    '> oh goodbye world\\n'
+    """
+
+    def __init__(self, path, rope, sync_interval=0.2):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.rope = rope
+        self.sync_interval = sync_interval
+        self.pending = []
+        self.writing = False
+        self.flushing = False
+        self.closing = False
+        self.condition = threading.Condition()
+        self.file_lock = threading.Lock()
+        self.file = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def open(path, sync_interval=0.2):
+        """
+        Load the file, replay the journal if it belongs to the file, and start
+        appending to it.
+        """
+        rope = Rope.from_file(path)
+        journal = EditJournal(path, rope, sync_interval)
+        header = journal._header()
+        good_size = 0
+        try:
+            with open(journal.journal_path, "rb") as f:
+                header_line = f.readline()
+                if json.loads(header_line) == header:
+                    good_size = len(header_line)
+                    for line in f:
+                        edits = _decode_record(line)
+                        if edits is None:
+                            break
+                        rope = rope.edit(edits)
+                        good_size += len(line)
+        except (OSError, ValueError):
+            pass
+        journal.rope = rope
+        if good_size:
+            journal.file = open(journal.journal_path, "r+b")
+            journal.file.truncate(good_size)
+            journal.file.seek(good_size)
+        else:
+            journal._start_journal()
+        journal.thread.start()
+        return journal
+
+    def record(self, old_rope, new_rope):
+        if old_rope is new_rope:
+            return
+        edits = old_rope.diff(new_rope)
+        if edits:
+            with self.condition:
+                self.pending.append(_encode_record(edits))
+                self.condition.notify_all()
+
+    def flush(self):
+        with self.condition:
+            self.flushing = True
+            self.condition.notify_all()
+            while self.pending or self.writing:
+                self.condition.wait()
+            self.flushing = False
+
+    def compact(self, rope):
+        """
+        Write the document to the file (through a temporary file, so the old
+        file survives a crash) and start an empty journal.
+        """
+        self.flush()
+        with self.file_lock:
+            temporary_path = self.path + ".tmp"
+            with open(temporary_path, "wb") as f:
+                for _, text in rope.chunks():
+                    f.write(text.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary_path, self.path)
+            self.file.close()
+            self._start_journal()
+
+    def close(self):
+        self.flush()
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        self.thread.join()
+        self.file.close()
+
+    def _header(self):
+        stat = os.stat(self.path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _start_journal(self):
+        self.file = open(self.journal_path, "wb")
+        self.file.write(json.dumps(self._header()).encode("utf-8")+b"\n")
+        self._sync()
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closing:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                # Give more edits a chance to share the fsync
+                deadline = time.monotonic() + self.sync_interval
+                while not (self.flushing or self.closing):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                records = self.pending
+                self.pending = []
+                self.writing = True
+            with self.file_lock:
+                self.file.write(b"".join(records))
+                self._sync()
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+def _encode_record(edits):
+    """
+    >>> _encode_record([(0, 1, "x")])
+    b'217e7747 [[0, 1, "x"]]\\n'
+    >>> _decode_record(_encode_record([(0, 1, "x")]))
+    [(0, 1, 'x')]
+    """
+    payload = json.dumps([list(edit) for edit in edits]).encode("utf-8")
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+def _decode_record(line):
+    if not line.endswith(b"\n") or len(line) < 10:
+        return None
+    checksum, payload = line[:8], line[9:-1]
+    if b"%08x" % zlib.crc32(payload) != checksum:
+        return None
+    return [tuple(edit) for edit in json.loads(payload)]
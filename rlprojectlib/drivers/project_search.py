@@ -0,0 +1,340 @@
+from collections import namedtuple
+import concurrent.futures
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+
+from rlprojectlib.domains.generic import ImmutableList
+from rlprojectlib.domains.tree import FileHits
+
+FILES_PER_TASK = 64
+MAX_FILE_SIZE = 10*1024*1024
+
+class ProjectSearchResults(
+    namedtuple("ProjectSearchResults", "pattern files scanned done error")
+):
+    pass
+
+class ProjectSearch:
+
+    """
+    I search all files under root for a regular expression in a pool of
+    processes and write edits of the matching lines back to the files.
+
+    Files are scanned in tasks of a few files each, so results stream in
+    (through on_progress, called from a background thread) while the tree
+    is still being walked.
+
+    >>> import tempfile
+    >>> root = tempfile.mkdtemp()
+    >>> os.mkdir(os.path.join(root, "foo"))
+    >>> with open(os.path.join(root, "foo.py"), "w") as f:
+    ...     _ = f.write("this foo is cool\\nnothing\\n")
+    >>> with open(os.path.join(root, "foo", "sub.py"), "w") as f:
+    ...     _ = f.write("a sub foo is also cool\\n")
+
+    >>> search = ProjectSearch(root, max_workers=2)
+    >>> _ = search.search("fo+")
+    >>> results = search.wait()
+    >>> results.done, results.scanned
+    (True, 2)
+    >>> for file in sorted(results.files):
+    ...     print(file.path, [(line.row, str(line.string.string)) for line in file.lines])
+    ./foo.py [(0, 'this foo is cool')]
+    ./foo/sub.py [(0, 'a sub foo is also cool')]
+
+    Edits are written back in batches:
+
+    >>> search.write([(os.path.join(root, "foo.py"), 0, "this foo is cool", "this b is cool")])
+    >>> search.write([(os.path.join(root, "foo.py"), 0, "this b is cool", "this bar is cool")])
+    >>> search.flush()
+    >>> open(os.path.join(root, "foo.py")).read()
+    'this bar is cool\\nnothing\\n'
+
+    Lines that changed on disk since they were found are left alone:
+
+    >>> search.write([(os.path.join(root, "foo.py"), 1, "changed", "x")])
+    >>> search.close()
+    >>> open(os.path.join(root, "foo.py")).read()
+    'this bar is cool\\nnothing\\n'
+    >>> search.conflicts
+    1
+
+    A pool that fails to start tasks ends the search with an error:
+
+    >>> class BrokenExecutor:
+    ...     def submit(self, *args):
+    ...         raise RuntimeError("pool is broken")
+    >>> search = ProjectSearch(root)
+    >>> search.executor = BrokenExecutor()
+    >>> _ = search.search("foo")
+    >>> results = search.wait()
+    >>> results.done, results.error
+    (True, 'pool is broken')
+    """
+
+    def __init__(self, root, on_progress=None, max_workers=None, sync_interval=0.2):
+        self.root = root
+        self.on_progress = on_progress
+        self.max_workers = max_workers
+        self.sync_interval = sync_interval
+        self.executor = None
+        self.results = None
+        self.generation = 0
+        self.futures = set()
+        self.outstanding = 0
+        self.walking = False
+        self.pending_writes = {}
+        self.writing = False
+        self.closing = False
+        self.conflicts = 0
+        self.condition = threading.Condition()
+        self.writer = None
+
+    def search(self, pattern):
+        """
+        Start searching for pattern, cancelling the running search.
+        """
+        with self.condition:
+            self._cancel_futures()
+            generation = self.generation
+            self.outstanding = 0
+            self.results = ProjectSearchResults(
+                pattern=pattern,
+                files=ImmutableList(),
+                scanned=0,
+                done=False,
+                error=None
+            )
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                self.results = self.results._replace(done=True, error=str(e))
+                return self.results
+            if self.executor is None:
+                # Forking a process with a GUI and threads is not safe
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            self.walking = True
+            threading.Thread(
+                target=self._walk,
+                args=(generation, pattern),
+                daemon=True
+            ).start()
+            return self.results
+
+    def cancel(self):
+        with self.condition:
+            self._cancel_futures()
+            self.results = None
+            self.condition.notify_all()
+
+    def wait(self):
+        with self.condition:
+            while self.results is not None and not self.results.done:
+                self.condition.wait()
+            return self.results
+
+    def write(self, edits):
+        """
+        Queue (path, row, old line, new line) edits. Only the first old line
+        and the last new line of a row are kept until the batch is written.
+        """
+        with self.condition:
+            for path, row, old, new in edits:
+                changes = self.pending_writes.setdefault(path, {})
+                if row in changes:
+                    old = changes[row][0]
+                changes[row] = (old, new)
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._run_writer, daemon=True)
+                self.writer.start()
+            self.condition.notify_all()
+
+    def flush(self):
+        with self.condition:
+            self.condition.notify_all()
+            while self.pending_writes or self.writing:
+                self.condition.wait()
+
+    def close(self):
+        self.cancel()
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        if self.writer is not None:
+            self.writer.join()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    def _cancel_futures(self):
+        self.generation += 1
+        for future in self.futures:
+            future.cancel()
+        self.futures = set()
+
+    def _walk(self, generation, pattern):
+        try:
+            batch = []
+            for directory, directories, files in os.walk(self.root):
+                directories[:] = sorted(
+                    name for name in directories
+                    if not name.startswith(".") and name != "__pycache__"
+                )
+                for name in sorted(files):
+                    batch.append(os.path.join(directory, name))
+                    if len(batch) == FILES_PER_TASK:
+                        if not self._submit(generation, pattern, batch):
+                            return
+                        batch = []
+            if batch and not self._submit(generation, pattern, batch):
+                return
+        except Exception as e:
+            # A pool that can not start tasks must not leave waiters hanging
+            with self.condition:
+                if generation == self.generation:
+                    self.walking = False
+                    self.results = self.results._replace(done=True, error=str(e))
+                    self.condition.notify_all()
+            if self.on_progress is not None:
+                self.on_progress()
+            return
+        with self.condition:
+            if generation == self.generation:
+                self.walking = False
+                self._check_done()
+
+    def _submit(self, generation, pattern, paths):
+        with self.condition:
+            if generation != self.generation:
+                return False
+            future = self.executor.submit(search_files, self.root, paths, pattern)
+            self.outstanding += 1
+            self.futures.add(future)
+        future.add_done_callback(lambda future: self._collect(generation, len(paths), future))
+        return True
+
+    def _collect(self, generation, count, future):
+        if future.cancelled():
+            return
+        try:
+            files = [
+                FileHits.create(path, lines)
+                for path, lines in future.result()
+            ]
+        except Exception as e:
+            files = []
+            error = str(e)
+        else:
+            error = None
+        with self.condition:
+            if generation != self.generation:
+                return
+            self.futures.discard(future)
+            self.outstanding -= 1
+            self.results = self.results._replace(
+                files=self.results.files.merge(files),
+                scanned=self.results.scanned+count,
+                error=error or self.results.error
+            )
+            self._check_done()
+        if self.on_progress is not None:
+            self.on_progress()
+
+    def _check_done(self):
+        if not self.walking and self.outstanding == 0:
+            self.results = self.results._replace(done=True)
+            self.condition.notify_all()
+
+    def _run_writer(self):
+        while True:
+            with self.condition:
+                while not self.pending_writes and not self.closing:
+                    self.condition.wait()
+                if not self.pending_writes:
+                    return
+                # Let more keystrokes join the batch
+                deadline = time.monotonic() + self.sync_interval
+                while not self.closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                writes = self.pending_writes
+                self.pending_writes = {}
+                self.writing = True
+            conflicts = 0
+            for path, changes in writes.items():
+                conflicts += write_lines(path, changes)
+            with self.condition:
+                self.conflicts += conflicts
+                self.writing = False
+                self.condition.notify_all()
+
+def search_files(root, paths, pattern):
+    """
+    Runs in a worker process. Return (relative path, [(row, line, [(start,
+    length), ...]), ...]) for the files that match.
+
+    >>> import tempfile
+    >>> root = tempfile.mkdtemp()
+    >>> with open(os.path.join(root, "a.txt"), "w") as f:
+    ...     _ = f.write("one\\ntwo two\\n")
+    >>> with open(os.path.join(root, "b.bin"), "wb") as f:
+    ...     _ = f.write(b"two\\x00")
+    >>> search_files(root, [os.path.join(root, "a.txt"), os.path.join(root, "b.bin")], "tw")
+    [('./a.txt', [(1, 'two two', [(0, 2), (4, 2)])])]
+    """
+    regex = re.compile(pattern)
+    results = []
+    for path in paths:
+        try:
+            if os.path.getsize(path) > MAX_FILE_SIZE:
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        if b"\0" in data[:8192]:
+            continue
+        lines = []
+        for row, line in enumerate(data.decode("utf-8", "replace").split("\n")):
+            matches = [
+                (match.start(), match.end()-match.start())
+                for match in regex.finditer(line)
+                if match.end() > match.start()
+            ]
+            if matches:
+                lines.append((row, line, matches))
+        if lines:
+            results.append(("./"+os.path.relpath(path, root), lines))
+    return results
+
+def write_lines(path, changes):
+    """
+    Replace lines of a file given as {row: (old line, new line)} and return
+    how many rows were skipped because they no longer contain the old line.
+    """
+    try:
+        with open(path, "rb") as f:
+            lines = f.read().decode("utf-8").split("\n")
+    except (OSError, UnicodeDecodeError):
+        return len(changes)
+    conflicts = 0
+    for row, (old, new) in changes.items():
+        if row < len(lines) and lines[row] == old:
+            lines[row] = new
+        else:
+            conflicts += 1
+    if conflicts < len(changes):
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            f.write("\n".join(lines).encode("utf-8"))
+        shutil.copymode(path, temporary_path)
+        os.replace(temporary_path, path)
+    return conflicts
@@ -0,0 +1,133 @@
+import itertools
+import time
+
+KEYBOARD = 0
+RESIZE = 1
+BACKGROUND = 2
+BLINK = 3
+IDLE = 4
+
+class RenderScheduler:
+
+    """
+    I decide when drivers do their work so that bursts of events result in
+    few frames.
+
+    Work is posted with a priority. Work posted with a key replaces earlier
+    work with the same key, so a burst of size events is one projection.
+    Keyboard work runs right away. Resize, background and blink work runs at
+    most once per frame_interval. Only keyboard work may exceed the frame budget. Idle
+    work only runs when the driver says it has nothing else to do.
+
+    >>> clock = FakeClock()
+    >>> scheduler = RenderScheduler(frame_interval=0.02, budget=0.01, clock=clock)
+    >>> log = []
+
+    >>> for width in [80, 81, 82]:
+    ...     scheduler.post(RESIZE, lambda width=width: log.append(width), key="size")
+    >>> scheduler.post(KEYBOARD, lambda: log.append("key"))
+    >>> scheduler.post(IDLE, lambda: log.append("status"), key="status")
+    >>> scheduler.run_frame()
+    True
+    >>> log
+    ['key', 82]
+
+    Resizes are capped to the frame rate, but keyboard work is not:
+
+    >>> scheduler.post(RESIZE, lambda: log.append(83), key="size")
+    >>> scheduler.post(KEYBOARD, lambda: log.append("key"))
+    >>> scheduler.next_frame_in()
+    0
+    >>> scheduler.run_frame()
+    True
+    >>> log[2:]
+    ['key']
+    >>> scheduler.next_frame_in()
+    0.02
+    >>> clock.now += 0.02
+    >>> scheduler.run_frame()
+    True
+    >>> log[3:]
+    [83]
+
+    Idle work waits until there is no other work:
+
+    >>> scheduler.next_frame_in() is None
+    True
+    >>> scheduler.run_frame(idle=True)
+    True
+    >>> log[4:]
+    ['status']
+    >>> scheduler.run_frame(idle=True)
+    False
+    """
+
+    def __init__(self, frame_interval=1/60, budget=1/120, clock=time.perf_counter):
+        self.frame_interval = frame_interval
+        self.budget = budget
+        self.clock = clock
+        self.tasks = {}
+        self.counter = itertools.count()
+        self.last_frame = None
+
+    def post(self, priority, fn, key=None):
+        if key is None:
+            key = next(self.counter)
+        if key in self.tasks:
+            _, order, _ = self.tasks[key]
+        else:
+            order = next(self.counter)
+        self.tasks[key] = (priority, order, fn)
+
+    def has_work(self, idle=False):
+        return any(
+            idle or priority != IDLE
+            for priority, _, _ in self.tasks.values()
+        )
+
+    def next_frame_in(self):
+        """
+        Seconds until run_frame has something to do, or None if only idle
+        work (or nothing) is waiting.
+        """
+        priorities = [priority for priority, _, _ in self.tasks.values()]
+        if KEYBOARD in priorities:
+            return 0
+        elif any(priority != IDLE for priority in priorities):
+            return max(0, self._frame_allowed_at() - self.clock())
+        else:
+            return None
+
+    def run_frame(self, idle=False):
+        start = self.clock()
+        capped = start < self._frame_allowed_at()
+        ran = False
+        for key, (priority, _, fn) in sorted(
+            self.tasks.items(),
+            key=lambda item: item[1][:2]
+        ):
+            if priority == IDLE and not idle:
+                continue
+            if priority in (RESIZE, BACKGROUND, BLINK) and capped:
+                continue
+            if priority != KEYBOARD and ran and self.clock() - start > self.budget:
+                break
+            del self.tasks[key]
+            fn()
+            ran = True
+        if ran:
+            self.last_frame = start
+        return ran
+
+    def _frame_allowed_at(self):
+        if self.last_frame is None:
+            return self.clock()
+        return self.last_frame + self.frame_interval
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
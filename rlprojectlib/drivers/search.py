@@ -0,0 +1,169 @@
+from collections import namedtuple
+import re
+import threading
+
+from rlprojectlib.domains.generic import ImmutableList
+from rlprojectlib.domains.rope import Rope
+
+SEARCH_CHUNK_SIZE = 65536
+
+class SearchResults(
+    namedtuple("SearchResults", "rope pattern matches searched done error")
+):
+
+    """
+    The (start, end) matches found so far in rope, which has been searched up
+    to position searched.
+    """
+
+    @property
+    def progress(self):
+        if self.done or not self.rope:
+            return 1.0
+        return self.searched / len(self.rope)
+
+class RegexSearch:
+
+    """
+    I search a rope for a regular expression on a worker thread.
+
+    The rope is scanned in chunks of whole lines. After every chunk I publish
+    the matches found so far as new results and call on_progress (from the
+    worker thread). Starting a new search cancels the running one.
+
+    >>> search = RegexSearch(chunk_size=8)
+    >>> rope = Rope.from_string("foo bar\\nbaz foo\\nfoo")
+    >>> results = search.search(rope, "fo+")
+    >>> results.done
+    False
+    >>> results = search.wait()
+    >>> results.matches
+    ImmutableList((0, 3), (12, 15), (16, 19))
+    >>> results.done, results.progress
+    (True, 1.0)
+
+    Searching again for the same thing returns the same results:
+
+    >>> search.search(rope, "fo+") is results
+    True
+
+    Results of a cancelled search are never published:
+
+    >>> big = Rope.from_string("foo\\n"*100000)
+    >>> first = search.search(big, "foo")
+    >>> second = search.search(big, "^f")
+    >>> search.wait().pattern
+    '^f'
+    >>> len(search.results.matches)
+    100000
+
+    Invalid patterns are reported in the results:
+
+    >>> search.search(rope, "(").error
+    'missing ), unterminated subpattern at position 0'
+    >>> search.close()
+    """
+
+    def __init__(self, chunk_size=SEARCH_CHUNK_SIZE, on_progress=None):
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self.results = None
+        self.job = None
+        self.generation = 0
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def search(self, rope, pattern):
+        rope = Rope.create(rope)
+        with self.condition:
+            if (
+                self.results is not None and
+                self.results.rope is rope and
+                self.results.pattern == pattern
+            ):
+                return self.results
+            self.generation += 1
+            self.results = SearchResults(
+                rope=rope,
+                pattern=pattern,
+                matches=ImmutableList(),
+                searched=0,
+                done=False,
+                error=None
+            )
+            try:
+                self.job = (self.generation, rope, re.compile(pattern, re.MULTILINE))
+            except re.error as e:
+                self.job = None
+                self.results = self.results._replace(done=True, error=str(e))
+                return self.results
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+            return self.results
+
+    def cancel(self):
+        with self.condition:
+            self.generation += 1
+            self.job = None
+            self.results = None
+            self.condition.notify_all()
+
+    def wait(self):
+        with self.condition:
+            while self.results is not None and not self.results.done:
+                self.condition.wait()
+            return self.results
+
+    def close(self):
+        with self.condition:
+            self.generation += 1
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.job is None and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                generation, rope, regex = self.job
+                self.job = None
+            self._scan(generation, rope, regex)
+
+    def _scan(self, generation, rope, regex):
+        """
+        Chunks end before a newline and the next chunk starts after it, so ^
+        and $ match at line boundaries. Matches that would span chunks are
+        not found.
+        """
+        matches = ImmutableList()
+        start = 0
+        while True:
+            end = rope.find("\n", min(start+self.chunk_size, len(rope)))
+            if end == -1:
+                end = len(rope)
+            for match in regex.finditer(rope[start:end]):
+                if match.end() > match.start():
+                    matches = matches.add((start+match.start(), start+match.end()))
+            done = end == len(rope)
+            if not self._publish(generation, matches=matches, searched=end, done=done):
+                return
+            if done:
+                return
+            start = end + 1
+
+    def _publish(self, generation, **fields):
+        with self.condition:
+            if generation != self.generation:
+                return False
+            self.results = self.results._replace(**fields)
+            self.condition.notify_all()
+        if self.on_progress is not None:
+            self.on_progress()
+        return True
@@ -0,0 +1,86 @@
+from collections import deque
+import json
+import math
+import time
+
+class Telemetry:
+
+    """
+    I keep the latest latencies of the stages that drivers measure (project,
+    repaint, ...) in ring buffers. I live outside the document, so recording a
+    measurement does not require a new projection.
+
+    >>> telemetry = Telemetry(size=4)
+    >>> for ms in [1, 2, 3, 4, 5, 100]:
+    ...     telemetry.record("project", ms*1000000)
+    >>> telemetry.percentiles("project")
+    (4.0, 100.0, 100.0)
+    >>> telemetry.status()
+    'project 4.0/100.0/100.0ms'
+
+    >>> telemetry.measure("repaint", lambda: "painted")
+    'painted'
+    >>> sorted(telemetry.summary())
+    ['project', 'repaint']
+    """
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.samples = {}
+
+    def record(self, name, ns):
+        if name not in self.samples:
+            self.samples[name] = deque(maxlen=self.size)
+        self.samples[name].append(ns)
+
+    def measure(self, name, fn):
+        t1 = time.perf_counter_ns()
+        return_value = fn()
+        t2 = time.perf_counter_ns()
+        self.record(name, t2-t1)
+        return return_value
+
+    def percentiles(self, name):
+        ordered = sorted(self.samples[name])
+        return tuple(
+            percentile(ordered, fraction, presorted=True)/1e6
+            for fraction in [0.50, 0.95, 0.99]
+        )
+
+    def summary(self):
+        return {
+            name: dict(zip(["p50", "p95", "p99"], self.percentiles(name)))
+            for name in self.samples
+        }
+
+    def status(self):
+        """
+        p50/p95/p99 of all stages on one line.
+        """
+        parts = []
+        for name in self.samples:
+            p50, p95, p99 = self.percentiles(name)
+            parts.append(f"{name} {p50:.1f}/{p95:.1f}/{p99:.1f}ms")
+        return " ".join(parts)
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump({
+                name: {
+                    "percentiles_ms": stats,
+                    "samples_ns": list(self.samples[name]),
+                }
+                for name, stats in self.summary().items()
+            }, f, indent=4)
+
+def percentile(samples, fraction, presorted=False):
+    """
+    Nearest-rank percentile:
+
+    >>> percentile([4, 1, 3, 2], 0.5)
+    2
+    >>> percentile(list(range(1, 101)), 0.99)
+    99
+    """
+    ordered = samples if presorted else sorted(samples)
+    return ordered[max(0, math.ceil(fraction*len(ordered))-1)]
@@ -1,10 +1,16 @@
-import time
-
 import wx
 
 from rlprojectlib.domains.terminal import KeyboardEvent
-from rlprojectlib.domains.terminal import MeasurementEvent
 from rlprojectlib.domains.terminal import SizeEvent
+from rlprojectlib.domains.terminal import TextEvent
+from rlprojectlib.domains.terminal import changed_rows
+from rlprojectlib.drivers.document import AsyncDocumentProjectionDriver
+from rlprojectlib.drivers.scheduler import BACKGROUND
+from rlprojectlib.drivers.scheduler import BLINK
+from rlprojectlib.drivers.scheduler import IDLE
+from rlprojectlib.drivers.scheduler import KEYBOARD
+from rlprojectlib.drivers.scheduler import RESIZE
+from rlprojectlib.drivers.scheduler import RenderScheduler
 
 class WxTerminalDriver(wx.Panel):
 
@@ -36,40 +42,140 @@ class WxTerminalDriver(wx.Panel):
         wx.Panel.__init__(self, parent, style=wx.NO_BORDER|wx.WANTS_CHARS)
         self.driver = driver
         self.terminal = driver.terminal
+        self.asynchronous = isinstance(driver, AsyncDocumentProjectionDriver)
+        if self.asynchronous:
+            driver.on_frame = lambda terminal: wx.CallAfter(self.on_frame, terminal)
+        driver.on_invalidate = lambda: wx.CallAfter(self.on_invalidate)
+        self.scheduler = RenderScheduler()
         self.cursor_blink_timer = wx.Timer(self)
+        self.frame_timer = wx.Timer(self)
+        self.rows = {}
+        self.cursor_rects = []
         self.SetBackgroundStyle(wx.BG_STYLE_CUSTOM)
         self.Bind(wx.EVT_SIZE, self.on_size)
         self.Bind(wx.EVT_CHAR, self.on_char)
         self.Bind(wx.EVT_PAINT, self.on_paint)
-        self.Bind(wx.EVT_TIMER, self.on_timer)
+        self.Bind(wx.EVT_TIMER, self.on_timer, self.cursor_blink_timer)
+        self.Bind(wx.EVT_TIMER, self.on_frame_timer, self.frame_timer)
+        self.Bind(wx.EVT_IDLE, self.on_idle)
         self.Bind(wx.EVT_SET_FOCUS, self.on_set_focus)
         self.Bind(wx.EVT_KILL_FOCUS, self.on_kill_focus)
         self.setup_font()
         self.repaint_bitmap()
+        self.painted_terminal = self.terminal
+        self.post_idle_work()
 
     def on_size(self, evt):
+        event = SizeEvent(
+            width=evt.Size.Width // self.char_width,
+            height=evt.Size.Height // self.char_height
+        )
         def project():
-            self.terminal = self.driver.size_event(SizeEvent(
-                width=evt.Size.Width // self.char_width,
-                height=evt.Size.Height // self.char_height
-            ))
-        self._measure(project)
+            self.terminal = self.driver.size_event(event)
+        self.scheduler.post(RESIZE, project, key="size")
+        self.scheduler.post(IDLE, self.refresh_status, key="status")
+        self.post_idle_work()
+        self.schedule_frame()
+
+    KEYS = {
+        wx.WXK_PAGEUP: "PAGE_UP",
+        wx.WXK_PAGEDOWN: "PAGE_DOWN",
+    }
 
     def on_char(self, evt):
+        event = KeyboardEvent(
+            unicode_character=chr(evt.GetUnicodeKey()),
+            key=self.KEYS.get(evt.GetKeyCode())
+        )
+        if event.unicode_character == "\x13": # Ctrl-S
+            def project():
+                self.terminal = self.driver.save()
+        elif event.unicode_character == "\x16": # Ctrl-V
+            text = self.get_clipboard_text()
+            if not text:
+                return
+            event = TextEvent(text=text)
+            def project():
+                self.terminal = self.driver.text_event(event)
+        else:
+            def project():
+                self.terminal = self.driver.keyboard_event(event)
+        self.scheduler.post(KEYBOARD, project)
+        self.scheduler.post(IDLE, self.refresh_status, key="status")
+        self.post_idle_work()
+        self.run_frame()
+
+    def get_clipboard_text(self):
+        data = wx.TextDataObject()
+        if not wx.TheClipboard.Open():
+            return None
+        try:
+            if not wx.TheClipboard.GetData(data):
+                return None
+        finally:
+            wx.TheClipboard.Close()
+        return data.GetText().replace("\r\n", "\n")
+
+    def refresh_status(self):
+        """
+        The driver measures the projection and I measure the repaint. The
+        status bar shows them when the document is projected again, which I
+        do when there is nothing more urgent to do.
+        """
+        self.terminal = self.driver.refresh()
+
+    def post_idle_work(self):
+        """
+        The asynchronous driver does idle work on its own thread.
+        """
+        if not self.asynchronous:
+            self.scheduler.post(IDLE, self.idle_work, key="idle")
+
+    def idle_work(self):
+        if self.driver.idle():
+            self.terminal = self.driver.terminal
+            self.post_idle_work()
+
+    def on_invalidate(self):
+        """
+        Background work in the document has progressed. Project it again, but
+        not more often than the frame rate.
+        """
         def project():
-            self.terminal = self.driver.keyboard_event(KeyboardEvent(
-                unicode_character=chr(evt.GetUnicodeKey())
-            ))
-        self._measure(project)
-
-    def _measure(self, fn):
-        _, ms_project = measure_ms(fn)
-        _, ms_repaint = measure_ms(self.repaint_bitmap)
-        self.terminal = self.driver.measurement_event(MeasurementEvent(
-            ms_project=ms_project,
-            ms_repaint=ms_repaint,
-        ))
-        self.repaint_bitmap()
+            self.terminal = self.driver.refresh()
+        self.scheduler.post(BACKGROUND, project, key="invalidate")
+        self.schedule_frame()
+
+    def schedule_frame(self):
+        delay = self.scheduler.next_frame_in()
+        if delay is not None and not self.frame_timer.IsRunning():
+            self.frame_timer.StartOnce(max(1, int(delay*1000)))
+
+    def run_frame(self, idle=False):
+        if self.scheduler.run_frame(idle=idle):
+            if not self.asynchronous and self.terminal is not self.painted_terminal:
+                self.driver.telemetry.measure("repaint", self.repaint_bitmap)
+                self.painted_terminal = self.terminal
+        self.schedule_frame()
+
+    def on_frame_timer(self, event):
+        self.run_frame()
+
+    def on_idle(self, event):
+        if self.scheduler.has_work(idle=True):
+            self.run_frame(idle=True)
+            if self.scheduler.has_work(idle=True):
+                event.RequestMore()
+
+    def on_frame(self, terminal):
+        """
+        Called on the GUI thread when the asynchronous driver has projected a
+        new frame. Frames that were replaced before I got to them are skipped.
+        """
+        if terminal is self.driver.terminal:
+            self.terminal = terminal
+            self.driver.telemetry.measure("repaint", self.repaint_bitmap)
+            self.painted_terminal = terminal
 
     def on_paint(self, event):
         dc = wx.AutoBufferedPaintDC(self)
@@ -81,17 +187,21 @@ class WxTerminalDriver(wx.Panel):
                 dc.DrawRectangle(cursor_rect)
 
     def on_timer(self, event):
+        self.scheduler.post(BLINK, self.blink_cursors, key="blink")
+        self.schedule_frame()
+
+    def blink_cursors(self):
         self.show_cursors = not self.show_cursors
-        self.force_repaint_window()
+        self.refresh_rects(self.cursor_rects)
 
     def on_set_focus(self, event):
         self.reset_cursor_blink()
-        self.force_repaint_window()
+        self.refresh_rects(self.cursor_rects)
 
     def on_kill_focus(self, event):
         self.cursor_blink_timer.Stop()
         self.show_cursors = True
-        self.force_repaint_window()
+        self.refresh_rects(self.cursor_rects)
 
     def setup_font(self):
         self.font = wx.Font(
@@ -109,21 +219,42 @@ class WxTerminalDriver(wx.Panel):
         del memdc
 
     def repaint_bitmap(self):
-        self.bitmap = wx.Bitmap(self.GetSize())
+        """
+        Draw the rows that changed since the last frame into the back buffer
+        and invalidate only them (and the cursors).
+        """
+        rows = self.terminal.get_rows()
         memdc = wx.MemoryDC()
-        memdc.SelectObject(self.bitmap)
-        memdc.SetBackground(wx.Brush(self.THEME["colors"]["BACKGROUND"], wx.SOLID))
+        if self.bitmap.GetSize() != self.GetSize():
+            self.bitmap = wx.Bitmap(self.GetSize())
+            memdc.SelectObject(self.bitmap)
+            memdc.SetBackground(wx.Brush(self.THEME["colors"]["BACKGROUND"], wx.SOLID))
+            memdc.Clear()
+            damaged_rows = list(rows)
+            full_repaint = True
+        else:
+            memdc.SelectObject(self.bitmap)
+            damaged_rows = changed_rows(self.rows, rows)
+            full_repaint = False
         memdc.SetBackgroundMode(wx.PENSTYLE_SOLID)
-        memdc.Clear()
-        for fragment in self.terminal.fragments:
-            if fragment.bold:
-                memdc.SetFont(self.font_bold)
-            else:
-                memdc.SetFont(self.font)
-            memdc.SetTextBackground(self.THEME["colors"].get(fragment.bg, self.THEME["colors"]["BACKGROUND"]))
-            memdc.SetTextForeground(self.THEME["colors"].get(fragment.fg, self.THEME["colors"]["FOREGROUND"]))
-            memdc.DrawText(fragment.text, fragment.x*self.char_width, fragment.y*self.char_height)
+        memdc.SetPen(wx.TRANSPARENT_PEN)
+        memdc.SetBrush(wx.Brush(self.THEME["colors"]["BACKGROUND"], wx.SOLID))
+        damaged_rects = []
+        for y in damaged_rows:
+            row_rect = wx.Rect(0, y*self.char_height, self.bitmap.GetWidth(), self.char_height)
+            damaged_rects.append(row_rect)
+            memdc.DrawRectangle(row_rect)
+            for fragment in rows.get(y, []):
+                if fragment.bold:
+                    memdc.SetFont(self.font_bold)
+                else:
+                    memdc.SetFont(self.font)
+                memdc.SetTextBackground(self.THEME["colors"].get(fragment.bg, self.THEME["colors"]["BACKGROUND"]))
+                memdc.SetTextForeground(self.THEME["colors"].get(fragment.fg, self.THEME["colors"]["FOREGROUND"]))
+                memdc.DrawText(fragment.text, fragment.x*self.char_width, fragment.y*self.char_height)
         del memdc
+        self.rows = rows
+        damaged_rects.extend(self.cursor_rects)
         self.cursor_rects = []
         for cursor in self.terminal.cursors:
             self.cursor_rects.append(wx.Rect(
@@ -132,8 +263,12 @@ class WxTerminalDriver(wx.Panel):
                 3,
                 self.char_height
             ))
+        damaged_rects.extend(self.cursor_rects)
         self.reset_cursor_blink()
-        self.force_repaint_window()
+        if full_repaint:
+            self.force_repaint_window()
+        else:
+            self.refresh_rects(damaged_rects)
 
     def reset_cursor_blink(self):
         self.show_cursors = True
@@ -143,31 +278,7 @@ class WxTerminalDriver(wx.Panel):
         self.Refresh()
         self.Update()
 
-class DocumentProjectionDriver:
-
-    def __init__(self, document, projection_fn):
-        self.document = document
-        self.projection_fn = projection_fn
-        self._project()
-
-    def size_event(self, event):
-        self.document = self.terminal.size_event(event)
-        return self._project()
-
-    def keyboard_event(self, event):
-        self.document = self.terminal.keyboard_event(event)
-        return self._project()
-
-    def measurement_event(self, event):
-        self.document = self.terminal.measurement_event(event)
-        return self._project()
-
-    def _project(self):
-        self.terminal = self.projection_fn(self.document)
-        return self.terminal
-
-def measure_ms(fn):
-    t1 = time.perf_counter()
-    return_value = fn()
-    t2 = time.perf_counter()
-    return (return_value, int((t2-t1)*1000))
+    def refresh_rects(self, rects):
+        for rect in rects:
+            self.RefreshRect(rect)
+        self.Update()
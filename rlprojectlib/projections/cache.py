@@ -0,0 +1,57 @@
+from collections import OrderedDict
+
+class ProjectionCache:
+
+    """
+    I remember results of projections so that they can be reused when a
+    projection is made again with the same inputs.
+
+    Inputs are compared by identity. Since documents are immutable, the same
+    object always projects to the same result. I keep a reference to the
+    inputs so that their ids can not be reused by other objects.
+
+    >>> cache = ProjectionCache(max_entries=2)
+    >>> text = "hello"
+    >>> cache.memoize(("upper",), (text,), lambda: text.upper())
+    'HELLO'
+    >>> cache.memoize(("upper",), (text,), lambda: "not called")
+    'HELLO'
+    >>> cache.hits, cache.misses
+    (1, 1)
+
+    Projection parameters are part of the key:
+
+    >>> cache.memoize(("upper", 2), (text,), lambda: text.upper()[:2])
+    'HE'
+
+    The least recently used entry is evicted when I am full:
+
+    >>> cache.memoize(("lower",), (text,), lambda: text.lower())
+    'hello'
+    >>> len(cache.entries)
+    2
+    >>> cache.memoize(("upper",), (text,), lambda: "recalculated")
+    'recalculated'
+    >>> cache.hits, cache.misses
+    (1, 4)
+    """
+
+    def __init__(self, max_entries=64):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def memoize(self, key, inputs, fn):
+        entry_key = (key, tuple(id(x) for x in inputs))
+        entry = self.entries.get(entry_key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(entry_key)
+            return entry[1]
+        self.misses += 1
+        result = fn()
+        self.entries[entry_key] = (inputs, result)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return result
@@ -0,0 +1,165 @@
+from collections import namedtuple
+import bisect
+
+from rlprojectlib.domains.generic import Selections
+from rlprojectlib.domains.lines import Line
+from rlprojectlib.domains.lines import Lines
+from rlprojectlib.domains.lines import Position
+from rlprojectlib.domains.lines import Selection
+from rlprojectlib.domains.rope import Rope
+from rlprojectlib.domains.string import MultiEdit
+from rlprojectlib.domains.string import Selection as StringSelection
+from rlprojectlib.domains.string import String
+from rlprojectlib.projections.trace import traced
+
+class Meta(
+    namedtuple("Meta", "string rows")
+):
+    pass
+
+class FilterLines(Lines):
+
+    """
+    I show only some lines of a string and edit through them.
+
+    The lines to show are given as rows, an index array into the lines of the
+    string (see TrigramIndex.filter), so no lines are copied.
+    """
+
+    @staticmethod
+    @traced("FilterLines")
+    def project(string, rows, first_row=0, num_rows=None):
+        """
+        >>> FilterLines.test_project("one\\ntwo\\nthree\\nfour", (0, 2, 3), 9)
+        Line(text='one', number=1)
+        Line(text='three', number=3)
+        Line(text='four', number=4)
+        Selection(start=Position(row=1, col=1), end=Position(row=1, col=1))
+
+        Cursors in hidden lines are not shown:
+
+        >>> FilterLines.test_project("one\\ntwo\\nthree\\nfour", (0, 2, 3), 5)
+        Line(text='one', number=1)
+        Line(text='three', number=3)
+        Line(text='four', number=4)
+
+        First row and number of rows count filtered lines:
+
+        >>> FilterLines.test_project("one\\ntwo\\nthree\\nfour", (0, 2, 3), 0, 1, 1)
+        Line(text='three', number=3)
+
+        >>> FilterLines.test_project("one\\ntwo", (), 0)
+        """
+        rope = Rope.create(string.string)
+        first_row = max(0, min(first_row, len(rows)-1))
+        if num_rows is None:
+            num_rows = len(rows)
+        lines = []
+        selections = []
+        for index, row in enumerate(rows[first_row:first_row+max(num_rows, 1)]):
+            start = rope.line_start(row)
+            end = rope.line_end(row)
+            lines.append(Line(text=rope[start:end], number=row+1))
+            for selection_index in range(
+                bisect.bisect_left(string.selections, start, key=lambda selection: selection.pos_end),
+                len(string.selections)
+            ):
+                selection = string.selections[selection_index]
+                if selection.pos_start > end:
+                    break
+                selections.append(Selection(
+                    start=Position(row=index, col=max(selection.pos_start, start)-start),
+                    end=Position(row=index, col=min(selection.pos_end, end)-start)
+                ))
+        return FilterLines.create(
+            lines=lines,
+            selections=selections,
+            meta=Meta(string=string, rows=rows)
+        )
+
+    @staticmethod
+    def test_project(string, rows, start=0, first_row=0, num_rows=None):
+        FilterLines.project(
+            String.from_string(string=string, selection_start=start),
+            rows,
+            first_row=first_row,
+            num_rows=num_rows
+        ).print_lines_selections()
+
+    @staticmethod
+    def move_down(string, rows, count):
+        """
+        Move the cursor count filtered lines down (or up if negative):
+
+        >>> string = String.from_string("one\\ntwo\\nthree\\nfour", 1)
+        >>> FilterLines.move_down(string, (0, 2, 3), 1).selections
+        Selections(Selection(start=9, length=0))
+        >>> FilterLines.move_down(string, (0, 2, 3), 5).selections
+        Selections(Selection(start=15, length=0))
+
+        From a hidden line, the next filtered line is one line down:
+
+        >>> string = String.from_string("one\\ntwo\\nthree\\nfour", 5)
+        >>> FilterLines.move_down(string, (0, 2, 3), 1).selections
+        Selections(Selection(start=9, length=0))
+        >>> FilterLines.move_down(string, (0, 2, 3), -1).selections
+        Selections(Selection(start=1, length=0))
+        """
+        if not rows:
+            return string
+        rope = Rope.create(string.string)
+        row, col = rope.row_col(string.selections[-1].start)
+        index = bisect.bisect_left(rows, row)
+        if count > 0 and (index == len(rows) or rows[index] != row):
+            index -= 1
+        row = rows[max(0, min(index+count, len(rows)-1))]
+        return string._replace(selections=Selections([StringSelection(
+            start=min(rope.line_start(row)+col, rope.line_end(row)),
+            length=0
+        )]))
+
+    def move_cursor_forward(self):
+        return self.meta.string.move_cursor_forward()
+
+    def move_cursor_back(self):
+        return self.meta.string.move_cursor_back()
+
+    def move_cursor_down(self, rows=1):
+        return FilterLines.move_down(self.meta.string, self.meta.rows, rows)
+
+    def move_cursor_up(self, rows=1):
+        return FilterLines.move_down(self.meta.string, self.meta.rows, -rows)
+
+    def select_next_word(self, words):
+        return self.meta.string.select_next_word(words)
+
+    def select_all_occurrences(self, words):
+        return self.meta.string.select_all_occurrences(words)
+
+    def replace(self, text):
+        """
+        Only selections in filtered lines are edited:
+
+        >>> string = String.from_string("a\\nb\\nc")._replace(selections=Selections([
+        ...     StringSelection(start=0, length=0),
+        ...     StringSelection(start=2, length=0),
+        ...     StringSelection(start=4, length=0),
+        ... ]))
+        >>> FilterLines.project(string, (0, 2)).replace("x")
+        String(meta=None, string='xa\\nb\\nxc', selections=Selections(Selection(start=1, length=0), Selection(start=3, length=0), Selection(start=6, length=0)))
+        """
+        string = self.meta.string
+        rope = Rope.create(string.string)
+        edit = MultiEdit(string)
+        for selection in string.selections:
+            row, _ = rope.row_col(selection.pos_start)
+            index = bisect.bisect_left(self.meta.rows, row)
+            if index < len(self.meta.rows) and self.meta.rows[index] == row:
+                start = edit.replace(selection, text)
+                edit.select(StringSelection(start=start+len(text), length=0))
+            else:
+                edit.keep(selection)
+        return edit.apply()
+
+    def get_source(self):
+        return self.meta.string.get_source()
@@ -0,0 +1,310 @@
+from collections import namedtuple
+import keyword
+import re
+
+from rlprojectlib.domains.lines import Line
+from rlprojectlib.domains.lines import Lines
+from rlprojectlib.domains.lines import StyledLine
+from rlprojectlib.domains.rope import Rope
+from rlprojectlib.projections.trace import traced
+
+EAGER_LINES = 1000
+IDLE_LINES = 2000
+BATCH_LINES = 256
+
+PYTHON_TOKEN = re.compile(r"""
+    (?P<comment>\#.*)
+  | (?P<triple>[rRbBuUfF]{0,2}(?:\"\"\"|'''))
+  | (?P<string>[rRbBuUfF]{0,2}(?:"(?:\\.|[^"\\])*"?|'(?:\\.|[^'\\])*'?))
+  | (?P<number>\b\d[\w.]*)
+  | (?P<name>[A-Za-z_]\w*)
+""", re.VERBOSE)
+
+PYTHON_KEYWORDS = frozenset(keyword.kwlist)
+
+COLORS = {
+    "comment": "BLUE",
+    "string": "CYAN",
+    "number": "MAGENTA",
+    "keyword": "GREEN",
+}
+
+UNKNOWN = object()
+
+def tokenize_python(text, state=None):
+    """
+    Return the styles of a line of Python and the state at the end of it.
+    The state is the delimiter of the triple quoted string that the line
+    ends in, or None.
+
+    >>> tokenize_python("if x == 1: # one")
+    ([(0, 2, 'GREEN'), (8, 9, 'MAGENTA'), (11, 16, 'BLUE')], None)
+    >>> tokenize_python('s = \"\"\"doc')
+    ([(4, 10, 'CYAN')], '\"\"\"')
+    >>> tokenize_python('string\"\"\" + "x"', '\"\"\"')
+    ([(0, 9, 'CYAN'), (12, 15, 'CYAN')], None)
+    """
+    styles = []
+    pos = 0
+    if state is not None:
+        end = text.find(state)
+        if end == -1:
+            return ([(0, len(text), COLORS["string"])], state)
+        pos = end + 3
+        styles.append((0, pos, COLORS["string"]))
+    while True:
+        match = PYTHON_TOKEN.search(text, pos)
+        if match is None:
+            return (styles, None)
+        kind = match.lastgroup
+        start, pos = match.span()
+        if kind == "triple":
+            delimiter = text[pos-3:pos]
+            end = text.find(delimiter, pos)
+            if end == -1:
+                styles.append((start, len(text), COLORS["string"]))
+                return (styles, delimiter)
+            pos = end + 3
+            styles.append((start, pos, COLORS["string"]))
+        elif kind == "name":
+            if match.group() in PYTHON_KEYWORDS:
+                styles.append((start, pos, COLORS["keyword"]))
+        else:
+            styles.append((start, pos, COLORS[kind]))
+
+class Highlighter:
+
+    """
+    I remember the tokenizer state at the start of every line of a rope so
+    that any line can be highlighted without tokenizing the lines before it.
+
+    States are known for the first valid rows. Lines in or near the rows
+    that are shown are tokenized when they are shown (see highlight), and
+    the rest a few at a time by idle.
+
+    >>> highlighter = Highlighter(eager_lines=10)
+    >>> rope = Rope.from_string('x = 1\\n\"\"\"\\ndoc\\n\"\"\"\\ny = 2\\n' * 100)
+    >>> highlighter.highlight(rope, range(0, 5)).states
+    {0: None, 1: None, 2: '\"\"\"', 3: '\"\"\"', 4: None}
+    >>> highlighter.valid
+    5
+    >>> while highlighter.idle():
+    ...     pass
+    >>> highlighter.valid, highlighter.tokenized
+    (501, 500)
+
+    After an edit, I tokenize from the edited line until the state at the
+    start of a line is the one I remember:
+
+    >>> edited = rope.insert(6, "z = 3\\n")
+    >>> highlighter.highlight(edited, range(0, 3)).states
+    {0: None, 1: None, 2: None}
+    >>> while highlighter.idle():
+    ...     pass
+    >>> highlighter.valid, highlighter.tokenized
+    (502, 502)
+
+    An edit that changes the state of following lines tokenizes them all:
+
+    >>> edited = edited.insert(6, '\"\"\"')
+    >>> highlighter.highlight(edited, range(0, 3)).states
+    {0: None, 1: None, 2: '\"\"\"'}
+    >>> while highlighter.idle():
+    ...     pass
+    >>> highlighter.valid, highlighter.tokenized
+    (502, 1002)
+
+    Rows far from the known states are highlighted with the states that I
+    remember from before the edit until idle gets to them:
+
+    >>> edited = edited.insert(6, "#")
+    >>> highlighter.highlight(edited, range(400, 402)).states
+    {400: '\"\"\"', 401: '\"\"\"'}
+    >>> while highlighter.idle():
+    ...     pass
+    >>> highlighter.highlight(edited, range(400, 402)).states
+    {400: None, 401: None}
+
+    An edit before the states of an earlier edit are all known does not
+    stop at states that were already tokenized for the earlier edit:
+
+    >>> highlighter = Highlighter(eager_lines=0, idle_lines=10)
+    >>> rope = Rope.from_string("x = 1\\n" * 100)
+    >>> _ = highlighter.highlight(rope, range(0, 1))
+    >>> while highlighter.idle():
+    ...     pass
+    >>> rope = rope.insert(rope.line_start(10), '\"\"\"')
+    >>> _ = highlighter.highlight(rope, range(0, 1))
+    >>> _ = highlighter.idle()
+    >>> rope = rope.insert(rope.line_start(10), "y")
+    >>> _ = highlighter.highlight(rope, range(0, 1))
+    >>> while highlighter.idle():
+    ...     pass
+    >>> highlighter.highlight(rope, range(98, 100)).states
+    {98: '\"\"\"', 99: '\"\"\"'}
+    """
+
+    def __init__(self, tokenize=tokenize_python, eager_lines=EAGER_LINES, idle_lines=IDLE_LINES):
+        self.tokenize = tokenize
+        self.eager_lines = eager_lines
+        self.idle_lines = idle_lines
+        self.rope = None
+        self.states = [None]
+        self.valid = 1
+        self.converge_at = 0
+        self.last = None
+        self.tokenized = 0
+
+    def highlight(self, rope, rows):
+        """
+        Return a Highlighting for the given sorted rows. If nothing changed
+        for those rows, I return the same Highlighting as last time.
+        """
+        self.update(rope)
+        rows = [row for row in rows if row < self.rope.line_count()]
+        if rows and rows[-1] < self.valid + self.eager_lines:
+            self.advance(rows[-1]+1)
+        states = {}
+        state = None
+        for row in rows:
+            if row < self.valid:
+                state = self.states[row]
+            elif row-1 in states:
+                state = self.tokenize(self._line(row-1), state)[1]
+            elif row < len(self.states) and self.states[row] is not UNKNOWN:
+                state = self.states[row]
+            else:
+                state = None
+            states[row] = state
+        highlighting = Highlighting(states=states, tokenize=self.tokenize)
+        if highlighting != self.last:
+            self.last = highlighting
+        return self.last
+
+    def idle(self):
+        """
+        Tokenize some lines after the known states. Return True if there
+        were lines to tokenize.
+        """
+        if self.rope is None or self.valid >= self.rope.line_count():
+            return False
+        self.advance(self.valid+self.idle_lines)
+        return True
+
+    def update(self, rope):
+        rope = Rope.create(rope)
+        if self.rope is not None and self.rope is not rope:
+            edits = self.rope.diff(rope)
+            if edits:
+                first, _ = self.rope.row_col(edits[0][0])
+                old_last, _ = self.rope.row_col(edits[-1][1])
+                delta = sum(len(text) - (end - start) for start, end, text in edits)
+                new_last, _ = rope.row_col(edits[-1][1]+delta)
+                if len(self.states) > old_last + 1:
+                    # States after the edits are compared against when the
+                    # edited lines have been tokenized again
+                    if self.valid < len(self.states):
+                        # States before the old valid row may be rewritten
+                        # for an earlier edit already, so they can not be
+                        # compared against either
+                        self.converge_at = max(self.converge_at, self.valid)
+                    self.states[first+1:old_last+1] = [UNKNOWN] * (new_last - first)
+                    if self.converge_at > old_last:
+                        self.converge_at += new_last - old_last
+                    self.converge_at = max(self.converge_at, new_last+1)
+                else:
+                    del self.states[first+1:]
+                self.valid = min(self.valid, first+1)
+        self.rope = rope
+
+    def advance(self, stop):
+        """
+        Tokenize lines until the states of the first stop rows are known.
+        """
+        stop = min(stop, self.rope.line_count())
+        while self.valid < stop:
+            first = self.valid - 1
+            last = min(stop-2, first+BATCH_LINES-1)
+            texts = self.rope[self.rope.line_start(first):self.rope.line_end(last)].split("\n")
+            for text in texts:
+                state = self.tokenize(text, self.states[self.valid-1])[1]
+                self.tokenized += 1
+                if self.valid < len(self.states):
+                    if self.valid >= self.converge_at and self.states[self.valid] == state:
+                        self.valid = len(self.states)
+                        break
+                    self.states[self.valid] = state
+                else:
+                    self.states.append(state)
+                self.valid += 1
+
+    def _line(self, row):
+        return self.rope[self.rope.line_start(row):self.rope.line_end(row)]
+
+class Highlighting(
+    namedtuple("Highlighting", "states tokenize")
+):
+
+    """
+    The tokenizer states at the start of some rows.
+    """
+
+    def styles(self, row, text):
+        return self.tokenize(text, self.states.get(row))[0]
+
+class Meta(
+    namedtuple("Meta", "lines")
+):
+    pass
+
+class HighlightLines(Lines):
+
+    @staticmethod
+    @traced("HighlightLines")
+    def project(lines, highlighting):
+        """
+        I style every line with its tokens:
+
+        >>> HighlightLines.project(
+        ...     Lines.create(lines=[Line(text='\"\"\"', number=1), Line(text="if", number=2)]),
+        ...     Highlighting(states={0: None, 1: '\"\"\"'}, tokenize=tokenize_python)
+        ... ).lines.print()
+        StyledLine(text='\"\"\"', number=1, styles=[(0, 3, 'CYAN')])
+        StyledLine(text='if', number=2, styles=[(0, 2, 'CYAN')])
+        """
+        return HighlightLines.create(
+            lines=(
+                StyledLine(
+                    text=line.text,
+                    number=line.number,
+                    styles=highlighting.styles(line.number-1, line.text)
+                )
+                for line in lines.lines
+            ),
+            selections=lines.selections,
+            meta=Meta(lines=lines)
+        )
+
+    def move_cursor_forward(self):
+        return self.meta.lines.move_cursor_forward()
+
+    def move_cursor_back(self):
+        return self.meta.lines.move_cursor_back()
+
+    def move_cursor_down(self, rows=1):
+        return self.meta.lines.move_cursor_down(rows)
+
+    def move_cursor_up(self, rows=1):
+        return self.meta.lines.move_cursor_up(rows)
+
+    def select_next_word(self, words):
+        return self.meta.lines.select_next_word(words)
+
+    def select_all_occurrences(self, words):
+        return self.meta.lines.select_all_occurrences(words)
+
+    def replace(self, text):
+        return self.meta.lines.replace(text)
+
+    def get_source(self):
+        return self.meta.lines.get_source()
@@ -5,11 +5,13 @@ from rlprojectlib.domains.lines import Line
 from rlprojectlib.domains.lines import Lines
 from rlprojectlib.domains.lines import Position
 from rlprojectlib.domains.lines import Selection
+from rlprojectlib.domains.lines import StyledLine
 from rlprojectlib.domains.string import Selection as StringSelection
 from rlprojectlib.domains.string import String
 from rlprojectlib.domains.terminal import Terminal
 from rlprojectlib.domains.terminal import TextFragment
 from rlprojectlib.projections.string_to_terminal import StringToTerminal
+from rlprojectlib.projections.trace import traced
 
 class Meta(
     namedtuple("Meta", "lines")
@@ -19,6 +21,7 @@ class Meta(
 class LinesToTerminal(Terminal):
 
     @staticmethod
+    @traced("LinesToTerminal")
     def project(lines):
         """
         >>> LinesToTerminal.project(Lines.create(
@@ -47,10 +50,21 @@ class LinesToTerminal(Terminal):
         TextFragment(x=0, y=1, text='2', bold=None, bg=None, fg='YELLOW')
         TextFragment(x=2, y=1, text='two', bold=None, bg=None, fg=None)
         Cursor(x=3, y=0)
+
+        Styled lines are colored:
+
+        >>> LinesToTerminal.project(Lines.create(
+        ...     lines=[
+        ...         StyledLine(text="if x", number=1, styles=[(0, 2, "GREEN")]),
+        ...     ]
+        ... )).print_fragments_and_cursors()
+        TextFragment(x=0, y=0, text='1', bold=None, bg=None, fg='YELLOW')
+        TextFragment(x=2, y=0, text='if', bold=None, bg=None, fg='GREEN')
+        TextFragment(x=4, y=0, text=' x', bold=None, bg=None, fg=None)
         """
         fragments = []
         cursors = []
-        line_number_len = max(len(str(line.number)) for line in lines.lines)
+        line_number_len = max((len(LinesToTerminal.number(line)) for line in lines.lines), default=0)
         selections_per_line = {}
         for selection in lines.selections:
             for index, selection in selection.string_selections:
@@ -59,8 +73,14 @@ class LinesToTerminal(Terminal):
                 selections_per_line[index].append(selection)
         for index, line in enumerate(lines.lines):
             y = String(meta=None, string=line.text, selections=Selections(selections_per_line.get(index, [])))
-            x = StringToTerminal.project(y, y=index, x=line_number_len+1)
-            fragments.append(TextFragment(x=0, y=index, text=str(line.number), fg="YELLOW"))
+            x = StringToTerminal.project(
+                y,
+                y=index,
+                x=line_number_len+1,
+                styles=line.styles if isinstance(line, StyledLine) else ()
+            )
+            if line.number is not None:
+                fragments.append(TextFragment(x=0, y=index, text=str(line.number), fg="YELLOW"))
             fragments.extend(x.fragments)
             cursors.extend(x.cursors)
         return LinesToTerminal.create(
@@ -71,6 +91,16 @@ class LinesToTerminal(Terminal):
             )
         )
 
+    @staticmethod
+    def number(line):
+        """
+        Rows that continue a wrapped line have no number:
+
+        >>> LinesToTerminal.number(Line(text="", number=None))
+        ''
+        """
+        return "" if line.number is None else str(line.number)
+
     def size_event(self, event):
         """
         A size event does nothing:
@@ -91,9 +121,10 @@ class LinesToTerminal(Terminal):
             return self.meta.lines.move_cursor_forward()
         elif event.unicode_character == "\x02": # Ctrl-B
             return self.meta.lines.move_cursor_back()
-        elif event.unicode_character == "\x0e": # Ctrl-N
-            return self.meta.lines.select_next_word()
         elif event.unicode_character and ord(event.unicode_character) >= 32:
             return self.meta.lines.replace(event.unicode_character)
         else:
             return self.meta.lines.get_source()
+
+    def text_event(self, event):
+        return self.meta.lines.replace(event.text)
@@ -1,10 +1,13 @@
 from collections import namedtuple
+import bisect
 
 from rlprojectlib.domains.lines import Line
 from rlprojectlib.domains.lines import Lines
 from rlprojectlib.domains.lines import Position
 from rlprojectlib.domains.lines import Selection
+from rlprojectlib.domains.rope import Rope
 from rlprojectlib.domains.string import String
+from rlprojectlib.projections.trace import traced
 
 class Meta(
     namedtuple("Meta", "string")
@@ -14,7 +17,8 @@ class Meta(
 class StringToLines(Lines):
 
     @staticmethod
-    def project(string):
+    @traced("StringToLines")
+    def project(string, first_row=0, num_rows=None):
         """
         >>> StringToLines.test_project("one\\ntwo")
         Line(text='one', number=1)
@@ -30,43 +34,55 @@ class StringToLines(Lines):
         Line(text='one', number=1)
         Line(text='two', number=2)
         Selection(start=Position(row=1, col=0), end=Position(row=1, col=0))
+
+        Only the lines in the given range are projected. Rows of selections
+        are relative to the first projected line:
+
+        >>> StringToLines.test_project("one\\ntwo\\nthree\\nfour", 9, 1, 2)
+        Line(text='two', number=2)
+        Line(text='three', number=3)
+        Selection(start=Position(row=1, col=1), end=Position(row=1, col=1))
+
+        >>> StringToLines.test_project("one\\ntwo\\nthree\\nfour", 0, 2, 2)
+        Line(text='three', number=3)
+        Line(text='four', number=4)
         """
-        lines = []
-        pos = 0
-        while True:
-            match_index = string.string.find("\n", pos)
-            if match_index >= 0:
-                lines.append((
-                    Line(text=string.string[pos:match_index], number=len(lines)+1),
-                    pos,
-                    match_index
-                ))
-                pos = match_index + 1
-            else:
-                break
-        lines.append((
-            Line(text=string.string[pos:len(string.string)], number=len(lines)+1),
-            pos,
-            len(string.string)
-        ))
+        rope = Rope.create(string.string)
+        first_row = max(0, min(first_row, rope.line_count()-1))
+        if num_rows is None:
+            num_rows = rope.line_count()
+        last_row = min(first_row+max(num_rows, 1), rope.line_count()) - 1
+        start = rope.line_start(first_row)
+        end = rope.line_end(last_row)
         selections = []
-        for selection in string.selections:
-            for row, (_, x, y) in enumerate(lines):
-                if x <= selection.pos_start <= y:
-                    start = Position(row=row, col=selection.pos_start-x)
-                if x <= selection.pos_end <= y:
-                    end = Position(row=row, col=selection.pos_end-x)
-            selections.append(Selection(start=start, end=end))
+        for index in range(
+            bisect.bisect_left(string.selections, start, key=lambda selection: selection.pos_end),
+            len(string.selections)
+        ):
+            selection = string.selections[index]
+            if selection.pos_start > end:
+                break
+            start_row, start_col = rope.row_col(max(selection.pos_start, start))
+            end_row, end_col = rope.row_col(min(selection.pos_end, end))
+            selections.append(Selection(
+                start=Position(row=start_row-first_row, col=start_col),
+                end=Position(row=end_row-first_row, col=end_col)
+            ))
         return StringToLines.create(
-            lines=(line[0] for line in lines),
+            lines=(
+                Line(text=text, number=first_row+index+1)
+                for index, text in enumerate(rope[start:end].split("\n"))
+            ),
             selections=selections,
             meta=Meta(string=string)
         )
 
     @staticmethod
-    def test_project(string, start=0):
+    def test_project(string, start=0, first_row=0, num_rows=None):
         StringToLines.project(
-            String.from_string(string=string, selection_start=start)
+            String.from_string(string=string, selection_start=start),
+            first_row=first_row,
+            num_rows=num_rows
         ).print_lines_selections()
 
     def move_cursor_forward(self):
@@ -75,8 +91,17 @@ class StringToLines(Lines):
     def move_cursor_back(self):
         return self.meta.string.move_cursor_back()
 
-    def select_next_word(self):
-        return self.meta.string.select_next_word()
+    def move_cursor_down(self, rows=1):
+        return self.meta.string.move_cursor_down(rows)
+
+    def move_cursor_up(self, rows=1):
+        return self.meta.string.move_cursor_up(rows)
+
+    def select_next_word(self, words):
+        return self.meta.string.select_next_word(words)
+
+    def select_all_occurrences(self, words):
+        return self.meta.string.select_all_occurrences(words)
 
     def replace(self, text):
         return self.meta.string.replace(text)
@@ -1,4 +1,5 @@
 from collections import namedtuple
+import bisect
 
 from rlprojectlib.domains.generic import Selections
 from rlprojectlib.domains.string import Selection
@@ -7,6 +8,7 @@ from rlprojectlib.domains.terminal import Cursor
 from rlprojectlib.domains.terminal import Terminal
 from rlprojectlib.domains.terminal import TextFragment
 from rlprojectlib.domains.terminal import TextFragmentsBuilder
+from rlprojectlib.projections.trace import traced
 
 class Meta(
     namedtuple("Meta", "string")
@@ -29,38 +31,108 @@ class StringToTerminal(Terminal):
     TextFragment(x=1, y=0, text='\\\\n', bold=None, bg=None, fg='MAGENTA')
     TextFragment(x=3, y=0, text='2', bold=None, bg=None, fg=None)
     Cursor(x=1, y=0)
+
+    I can project only a part of the string:
+
+    >>> StringToTerminal.project(
+    ...     String.from_string("hello world", 8),
+    ...     x=0,
+    ...     y=0,
+    ...     start=6,
+    ...     end=9
+    ... ).print_fragments_and_cursors()
+    TextFragment(x=0, y=0, text='wo', bold=None, bg=None, fg=None)
+    TextFragment(x=2, y=0, text='r', bold=None, bg=None, fg=None)
+    Cursor(x=2, y=0)
     """
 
     @staticmethod
-    def project(string, x, y):
+    @traced("StringToTerminal")
+    def project(string, x, y, start=0, end=None, styles=()):
+        """
+        Styles are sorted (start, end, fg) that color parts of the string:
+
+        >>> StringToTerminal.project(
+        ...     String.from_string("a = 'b'", 5, 1),
+        ...     x=0,
+        ...     y=0,
+        ...     styles=[(4, 7, "CYAN")]
+        ... ).print_fragments_and_cursors()
+        TextFragment(x=0, y=0, text='a = ', bold=None, bg=None, fg=None)
+        TextFragment(x=4, y=0, text="'", bold=None, bg=None, fg='CYAN')
+        TextFragment(x=5, y=0, text='b', bold=None, bg='YELLOW', fg='CYAN')
+        TextFragment(x=6, y=0, text="'", bold=None, bg=None, fg='CYAN')
+        Cursor(x=6, y=0)
+        """
+        if end is None:
+            end = len(string.string)
         fragments = TextFragmentsBuilder()
         cursors = []
-        last_pos = 0
-        for selection in string.selections:
-            x += fragments.extend(TextFragment(
-                text=string.string[last_pos:selection.pos_start],
-                y=y,
-                x=x
-            ).replace_newlines(fg="MAGENTA"))
+        last_pos = start
+        for index in range(
+            bisect.bisect_left(string.selections, start, key=lambda selection: selection.pos_end),
+            len(string.selections)
+        ):
+            selection = string.selections[index]
+            if selection.pos_start > end:
+                break
+            pos_start = max(selection.pos_start, start)
+            pos_end = min(selection.pos_end, end)
+            for text, fg in StringToTerminal.styled(string.string, last_pos, pos_start, styles):
+                x += fragments.extend(TextFragment(
+                    text=text,
+                    y=y,
+                    x=x,
+                    fg=fg
+                ).replace_newlines(fg="MAGENTA"))
+            for text, fg in StringToTerminal.styled(string.string, pos_start, pos_end, styles):
+                x += fragments.extend(TextFragment(
+                    text=text,
+                    y=y,
+                    x=x,
+                    bg="YELLOW",
+                    fg=fg
+                ).replace_newlines())
+            cursors.append(Cursor(x=x, y=y))
+            last_pos = pos_end
+        for text, fg in StringToTerminal.styled(string.string, last_pos, end, styles):
             x += fragments.extend(TextFragment(
-                text=string.string[selection.pos_start:selection.pos_end],
+                text=text,
                 y=y,
                 x=x,
-                bg="YELLOW"
-            ).replace_newlines())
-            cursors.append(Cursor(x=x, y=y))
-            last_pos = selection.pos_end
-        fragments.extend(TextFragment(
-            text=string.string[last_pos:],
-            y=y,
-            x=x
-        ).replace_newlines(fg="MAGENTA"))
+                fg=fg
+            ).replace_newlines(fg="MAGENTA"))
         return StringToTerminal.create(
             fragments=fragments.get(),
             cursors=cursors,
             meta=Meta(string=string)
         )
 
+    @staticmethod
+    def styled(string, start, end, styles):
+        """
+        Split the string between start and end into (text, fg) parts:
+
+        >>> StringToTerminal.styled("a = 'b' # c", 2, 11, [(4, 7, "CYAN"), (8, 11, "BLUE")])
+        [('= ', None), ("'b'", 'CYAN'), (' ', None), ('# c', 'BLUE')]
+        """
+        parts = []
+        pos = start
+        for index in range(
+            bisect.bisect_right(styles, start, key=lambda style: style[1]),
+            len(styles)
+        ):
+            style_start, style_end, fg = styles[index]
+            if style_start >= end:
+                break
+            if style_start > pos:
+                parts.append((string[pos:style_start], None))
+            parts.append((string[max(pos, style_start):min(style_end, end)], fg))
+            pos = min(style_end, end)
+        if pos < end:
+            parts.append((string[pos:end], None))
+        return parts
+
     @staticmethod
     def test_project(string, selection_start=0, selection_length=0):
         StringToTerminal.project(
@@ -90,11 +162,21 @@ class StringToTerminal(Terminal):
             return self.meta.string.move_cursor_forward()
         elif event.unicode_character == "\x02": # Ctrl-B
             return self.meta.string.move_cursor_back()
-        elif event.unicode_character == "\x0e": # Ctrl-N
-            return self.meta.string.select_next_word()
         elif event.unicode_character == "\x08": # Backspace
             return self.meta.string.delete_back()
         elif event.unicode_character and ord(event.unicode_character) >= 32:
             return self.meta.string.replace(event.unicode_character)
         else:
             return self.meta.string.get_source()
+
+    def text_event(self, event):
+        """
+        >>> from rlprojectlib.domains.terminal import TextEvent
+        >>> StringToTerminal.project(
+        ...     String.from_string("ab", 1),
+        ...     x=0,
+        ...     y=0
+        ... ).text_event(TextEvent("one\\ntwo")).string
+        'aone\\ntwob'
+        """
+        return self.meta.string.replace(event.text)
@@ -4,6 +4,7 @@ from rlprojectlib.domains.terminal import Cursor
 from rlprojectlib.domains.terminal import Terminal
 from rlprojectlib.domains.terminal import TextFragment
 from rlprojectlib.domains.terminal import TextFragmentsBuilder
+from rlprojectlib.projections.trace import traced
 
 class Meta(
     namedtuple("Meta", "terminal")
@@ -13,6 +14,7 @@ class Meta(
 class ClipScroll(Terminal):
 
     @staticmethod
+    @traced("ClipScroll")
     def project(terminal, width, height):
         """
         >>> ClipScroll.project(
@@ -62,3 +64,6 @@ class ClipScroll(Terminal):
 
     def keyboard_event(self, event):
         return self.meta.terminal.keyboard_event(event)
+
+    def text_event(self, event):
+        return self.meta.terminal.text_event(event)
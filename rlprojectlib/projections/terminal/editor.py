@@ -1,30 +1,85 @@
 from collections import namedtuple
+import bisect
+import os
 
+from rlprojectlib.domains.generic import Selections
+from rlprojectlib.domains.string import Selection
 from rlprojectlib.domains.string import String
 from rlprojectlib.domains.terminal import Cursor
 from rlprojectlib.domains.terminal import KeyboardEvent
-from rlprojectlib.domains.terminal import MeasurementEvent
 from rlprojectlib.domains.terminal import SizeEvent
 from rlprojectlib.domains.terminal import Terminal
+from rlprojectlib.domains.terminal import TextEvent
 from rlprojectlib.domains.terminal import TextFragment
-from rlprojectlib.drivers.wxterminal import DocumentProjectionDriver
+from rlprojectlib.domains.tree import SearchTree
+from rlprojectlib.domains.word_index import WordIndex
+from rlprojectlib.drivers.document import DocumentProjectionDriver
+from rlprojectlib.drivers.history import EditHistory
+from rlprojectlib.drivers.journal import EditJournal
+from rlprojectlib.drivers.project_search import ProjectSearch
+from rlprojectlib.drivers.search import RegexSearch
+from rlprojectlib.drivers.telemetry import Telemetry
+from rlprojectlib.projections.cache import ProjectionCache
+from rlprojectlib.projections.filter_lines import FilterLines
+from rlprojectlib.projections.highlight import HighlightLines
+from rlprojectlib.projections.highlight import Highlighter
 from rlprojectlib.projections.lines_to_terminal import LinesToTerminal
 from rlprojectlib.projections.string_to_lines import StringToLines
 from rlprojectlib.projections.string_to_terminal import StringToTerminal
 from rlprojectlib.projections.terminal.clipscroll import ClipScroll
 from rlprojectlib.projections.terminal.split import Pane
 from rlprojectlib.projections.terminal.split import SplitIntoRows
+from rlprojectlib.projections.trace import TRACER
+from rlprojectlib.projections.trace import traced
+from rlprojectlib.projections.tree_to_terminal import TreeToTerminal
+from rlprojectlib.projections.trigram import TrigramIndex
+from rlprojectlib.projections.wrap_lines import WrapIndex
+from rlprojectlib.projections.wrap_lines import WrapLines
 
 class ProjectionState(
-    namedtuple("ProjectionState", "terminal popup_terminal document")
+    namedtuple("ProjectionState", "terminal popup_terminal tree_terminal document lines_height rows")
 ):
     pass
 
 class EditorState(
-    namedtuple("EditorState", "width height popup event measurement_event")
+    namedtuple("EditorState", "path width height popup popup_mode popup_focus event scroll trace wrap tree workers")
 ):
     pass
 
+class Workers(
+    namedtuple("Workers", "cache telemetry history index words highlighter wrap_index search project_search")
+):
+
+    """
+    I hold the caches, indexes and background searches of an editor. They
+    are shared by all editor states and change in place, so they are kept
+    apart from the state of the view.
+    """
+
+    @staticmethod
+    def create(root=".", highlighter=None):
+        return Workers(
+            cache=ProjectionCache(),
+            telemetry=Telemetry(),
+            history=EditHistory(),
+            index=TrigramIndex(),
+            words=WordIndex(),
+            highlighter=highlighter,
+            wrap_index=WrapIndex(),
+            search=RegexSearch(),
+            project_search=ProjectSearch(root)
+        )
+
+    def resources(self):
+        return [self.search, self.project_search]
+
+    def idle_workers(self):
+        return [
+            worker
+            for worker in [self.highlighter, self.wrap_index]
+            if worker is not None
+        ]
+
 class Editor(Terminal):
 
     """
@@ -64,47 +119,224 @@ class Editor(Terminal):
     >>> driver.document.meta.popup is None
     True
 
+    A Ctrl-T shows how long the projections took:
+
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\x14"))
+    >>> driver.document.meta.trace
+    True
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\x14"))
+    >>> driver.document.meta.trace
+    False
+
     >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="k"))
     >>> driver.document.string[driver.document.selections[-1].start-1]
     'k'
+
+    Page down moves the cursor and the scroll offset one page:
+
+    >>> driver.document.meta.scroll
+    0
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\\x00", key="PAGE_DOWN"))
+    >>> driver.document.meta.scroll
+    6
+    >>> driver.document.string.row_col(driver.document.selections[-1].start)
+    (6, 1)
+
+    Moving the cursor within the page keeps the scroll offset:
+
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\x06"))
+    >>> driver.document.meta.scroll
+    6
+
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\\x00", key="PAGE_UP"))
+    >>> driver.document.meta.scroll
+    0
+
+    A text event inserts all of its text in one edit:
+
+    >>> _ = driver.text_event(TextEvent("pasted\\n"))
+    >>> driver.document.string[:9]
+    'k#pasted\\n'
+
+    Text typed in the popup filters the lines. Enter moves the focus to the
+    filtered lines, and edits only change those:
+
+    >>> _ = driver.size_event(SizeEvent(30, 8))
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\x07"))
+    >>> for character in "import":
+    ...     _ = driver.keyboard_event(KeyboardEvent(unicode_character=character))
+    >>> driver.terminal.print_ascii_layout() # doctest: +ELLIPSIS
+    KeyboardEvent(unicode_characte
+    Filter: import...
+    5     import sys
+    7         import doctest
+    8         import unittest
+    ------------------------------
+    ...
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\\r"))
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\\x00", key="PAGE_DOWN"))
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="#"))
+    >>> driver.document.string.row_col(driver.document.selections[-1].start)
+    (7, 1)
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\x07"))
+
+    A Ctrl-R searches for a regular expression in the background. Matches
+    are shown as they are found, and Enter puts a cursor on each of them:
+
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\x12"))
+    >>> _ = driver.text_event(TextEvent("import \\\\w+"))
+    >>> _ = driver.document.meta.workers.search.wait()
+    >>> _ = driver.refresh()
+    >>> driver.document.meta.workers.search.results.done
+    True
+    >>> import re
+    >>> matches = re.findall(r"import \\w+", str(driver.document.string))
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\\r"))
+    >>> driver.document.meta.popup is None
+    True
+    >>> len(driver.document.selections) == len(matches) > 1
+    True
+
+    A Ctrl-N selects the word at the cursor and a Ctrl-A puts a cursor on
+    every occurrence of it:
+
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\x02"))
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\x0e"))
+    >>> selection = driver.document.selections[-1]
+    >>> driver.document.string[selection.pos_start:selection.pos_end]
+    'document'
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\x01"))
+    >>> len(driver.document.selections) == len(re.findall(r"\\bdocument\\b", str(driver.document.string)))
+    True
+
+    A Ctrl-Z undoes the last group of changes (changes made within a
+    second of each other, but here every change is its own group) and a
+    Ctrl-Y redoes it:
+
+    >>> driver.document.meta.workers.history.group_interval = 0
+    >>> before = driver.document.string
+    >>> _ = driver.text_event(TextEvent("new"))
+    >>> edited = driver.document.string
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\\x1a"))
+    >>> driver.document.string == before
+    True
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\\x19"))
+    >>> driver.document.string == edited
+    True
+
+    A Ctrl-W wraps long lines instead of cutting them at the pane width.
+    The cursor is at the end of a long line, so the pane is scrolled
+    sideways and line numbers are hidden until lines are wrapped:
+
+    >>> def line_numbers():
+    ...     return [f for f in driver.terminal.fragments if f.fg == "YELLOW"]
+    >>> len(line_numbers())
+    0
+    >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\\x17"))
+    >>> driver.document.meta.wrap
+    True
+    >>> len(line_numbers()) > 0
+    True
     """
 
     @staticmethod
-    def create_driver(path):
-        return DocumentProjectionDriver(
-            String.from_file(path).replace_meta(EditorState(
-                width=10,
-                height=10,
-                popup=None,
-                event=None,
-                measurement_event=MeasurementEvent(0, 0)
-            )),
-            Editor.project
+    def create_driver(path, journal=False, root=None):
+        """
+        The project search searches root, or the directory of path if no
+        root is given.
+        """
+        if journal:
+            journal = EditJournal.open(path)
+            string = String.from_string(journal.rope)
+        else:
+            journal = None
+            string = String.from_file(path)
+        workers = Workers.create(
+            root=os.path.dirname(os.path.abspath(path)) if root is None else root,
+            highlighter=Highlighter() if path.endswith(".py") else None
         )
+        driver = DocumentProjectionDriver(
+            Editor.create_document(string, workers, path=os.path.abspath(path)),
+            Editor.project,
+            telemetry=workers.telemetry,
+            journal=journal,
+            history=workers.history,
+            resources=workers.resources(),
+            idle_workers=workers.idle_workers()
+        )
+        workers.search.on_progress = driver.invalidate
+        workers.project_search.on_progress = driver.invalidate
+        return driver
 
     @staticmethod
+    def create_document(string, workers=None, path=None):
+        return string.replace_meta(EditorState(
+            path=path,
+            width=10,
+            height=10,
+            popup=None,
+            popup_mode=None,
+            popup_focus=False,
+            event=None,
+            scroll=0,
+            trace=False,
+            wrap=False,
+            tree=None,
+            workers=Workers.create() if workers is None else workers
+        ))
+
+    @staticmethod
+    @traced("Editor")
     def project(document):
         """
         >>> document = String.from_string("hello").replace_meta(EditorState(
+        ...     path=None,
         ...     width=12,
         ...     height=6,
         ...     popup=None,
+        ...     popup_mode=None,
+        ...     popup_focus=False,
         ...     event=None,
-        ...     measurement_event=MeasurementEvent(0, 0)
+        ...     scroll=0,
+        ...     trace=False,
+        ...     wrap=False,
+        ...     tree=None,
+        ...     workers=Workers.create()
         ... ))
         >>> Editor.project(document).print_fragments_and_cursors()
-        TextFragment(x=0, y=0, text='None 0ms 0ms', bold=None, bg='MAGENTA', fg='WHITE')
+        TextFragment(x=0, y=0, text='None        ', bold=None, bg='MAGENTA', fg='WHITE')
         TextFragment(x=0, y=1, text='1', bold=None, bg=None, fg='YELLOW')
         TextFragment(x=2, y=1, text='hello', bold=None, bg=None, fg=None)
         TextFragment(x=0, y=4, text='------------', bold=None, bg='FOREGROUND', fg='BACKGROUND')
         TextFragment(x=0, y=5, text='hello', bold=None, bg=None, fg=None)
         Cursor(x=2, y=1)
+
+        Panes that do not depend on what changed are reused:
+
+        >>> cache = document.meta.workers.cache
+        >>> cache.hits, cache.misses
+        (0, 2)
+        >>> _ = Editor.project(document.with_meta(event="changed"))
+        >>> cache.hits, cache.misses
+        (2, 2)
+
+        A search popup shows what the search for its query has found, but it
+        is up to the event handlers to start the search:
+
+        >>> _ = Editor.project(document.with_meta(
+        ...     popup=String.from_string("h"),
+        ...     popup_mode="search",
+        ...     popup_focus=True
+        ... ))
+        >>> document.meta.workers.search.results is None
+        True
         """
+        cache = document.meta.workers.cache
         splits = []
         splits.append(Pane(
             lambda width, height: Terminal.create(
                 fragments=[TextFragment(
-                    text=f"{document.meta.event} {document.meta.measurement_event.ms_project}ms {document.meta.measurement_event.ms_repaint}ms".ljust(width),
+                    text=f"{document.meta.event} {document.meta.workers.telemetry.status()}".ljust(width),
                     x=0,
                     y=0,
                     bg="MAGENTA",
@@ -114,37 +346,114 @@ class Editor(Terminal):
             0,
             False
         ))
+        rows = None
+        results = None
+        lines_document = document
         if document.meta.popup:
-            popup_terminal = StringToTerminal.project(
-                document.meta.popup,
-                x=0,
-                y=0
+            query = str(document.meta.popup.string)
+            if document.meta.popup_mode == "search":
+                results = document.meta.workers.search.results
+                if results is None or results.rope is not document.string or results.pattern != query:
+                    results = None
+                elif results.matches:
+                    lines_document = document._replace(selections=cache.memoize(
+                        ("search selections",),
+                        (results,),
+                        lambda: Editor.search_selections(results)
+                    ))
+            elif document.meta.popup_mode == "filter" and query:
+                rows = document.meta.workers.index.filter(document.string, query)
+            popup_terminal = cache.memoize(
+                ("popup",),
+                (document.meta.popup,),
+                lambda: StringToTerminal.project(
+                    document.meta.popup,
+                    x=0,
+                    y=0
+                )
             )
+            label = f"{document.meta.popup_mode.capitalize()}:"
             splits.append(Pane(
                 lambda width, height: Terminal.create(
                     fragments=[TextFragment(
-                        text=f"Filter:".ljust(width),
+                        text=label.ljust(width),
                         x=0,
                         y=0,
                         bg="GREEN",
                         fg="WHITE",
                         bold=True
                     )]
-                ).merge(popup_terminal.style(bg="GREEN", fg="WHITE").translate(dx=8)),
+                ).merge(popup_terminal.style(bg="GREEN", fg="WHITE").translate(dx=len(label)+1)),
                 0,
-                True
+                document.meta.popup_focus
             ))
         else:
             popup_terminal = None
-        splits.append(Pane(
-            LinesToTerminal.project(
-                StringToLines.project(
-                    document
-                )
-            ),
-            3,
-            True if popup_terminal is None else False
-        ))
+        tree = document.meta.tree
+        lines_index = len(splits)
+        if tree is None:
+            tree_terminal = None
+            splits.append(Pane(
+                lambda width, height: Editor.project_lines(
+                    lines_document,
+                    first_row=Editor.get_first_row(
+                        document,
+                        height=height,
+                        scroll=document.meta.scroll,
+                        rows=rows,
+                        wrap_width=Editor.get_wrap_width(document, width, rows)
+                    ),
+                    num_rows=height,
+                    rows=rows,
+                    wrap_width=Editor.get_wrap_width(document, width, rows)
+                ),
+                3,
+                popup_terminal is None or not document.meta.popup_focus
+            ))
+        else:
+            project_results = document.meta.workers.project_search.results
+            if project_results is not None and len(project_results.files) > len(tree.files):
+                tree = tree.merge(project_results.files[len(tree.files):])
+            tree_terminal = cache.memoize(
+                ("tree", document.meta.height),
+                (tree,),
+                lambda: TreeToTerminal.project(tree, num_rows=document.meta.height)
+            )
+            splits.append(Pane(
+                lambda width, height: tree_terminal,
+                3,
+                not document.meta.popup_focus
+            ))
+            splits.append(Pane.create(
+                lambda width, height: Editor.project_tree_status(
+                    tree,
+                    project_results,
+                    width=width
+                ),
+                proportion=0
+            ))
+        if results is not None:
+            splits.append(Pane.create(
+                lambda width, height: cache.memoize(
+                    ("search results", width, height),
+                    (results,),
+                    lambda: Editor.project_search_results(
+                        results,
+                        width=width,
+                        height=height
+                    )
+                ),
+                proportion=1
+            ))
+        if document.meta.trace:
+            splits.append(Pane.create(
+                lambda width, height: Editor.project_trace(
+                    TRACER.last_frame,
+                    width=width,
+                    height=height
+                ),
+                proportion=2
+            ))
         splits.append(Pane.create(
             lambda width, height: Terminal.create(
                 fragments=[TextFragment(
@@ -158,10 +467,16 @@ class Editor(Terminal):
             proportion=0,
         ))
         splits.append(Pane.create(
-            StringToTerminal.project(
-                document,
-                x=0,
-                y=0
+            lambda width, height: cache.memoize(
+                ("string", width),
+                (document.string, document.selections),
+                lambda: StringToTerminal.project(
+                    document,
+                    x=0,
+                    y=0,
+                    start=max(0, document.selections[-1].start-width),
+                    end=document.selections[-1].start+width
+                )
             )
         ))
         split = SplitIntoRows.project(
@@ -169,14 +484,252 @@ class Editor(Terminal):
             width=document.meta.width,
             height=document.meta.height
         )
+        lines_height = split.meta.sizes[lines_index]
         return Editor(
             *split.replace_meta(ProjectionState(
                 terminal=split,
                 popup_terminal=popup_terminal,
-                document=document
+                tree_terminal=tree_terminal,
+                document=document.with_meta(
+                    tree=tree,
+                    scroll=Editor.get_first_row(
+                        document,
+                        height=lines_height,
+                        scroll=document.meta.scroll,
+                        rows=rows,
+                        wrap_width=Editor.get_wrap_width(document, document.meta.width, rows)
+                    )
+                ),
+                lines_height=lines_height,
+                rows=rows
             ))
         )
 
+    @staticmethod
+    def project_lines(document, first_row, num_rows, rows=None, wrap_width=None):
+        """
+        If rows is given, I show only those rows (the result of the filter)
+        and first_row and num_rows count filtered rows.
+
+        If the document has a highlighter, the lines are highlighted:
+
+        >>> document = Editor.create_document(
+        ...     String.from_string("if x:\\n    pass # ok"),
+        ...     Workers.create(highlighter=Highlighter())
+        ... )
+        >>> Editor.project_lines(document, 0, 2).print_fragments_and_cursors()
+        TextFragment(x=0, y=0, text='1', bold=None, bg=None, fg='YELLOW')
+        TextFragment(x=2, y=0, text='if', bold=None, bg=None, fg='GREEN')
+        TextFragment(x=4, y=0, text=' x:', bold=None, bg=None, fg=None)
+        TextFragment(x=0, y=1, text='2', bold=None, bg=None, fg='YELLOW')
+        TextFragment(x=2, y=1, text='    ', bold=None, bg=None, fg=None)
+        TextFragment(x=6, y=1, text='pass', bold=None, bg=None, fg='GREEN')
+        TextFragment(x=10, y=1, text=' ', bold=None, bg=None, fg=None)
+        TextFragment(x=11, y=1, text='# ok', bold=None, bg=None, fg='BLUE')
+        Cursor(x=2, y=0)
+
+        If wrap_width is given, lines are wrapped at that width:
+
+        >>> document = Editor.create_document(String.from_string("one two three\\nfour", 10))
+        >>> Editor.project_lines(document, 0, 2, wrap_width=8).print_fragments_and_cursors()
+        TextFragment(x=0, y=0, text='1', bold=None, bg=None, fg='YELLOW')
+        TextFragment(x=2, y=0, text='one two ', bold=None, bg=None, fg=None)
+        TextFragment(x=2, y=1, text='th', bold=None, bg=None, fg=None)
+        TextFragment(x=4, y=1, text='ree', bold=None, bg=None, fg=None)
+        TextFragment(x=0, y=2, text='2', bold=None, bg=None, fg='YELLOW')
+        TextFragment(x=2, y=2, text='four', bold=None, bg=None, fg=None)
+        Cursor(x=4, y=1)
+        """
+        if rows is not None:
+            visible_rows = rows[first_row:first_row+num_rows]
+            lines_fn = lambda: FilterLines.project(
+                document,
+                rows,
+                first_row=first_row,
+                num_rows=num_rows
+            )
+            key = ("filter", first_row, num_rows)
+        else:
+            visible_rows = range(first_row, first_row+max(num_rows, 1))
+            lines_fn = lambda: StringToLines.project(
+                document,
+                first_row=first_row,
+                num_rows=num_rows
+            )
+            key = ("lines", first_row, num_rows)
+        if document.meta.workers.highlighter is None:
+            highlighting = None
+            styled_fn = lines_fn
+        else:
+            # The same highlighting is returned until the states of the
+            # visible rows change
+            highlighting = document.meta.workers.highlighter.highlight(
+                document.string,
+                visible_rows
+            )
+            styled_fn = lambda: HighlightLines.project(lines_fn(), highlighting)
+        if wrap_width is None:
+            wrapped_fn = styled_fn
+        else:
+            wrapped_fn = lambda: WrapLines.project(
+                styled_fn(),
+                width=wrap_width,
+                layout=document.meta.workers.wrap_index.layout
+            )
+            key = key + (wrap_width,)
+        return document.meta.workers.cache.memoize(
+            key,
+            (document.string, document.selections, rows, highlighting),
+            lambda: LinesToTerminal.project(wrapped_fn()).compact()
+        )
+
+    @staticmethod
+    def project_trace(frame, width, height):
+        """
+        I show how long each projection took in the last frame:
+
+        >>> from rlprojectlib.projections.trace import Tracer
+        >>> tracer = Tracer()
+        >>> with tracer.frame("KeyboardEvent"):
+        ...     with tracer.span("Editor"):
+        ...         pass
+        >>> Editor.project_trace(tracer.last_frame, width=30, height=5).print_ascii_layout()
+        ... # doctest: +ELLIPSIS
+        KeyboardEvent ...ms
+          Editor ...ms
+        """
+        fragments = []
+        if frame is not None:
+            for y, (depth, span) in zip(range(height), frame.walk()):
+                fragments.append(TextFragment(
+                    x=0,
+                    y=y,
+                    text=f"{'  '*depth}{span.name} {span.ns/1e6:.3f}ms"[:width],
+                    fg="CYAN"
+                ))
+        return Terminal.create(fragments=fragments)
+
+    @staticmethod
+    def project_search_results(results, width, height):
+        """
+        I show how many matches a search has found so far and the lines of
+        the first ones:
+
+        >>> from rlprojectlib.drivers.search import SearchResults
+        >>> from rlprojectlib.domains.generic import ImmutableList
+        >>> from rlprojectlib.domains.rope import Rope
+        >>> Editor.project_search_results(SearchResults(
+        ...     rope=Rope.from_string("one\\ntwo\\nthree"),
+        ...     pattern="o",
+        ...     matches=ImmutableList([(2, 3), (6, 7)]),
+        ...     searched=7,
+        ...     done=False,
+        ...     error=None
+        ... ), width=20, height=5).print_ascii_layout()
+        2 matches (54%)
+        1: one
+        2: two
+        """
+        if results.error:
+            header = results.error
+        elif results.done:
+            header = f"{len(results.matches)} matches"
+        else:
+            header = f"{len(results.matches)} matches ({results.progress:.0%})"
+        fragments = [TextFragment(x=0, y=0, text=header[:width], fg="CYAN")]
+        for y, (start, end) in zip(range(1, height), results.matches):
+            row, _ = results.rope.row_col(start)
+            line = results.rope[results.rope.line_start(row):results.rope.line_end(row)]
+            fragments.append(TextFragment(x=0, y=y, text=f"{row+1}: {line}"[:width]))
+        return Terminal.create(fragments=fragments)
+
+    @staticmethod
+    def project_tree_status(tree, results, width):
+        """
+        >>> from rlprojectlib.drivers.project_search import ProjectSearchResults
+        >>> Editor.project_tree_status(
+        ...     SearchTree.create("."),
+        ...     ProjectSearchResults("x", [], 10, False, None),
+        ...     width=50
+        ... ).print_ascii_layout()
+        0 matches in 0 files (10 files searched...)
+        """
+        if results is None:
+            text = ""
+        elif results.error:
+            text = results.error
+        else:
+            text = (
+                f"{tree.hit_count} matches in {len(tree.files)} files "
+                f"({results.scanned} files searched{'' if results.done else '...'})"
+            )
+        return Terminal.create(fragments=[TextFragment(
+            x=0,
+            y=0,
+            text=text[:width],
+            fg="CYAN"
+        )])
+
+    @staticmethod
+    def search_selections(results):
+        return Selections(
+            Selection(start=start, length=end-start)
+            for start, end in results.matches
+        )
+
+    @staticmethod
+    def get_first_row(string, height, scroll, rows=None, wrap_width=None):
+        """
+        I adjust the scroll offset so that the cursor is visible:
+
+        >>> string = String.from_string("1\\n2\\n3\\n4\\n5", 6)
+        >>> Editor.get_first_row(string, height=2, scroll=0)
+        2
+        >>> Editor.get_first_row(string, height=2, scroll=2)
+        2
+        >>> Editor.get_first_row(string, height=2, scroll=4)
+        3
+
+        When lines are filtered, rows are counted in the filtered lines:
+
+        >>> Editor.get_first_row(string, height=2, scroll=0, rows=(0, 1, 3, 4))
+        1
+
+        When lines are wrapped, height counts visual rows (here the cursor
+        is on the second row of line 4):
+
+        >>> document = Editor.create_document(String.from_string("1\\n2\\n3\\n4 four\\n5", 8))
+        >>> Editor.get_first_row(document, height=3, scroll=0, wrap_width=3)
+        2
+        """
+        row, col = string.string.row_col(string.selections[-1].start)
+        if rows is not None:
+            row = bisect.bisect_left(rows, row)
+        elif wrap_width is not None:
+            top = string.meta.workers.wrap_index.top_row(string.string, wrap_width, row, col, height)
+            return max(top, min(scroll, row))
+        return max(0, row-max(height, 1)+1, min(scroll, row))
+
+    @staticmethod
+    def get_wrap_width(document, width, rows):
+        """
+        Return the width to wrap lines at in a pane of width, or None if
+        lines are not wrapped. Filtered lines are not wrapped.
+
+        The line number column is as wide as the largest line number, so
+        the width does not change with the lines that are shown. One column
+        is left for a cursor at the end of a row.
+
+        >>> document = Editor.create_document(String.from_string("x\\n" * 20))
+        >>> Editor.get_wrap_width(document, 20, None) is None
+        True
+        >>> Editor.get_wrap_width(document.with_meta(wrap=True), 20, None)
+        16
+        """
+        if not document.meta.wrap or rows is not None:
+            return None
+        return max(1, width-len(str(document.string.line_count()))-2)
+
     def size_event(self, event):
         return self.document.with_meta(
             width=event.width,
@@ -186,29 +739,217 @@ class Editor(Terminal):
 
     def keyboard_event(self, event):
         if event.unicode_character == "\x07": # Ctrl-G
-            if self.editor_state.popup:
-                return self.document.with_meta(
-                    popup=None,
-                    event=event
-                )
-            else:
+            return self.toggle_popup("filter", event)
+        elif event.unicode_character == "\x12": # Ctrl-R
+            return self.toggle_popup("search", event)
+        elif event.unicode_character == "\x10": # Ctrl-P
+            return self.toggle_popup("project", event)
+        elif event.unicode_character == "\x14": # Ctrl-T
+            return self.document.with_meta(
+                trace=not self.editor_state.trace,
+                event=event
+            )
+        elif self.editor_state.popup and self.editor_state.popup_focus:
+            if event.unicode_character == "\r": # Enter
+                if self.editor_state.popup_mode == "search":
+                    return self.select_search_results(event)
+                elif self.editor_state.popup_mode == "project":
+                    return self.search_project(event)
                 return self.document.with_meta(
-                    popup=String.from_string(''),
+                    popup_focus=False,
                     event=event
                 )
-        elif self.editor_state.popup:
-            return self.document.with_meta(
+            return self.update_search(self.document.with_meta(
                 popup=self.projection_state.popup_terminal.keyboard_event(event),
                 event=event
+            ))
+        elif self.editor_state.tree is not None:
+            return self.edit_tree(
+                self.projection_state.tree_terminal.keyboard_event(event),
+                event
+            )
+        elif event.unicode_character == "\x1a": # Ctrl-Z
+            return self.editor_state.workers.history.undo(self.document).with_meta(
+                event=event
+            )
+        elif event.unicode_character == "\x19": # Ctrl-Y
+            return self.editor_state.workers.history.redo(self.document).with_meta(
+                event=event
             )
+        elif event.unicode_character == "\x17": # Ctrl-W
+            return self.document.with_meta(
+                wrap=not self.editor_state.wrap,
+                event=event
+            )
+        elif event.unicode_character == "\x0e": # Ctrl-N
+            return self.document.select_next_word(self.editor_state.workers.words).with_meta(
+                event=event
+            )
+        elif event.unicode_character == "\x01": # Ctrl-A
+            return self.document.select_all_occurrences(self.editor_state.workers.words).with_meta(
+                event=event
+            )
+        elif event.key == "PAGE_DOWN":
+            return self.page(self.projection_state.lines_height, event)
+        elif event.key == "PAGE_UP":
+            return self.page(-self.projection_state.lines_height, event)
         else:
-            return self.projection_state.terminal.keyboard_event(event).with_meta(
+            # Cached panes may refer to an older editor state
+            return self.projection_state.terminal.keyboard_event(event).replace_meta(
+                self.editor_state._replace(event=event)
+            )
+
+    def text_event(self, event):
+        if self.editor_state.popup and self.editor_state.popup_focus:
+            return self.update_search(self.document.with_meta(
+                popup=self.projection_state.popup_terminal.text_event(event),
                 event=event
+            ))
+        elif self.editor_state.tree is not None:
+            return self.edit_tree(
+                self.projection_state.tree_terminal.text_event(event),
+                event
+            )
+        else:
+            # Cached panes may refer to an older editor state
+            return self.projection_state.terminal.text_event(event).replace_meta(
+                self.editor_state._replace(event=event)
             )
 
-    def measurement_event(self, event):
+    def toggle_popup(self, mode, event):
+        if self.editor_state.popup:
+            self.editor_state.workers.search.cancel()
+            self.editor_state.workers.project_search.cancel()
+            return self.document.with_meta(
+                popup=None,
+                popup_mode=None,
+                tree=None,
+                event=event
+            )
+        else:
+            return self.document.with_meta(
+                popup=String.from_string(''),
+                popup_mode=mode,
+                popup_focus=True,
+                event=event
+            )
+
+    def update_search(self, document):
+        """
+        Start searching for the query in the search popup in the background,
+        or stop searching when the query is empty. The projection only shows
+        the results.
+        """
+        if document.meta.popup_mode == "search":
+            query = str(document.meta.popup.string)
+            if query:
+                document.meta.workers.search.search(document.string, query)
+            else:
+                document.meta.workers.search.cancel()
+        return document
+
+    def select_search_results(self, event):
+        """
+        Close the search and put a cursor on every match found so far.
+        """
+        results = self.editor_state.workers.search.results
+        document = self.document
+        if results is not None and results.matches and results.rope is document.string:
+            document = document._replace(selections=Editor.search_selections(results))
+        self.editor_state.workers.search.cancel()
+        return document.with_meta(
+            popup=None,
+            popup_mode=None,
+            event=event
+        )
+
+    def search_project(self, event):
+        """
+        Search all files next to the document and show the matches in a tree
+        that has the focus.
+
+        >>> import tempfile
+        >>> root = tempfile.mkdtemp()
+        >>> path = os.path.join(root, "foo.py")
+        >>> other_path = os.path.join(root, "other.py")
+        >>> with open(path, "w") as f:
+        ...     _ = f.write("end\\nthis foo is cool\\n")
+        >>> with open(other_path, "w") as f:
+        ...     _ = f.write("foo\\n")
+        >>> driver = Editor.create_driver(path)
+        >>> _ = driver.size_event(SizeEvent(40, 10))
+        >>> _ = driver.text_event(TextEvent("the "))
+        >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\\x10"))
+        >>> _ = driver.text_event(TextEvent("foo"))
+        >>> _ = driver.keyboard_event(KeyboardEvent(unicode_character="\\r"))
+        >>> _ = driver.document.meta.workers.project_search.wait()
+        >>> _ = driver.refresh()
+        >>> driver.terminal.print_ascii_layout() # doctest: +ELLIPSIS
+        KeyboardEvent(unicode_character='\\r', ke
+        Project: foo...
+        ./foo.py
+            2 this foo is cool
+        ./other.py
+            1 foo
+        2 matches in 2 files (2 files searched)
+        ...
+
+        Typing replaces the matches. Other files are written when the editor
+        is closed at the latest, but the open document is edited, so its
+        changes that are not saved are kept:
+
+        >>> for character in "bar":
+        ...     _ = driver.keyboard_event(KeyboardEvent(unicode_character=character))
+        >>> driver.close()
+        >>> open(other_path).read()
+        'bar\\n'
+        >>> str(driver.document.string), open(path).read()
+        ('the end\\nthis bar is cool\\n', 'end\\nthis foo is cool\\n')
+        """
+        project_search = self.editor_state.workers.project_search
+        project_search.search(str(self.editor_state.popup.string))
         return self.document.with_meta(
-            measurement_event=event
+            popup_focus=False,
+            tree=SearchTree.create(project_search.root),
+            event=event
+        )
+
+    def edit_tree(self, tree, event):
+        """
+        Edits of the matches are written back to their files in the
+        background, except edits of the open document. They are made to the
+        document, so that they do not overwrite changes that are not saved.
+        """
+        document = self.document
+        if tree is not self.editor_state.tree:
+            path = self.editor_state.path
+            document = document.replace_lines([
+                (row, old, new)
+                for edit_path, row, old, new in tree.edits
+                if edit_path == path
+            ])
+            self.editor_state.workers.project_search.write([
+                edit
+                for edit in tree.edits
+                if edit[0] != path
+            ])
+        return document.with_meta(
+            tree=tree,
+            event=event
+        )
+
+    def page(self, rows, event):
+        if self.projection_state.rows is None:
+            document = self.document.move_cursor_down(rows)
+        else:
+            document = FilterLines.move_down(
+                self.document,
+                self.projection_state.rows,
+                rows
+            )
+        return document.with_meta(
+            scroll=max(0, self.editor_state.scroll+rows),
+            event=event
         )
 
     @property
@@ -1,18 +1,19 @@
 from collections import namedtuple
 
 from rlprojectlib.domains.terminal import Cursor
+from rlprojectlib.domains.terminal import Fragments
 from rlprojectlib.domains.terminal import Terminal
 from rlprojectlib.domains.terminal import TextFragment
-from rlprojectlib.domains.terminal import TextFragmentsBuilder
 from rlprojectlib.projections.terminal.clipscroll import ClipScroll
+from rlprojectlib.projections.trace import TRACER
 
 class Meta(
-    namedtuple("Meta", "active_terminal")
+    namedtuple("Meta", "active_terminal sizes")
 ):
     pass
 
 class Pane(
-    namedtuple("Pane", "fn_or_terminal,proportion,active")
+    namedtuple("Pane", "fn_or_terminal,proportion,active,min_size,max_size", defaults=[None, None])
 ):
 
     @staticmethod
@@ -20,8 +21,21 @@ class Pane(
         return Pane(fn_or_terminal, proportion=0, active=False)
 
     @staticmethod
-    def create(fn_or_terminal, proportion=1, active=False):
-        return Pane(fn_or_terminal, proportion=proportion, active=active)
+    def create(fn_or_terminal, proportion=1, active=False, min_size=None, max_size=None):
+        return Pane(
+            fn_or_terminal,
+            proportion=proportion,
+            active=active,
+            min_size=min_size,
+            max_size=max_size
+        )
+
+    def clamp(self, size):
+        if self.max_size is not None:
+            size = min(size, self.max_size)
+        if self.min_size is not None:
+            size = max(size, self.min_size)
+        return size
 
     def calculate_terminal(self, width, height):
         if isinstance(self.fn_or_terminal, Terminal):
@@ -101,6 +115,26 @@ class Split(Terminal):
     222
     222
 
+    Panes are projected once, even the ones that are measured:
+
+    >>> calls = []
+    >>> def status(width, height):
+    ...     calls.append((width, height))
+    ...     return terminal1
+    >>> SplitIntoRows.project([
+    ...     Pane.create0(status),
+    ...     Pane.create(SplitIntoColumns.project_partial([
+    ...         Pane.create0(status),
+    ...         Pane.create(terminal3),
+    ...     ])),
+    ... ], width=20, height=4).print_ascii_layout()
+    1111111111
+    1111111111
+    11111111113333333333
+    11111111113333333333
+    >>> calls
+    [(20, 4), (20, 2)]
+
     >>> one_space_two = SplitIntoColumns.project_partial([
     ...     Pane(
     ...         Terminal.create(fragments=[TextFragment(x=0, y=0, text="1")]),
@@ -165,34 +199,99 @@ class Split(Terminal):
 
     @classmethod
     def project(cls, options, width, height):
-        builder = TextFragmentsBuilder()
+        with TRACER.span(cls.__name__):
+            return cls._project(options, width, height)
+
+    @classmethod
+    def _project(cls, options, width, height):
+        fragments = []
         offset = 0
         active = None
-        size_left = cls.get_start_size(width, height)
-        proportion_total = 0
-        for option in options:
-            if option.proportion == 0:
-                size_left -= cls.get_size(width, height, option)
-            else:
-                proportion_total += option.proportion
-        for option in options:
+        measured = {}
+        for index, option in enumerate(options):
             if option.proportion == 0:
-                terminal_size = cls.get_size(width, height, option)
-            else:
-                terminal_size = int(size_left * (option.proportion/proportion_total))
+                with TRACER.span(f"pane {index}"):
+                    measured[index] = option.calculate_terminal(width, height)
+        sizes = cls.layout(
+            options,
+            {
+                index: cls.get_size(terminal)
+                for index, terminal in measured.items()
+            },
+            cls.get_start_size(width, height)
+        )
+        for index, (option, terminal_size) in enumerate(zip(options, sizes)):
             child_size = cls.get_child_size(width, height, terminal_size)
-            terminal = ClipScroll.project(
-                option.calculate_terminal(**child_size),
-                **child_size
-            ).translate(**cls.get_dx_xy(offset))
-            builder.extend(terminal.fragments)
+            with TRACER.span(f"pane {index}"):
+                if index in measured:
+                    terminal = measured[index]
+                else:
+                    terminal = option.calculate_terminal(**child_size)
+                terminal = ClipScroll.project(
+                    terminal,
+                    **child_size
+                ).translate(**cls.get_dx_xy(offset))
+            fragments.append(terminal.fragments)
             offset += terminal_size
             if option.active:
                 active = terminal
         return SplitIntoRows(*Terminal.create(
-            fragments=builder.get(),
+            fragments=Fragments.concat(fragments),
             cursors=active.cursors if active else []
-        )).replace_meta(Meta(active_terminal=active))
+        )).replace_meta(Meta(active_terminal=active, sizes=sizes))
+
+    @staticmethod
+    def layout(options, measured_sizes, total_size):
+        """
+        I calculate the size of every pane. Panes with proportion 0 get the
+        size they measured. The rest is shared by proportion. Panes that end
+        up outside their min/max size are fixed at the limit and the rest is
+        shared again among the others.
+
+        >>> Split.layout([Pane.create(None), Pane.create(None)], {}, 10)
+        [5, 5]
+        >>> Split.layout([Pane.create0(None), Pane.create(None, 2)], {0: 1}, 10)
+        [1, 9]
+        >>> Split.layout([
+        ...     Pane.create(None, max_size=2),
+        ...     Pane.create(None),
+        ...     Pane.create(None, min_size=5),
+        ... ], {}, 12)
+        [2, 5, 5]
+        >>> Split.layout([Pane.create0(None), Pane.create(None)], {0: 20}, 10)
+        [20, 0]
+        """
+        sizes = [None] * len(options)
+        size_left = total_size
+        for index, option in enumerate(options):
+            if option.proportion == 0:
+                sizes[index] = option.clamp(measured_sizes[index])
+                size_left -= sizes[index]
+        flexible = [
+            index
+            for index, option in enumerate(options)
+            if option.proportion != 0
+        ]
+        while flexible:
+            proportion_total = sum(options[index].proportion for index in flexible)
+            tentative = {
+                index: int(max(size_left, 0) * (options[index].proportion/proportion_total))
+                for index in flexible
+            }
+            violations = [
+                index
+                for index in flexible
+                if options[index].clamp(tentative[index]) != tentative[index]
+            ]
+            if not violations:
+                for index in flexible:
+                    sizes[index] = tentative[index]
+                break
+            for index in violations:
+                sizes[index] = options[index].clamp(tentative[index])
+                size_left -= sizes[index]
+                flexible.remove(index)
+        return sizes
 
     def size_event(self, event):
         return self.meta.active_terminal.size_event(event)
@@ -200,6 +299,9 @@ class Split(Terminal):
     def keyboard_event(self, event):
         return self.meta.active_terminal.keyboard_event(event)
 
+    def text_event(self, event):
+        return self.meta.active_terminal.text_event(event)
+
 class SplitIntoRows(Split):
 
     """
@@ -258,8 +360,8 @@ class SplitIntoRows(Split):
     """
 
     @staticmethod
-    def get_size(width, height, option):
-        return option.calculate_terminal(width, height).get_height()
+    def get_size(terminal):
+        return terminal.get_height()
 
     @staticmethod
     def get_start_size(width, height):
@@ -294,8 +396,8 @@ class SplitIntoColumns(Split):
     """
 
     @staticmethod
-    def get_size(width, height, option):
-        return option.calculate_terminal(width, height).get_width()
+    def get_size(terminal):
+        return terminal.get_width()
 
     @staticmethod
     def get_start_size(width, height):
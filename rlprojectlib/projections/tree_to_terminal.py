@@ -0,0 +1,88 @@
+from collections import namedtuple
+
+from rlprojectlib.domains.terminal import Terminal
+from rlprojectlib.domains.terminal import TextFragment
+from rlprojectlib.domains.tree import FileHits
+from rlprojectlib.domains.tree import SearchTree
+from rlprojectlib.projections.string_to_terminal import StringToTerminal
+from rlprojectlib.projections.trace import traced
+
+class Meta(
+    namedtuple("Meta", "tree")
+):
+    pass
+
+class TreeToTerminal(Terminal):
+
+    @staticmethod
+    @traced("TreeToTerminal")
+    def project(tree, first_row=0, num_rows=None):
+        """
+        I show every file on one row followed by its matching lines:
+
+        >>> tree = SearchTree.create("/project").merge([
+        ...     FileHits.create("./foo.py", [(0, "this foo is cool", [(5, 3)])]),
+        ...     FileHits.create("./foo/sub.py", [(4, "a sub foo is also cool", [(6, 3)])]),
+        ... ])
+        >>> TreeToTerminal.project(tree).print_ascii_layout()
+        ./foo.py
+            1 this foo is cool
+        ./foo/sub.py
+            5 a sub foo is also cool
+
+        Only the rows in the given range are projected:
+
+        >>> TreeToTerminal.project(tree, first_row=1, num_rows=2).print_ascii_layout()
+            1 this foo is cool
+        ./foo/sub.py
+        """
+        fragments = []
+        cursors = []
+        y = 0
+        row = 0
+        for file in tree.files:
+            if num_rows is not None and y >= num_rows:
+                break
+            if row + 1 + len(file.lines) <= first_row:
+                row += 1 + len(file.lines)
+                continue
+            if row >= first_row:
+                fragments.append(TextFragment(x=0, y=y, text=file.path, fg="BLUE", bold=True))
+                y += 1
+            row += 1
+            for line in file.lines:
+                if num_rows is not None and y >= num_rows:
+                    break
+                if row >= first_row:
+                    number = str(line.row+1)
+                    fragments.append(TextFragment(x=4, y=y, text=number, fg="YELLOW"))
+                    terminal = StringToTerminal.project(line.string, x=5+len(number), y=y)
+                    fragments.extend(terminal.fragments)
+                    cursors.extend(terminal.cursors)
+                    y += 1
+                row += 1
+        return TreeToTerminal.create(
+            fragments=fragments,
+            cursors=cursors,
+            meta=Meta(tree=tree)
+        )
+
+    def size_event(self, event):
+        return self.meta.tree.get_source()
+
+    def keyboard_event(self, event):
+        """
+        >>> from rlprojectlib.domains.terminal import KeyboardEvent
+        >>> tree = SearchTree.create("/project").merge([
+        ...     FileHits.create("./foo.py", [(0, "foo", [(0, 3)])]),
+        ... ])
+        >>> TreeToTerminal.project(tree).keyboard_event(KeyboardEvent("b")).edits
+        (('/project/foo.py', 0, 'foo', 'b'),)
+        """
+        if event.unicode_character and ord(event.unicode_character) >= 32 and event.key is None:
+            return self.meta.tree.replace(event.unicode_character)
+        else:
+            return self.meta.tree.get_source()
+
+    def text_event(self, event):
+        return self.meta.tree.replace(event.text)
@@ -0,0 +1,104 @@
+from rlprojectlib.domains.block_index import BlockIndex
+from rlprojectlib.domains.rope import Rope
+
+class TrigramIndex(BlockIndex):
+
+    """
+    I find the lines of a rope that contain a query.
+
+    Lines are kept in blocks of block_lines lines. I map every three
+    character sequence to the blocks that contain it. Candidates for a query
+    are the blocks that contain all of its trigrams, so only the lines in
+    those blocks are searched. (Indexing blocks instead of lines makes the
+    index many times smaller and faster to build, since nearby lines share
+    most trigrams.)
+
+    >>> index = TrigramIndex(block_lines=2)
+    >>> rope = Rope.from_string("def foo():\\n    pass\\n\\ndef bar():\\n    foo()")
+    >>> index.filter(rope, "foo")
+    (0, 4)
+    >>> index.line(4)
+    '    foo()'
+
+    Typing more of the query narrows the previous result instead of searching
+    all lines again:
+
+    >>> index.filter(rope, "foo(")
+    (0, 4)
+    >>> index.filter(rope, "  foo(")
+    (4,)
+    >>> index.narrowed, index.searched
+    (2, 1)
+
+    Queries shorter than a trigram check every line:
+
+    >>> index.filter(rope, "a")
+    (1, 3)
+
+    When the rope is edited, I re-index only the blocks that the edits
+    touched:
+
+    >>> edited = rope.edit([(4, 7, "bar"), (31, 31, "\\nfoo = 1")])
+    >>> edited
+    'def bar():\\n    pass\\n\\ndef bar():\\nfoo = 1\\n    foo()'
+    >>> index.filter(edited, "foo")
+    (4, 5)
+    >>> index.filter(edited, "bar")
+    (0, 3)
+    >>> [index.block_text(position) for position in range(len(index.blocks))]
+    ['def bar():\\n    pass', '\\ndef bar():', 'foo = 1', '    foo()']
+    >>> index.line(5)
+    '    foo()'
+
+    """
+
+    def __init__(self, block_lines=64):
+        BlockIndex.__init__(self, block_lines)
+        self.last = None
+        self.narrowed = 0
+        self.searched = 0
+
+    def filter(self, rope, query):
+        """
+        Return the sorted rows of the lines that contain query.
+        """
+        self.update(rope)
+        if self.last is not None:
+            last_rope, last_query, last_rows = self.last
+            if last_rope is self.rope and last_query == query:
+                return last_rows
+            if last_rope is self.rope and last_query in query:
+                self.narrowed += 1
+                rows = tuple(
+                    row for row, text in self._rows_texts(last_rows)
+                    if query in text
+                )
+                self.last = (self.rope, query, rows)
+                return rows
+        self.searched += 1
+        rows = self.search(query)
+        self.last = (self.rope, query, rows)
+        return rows
+
+    def search(self, query):
+        # Queries shorter than a trigram have no keys and check all blocks
+        candidates = self.candidates(trigrams(query))
+        starts = self._starts()
+        rows = []
+        for index in candidates:
+            for offset, text in enumerate(self.block_text(index).split("\n")):
+                if query in text:
+                    rows.append(starts[index]+offset)
+        return tuple(rows)
+
+    def keys(self, text):
+        return trigrams(text)
+
+def trigrams(text):
+    """
+    >>> sorted(trigrams("hello"))
+    [('e', 'l', 'l'), ('h', 'e', 'l'), ('l', 'l', 'o')]
+    >>> trigrams("hi")
+    set()
+    """
+    return set(zip(text, text[1:], text[2:]))
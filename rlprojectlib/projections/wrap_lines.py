@@ -0,0 +1,345 @@
+from collections import namedtuple
+from collections import OrderedDict
+import bisect
+import itertools
+
+from rlprojectlib.domains.block_index import RowBlocks
+from rlprojectlib.domains.lines import Line
+from rlprojectlib.domains.lines import Lines
+from rlprojectlib.domains.lines import Position
+from rlprojectlib.domains.lines import Selection
+from rlprojectlib.domains.lines import StyledLine
+from rlprojectlib.domains.rope import Rope
+from rlprojectlib.projections.trace import traced
+
+MAX_LAYOUTS = 4096
+IDLE_BLOCKS = 64
+
+def wrap(text, width):
+    """
+    Return where the rows of text wrapped at width start. A row ends after
+    the last space that fits in it, or at width if no space does.
+
+    >>> wrap("one two three", 8)
+    (0, 8)
+    >>> wrap("five six seven", 8)
+    (0, 5, 9)
+    >>> wrap("abcdefghij", 4)
+    (0, 4, 8)
+    """
+    starts = [0]
+    start = 0
+    while len(text) - start > width:
+        space = text.rfind(" ", start, start+width)
+        if space <= start:
+            start += width
+        else:
+            start = space + 1
+        starts.append(start)
+    return tuple(starts)
+
+class WrapIndex(RowBlocks):
+
+    """
+    I know how many visual rows every line of a rope takes when wrapped to
+    a width.
+
+    Visual rows are counted per block of lines, and prefix sums of the
+    block counts map between logical and visual rows with a bisect. Only
+    the text of blocks that are asked about is read from the rope and
+    wrapped. Other blocks count one visual row per line until idle gets to
+    them:
+
+    >>> index = WrapIndex(block_lines=2)
+    >>> rope = Rope.from_string("one two three\\nfour\\nfive six seven\\nnine")
+    >>> [index.visual_row(rope, 8, row) for row in range(4)]
+    [0, 2, 3, 6]
+    >>> index.visual_row(rope, 8, 2, 6), index.logical_row(rope, 8, 4)
+    (4, (2, 1))
+    >>> index.top_row(rope, 8, 3, 0, 4)
+    2
+
+    So the visual row of a line far into a big rope is found without
+    reading or wrapping the lines before it:
+
+    >>> index = WrapIndex()
+    >>> rope = Rope.from_string("a few words on a line\\n" * 100000)
+    >>> index.visual_row(rope, 10, 90000) > 0, len(index.counts)
+    (True, 1)
+    >>> while index.idle():
+    ...     pass
+    >>> index.visual_row(rope, 10, 90000), len(index.counts)
+    (270000, 1563)
+
+    A new width wraps blocks again when they are asked about:
+
+    >>> index.visual_row(rope, 20, 5), len(index.counts)
+    (10, 1)
+
+    Edits only forget the counts of the blocks they touch:
+
+    >>> _ = index.idle()
+    >>> measured = len(index.counts)
+    >>> index.visual_row(rope.insert(0, "x"), 20, 5), len(index.counts) == measured
+    (10, True)
+
+    Lines that fit are not wrapped and wrapped lines are cached by text and
+    width:
+
+    >>> index.layout("short", 10), index.layout("a few words", 10)
+    ((0,), (0, 6))
+    >>> ("a few words", 10) in index.layouts, ("short", 10) in index.layouts
+    (True, False)
+    """
+
+    def __init__(self, block_lines=64, idle_blocks=IDLE_BLOCKS, max_layouts=MAX_LAYOUTS):
+        RowBlocks.__init__(self, block_lines)
+        self.idle_blocks = idle_blocks
+        self.max_layouts = max_layouts
+        self.layouts = OrderedDict()
+        self.width = None
+        self.counts = {}
+        self.totals = {}
+        self.visual_starts = None
+        self.idle_position = 0
+
+    def layout(self, text, width):
+        """
+        Return where the rows of text wrapped at width start.
+        """
+        if len(text) <= width:
+            return (0,)
+        key = (text, width)
+        if key in self.layouts:
+            self.layouts.move_to_end(key)
+        else:
+            self.layouts[key] = wrap(text, width)
+            if len(self.layouts) > self.max_layouts:
+                self.layouts.popitem(last=False)
+        return self.layouts[key]
+
+    def visual_row(self, rope, width, row, col=0):
+        """
+        Return the visual row that column col of row is shown in.
+        """
+        self._wrap(rope, width)
+        row = max(0, min(row, self.rope.line_count()-1))
+        index = self.block(row)
+        self._measure(index)
+        offset = row - self._starts()[index]
+        text = self.rope[self.rope.line_start(row):self.rope.line_end(row)]
+        piece = bisect.bisect_right(self.layout(text, width), col) - 1
+        return self._visual_starts()[index] + sum(self.counts[self.blocks[index]][:offset]) + piece
+
+    def logical_row(self, rope, width, visual):
+        """
+        Return (row, piece) of the visual row.
+        """
+        self._wrap(rope, width)
+        while True:
+            visual_starts = self._visual_starts()
+            index = min(max(0, bisect.bisect_right(visual_starts, visual) - 1), len(self.blocks)-1)
+            if not self._measure(index):
+                break
+        row = self._starts()[index]
+        piece = max(0, visual - visual_starts[index])
+        for count in self.counts[self.blocks[index]]:
+            if piece < count:
+                return (row, piece)
+            piece -= count
+            row += 1
+        return (row-1, count-1)
+
+    def top_row(self, rope, width, row, col, height):
+        """
+        Return the first row to show so that column col of row is in the
+        last of height visual rows.
+        """
+        self._wrap(rope, width)
+        height = max(height, 1)
+        # Every row takes at least one visual row, so the top is among the
+        # height rows before row
+        for index in range(self.block(max(0, row-height+1)), self.block(row)+1):
+            self._measure(index)
+        top, piece = self.logical_row(rope, width, self.visual_row(rope, width, row, col)-height+1)
+        if piece > 0:
+            top += 1
+        return min(top, row)
+
+    def idle(self):
+        """
+        Wrap some blocks that have not been wrapped. Return True if there
+        were blocks to wrap.
+        """
+        if self.rope is None or self.width is None:
+            return False
+        measured = 0
+        while self.idle_position < len(self.blocks) and measured < self.idle_blocks:
+            if self._measure(self.idle_position):
+                measured += 1
+            self.idle_position += 1
+        return measured > 0
+
+    def _wrap(self, rope, width):
+        self.update(rope)
+        if width != self.width:
+            self.width = width
+            self.counts = {}
+            self.totals = {}
+            self.visual_starts = None
+            self.idle_position = 0
+
+    def _measure(self, index):
+        """
+        Wrap the lines of the block at index unless that is already done.
+        Return True if it was not.
+        """
+        block_id = self.blocks[index]
+        if block_id in self.counts:
+            return False
+        first_row = self._starts()[index]
+        last_row = first_row + self.rows[block_id] - 1
+        texts = self.rope[self.rope.line_start(first_row):self.rope.line_end(last_row)].split("\n")
+        self.counts[block_id] = [
+            1 if len(text) <= self.width else len(wrap(text, self.width))
+            for text in texts
+        ]
+        self.totals[block_id] = sum(self.counts[block_id])
+        if self.totals[block_id] != self.rows[block_id]:
+            self.visual_starts = None
+        return True
+
+    def _total(self, block_id):
+        return self.totals.get(block_id, self.rows[block_id])
+
+    def _visual_starts(self):
+        """
+        The first visual row of every block, followed by the number of
+        visual rows.
+        """
+        if self.visual_starts is None:
+            self.visual_starts = [0]
+            self.visual_starts.extend(itertools.accumulate(
+                self._total(block_id) for block_id in self.blocks
+            ))
+        return self.visual_starts
+
+    def _replace_blocks(self, rope, first, stop, first_row, last_row):
+        RowBlocks._replace_blocks(self, rope, first, stop, first_row, last_row)
+        self.visual_starts = None
+        self.idle_position = min(self.idle_position, first)
+
+    def _remove_blocks(self, first, stop):
+        for block_id in self.blocks[first:stop]:
+            self.counts.pop(block_id, None)
+            self.totals.pop(block_id, None)
+
+    def _clear(self):
+        RowBlocks._clear(self)
+        self.counts = {}
+        self.totals = {}
+
+class Meta(
+    namedtuple("Meta", "lines")
+):
+    pass
+
+class WrapLines(Lines):
+
+    @staticmethod
+    @traced("WrapLines")
+    def project(lines, width, layout=wrap):
+        """
+        I split lines that are longer than width into more rows. Only the
+        first row of a line has a number. Selections are split with the
+        rows:
+
+        >>> WrapLines.project(
+        ...     Lines.create(
+        ...         lines=[
+        ...             StyledLine(text="one two three", number=1, styles=[(4, 10, "GREEN")]),
+        ...             Line(text="four", number=2),
+        ...         ],
+        ...         selections=[
+        ...             Selection(start=Position(row=0, col=2), end=Position(row=0, col=10)),
+        ...             Selection(start=Position(row=0, col=8), end=Position(row=0, col=8)),
+        ...             Selection(start=Position(row=1, col=1), end=Position(row=1, col=1)),
+        ...         ]
+        ...     ),
+        ...     width=8
+        ... ).print_lines_selections()
+        StyledLine(text='one two ', number=1, styles=[(4, 8, 'GREEN')])
+        StyledLine(text='three', number=None, styles=[(0, 2, 'GREEN')])
+        Line(text='four', number=2)
+        Selection(start=Position(row=0, col=2), end=Position(row=0, col=8))
+        Selection(start=Position(row=1, col=0), end=Position(row=1, col=2))
+        Selection(start=Position(row=1, col=0), end=Position(row=1, col=0))
+        Selection(start=Position(row=2, col=1), end=Position(row=2, col=1))
+        """
+        wrapped = []
+        layouts = []
+        first_rows = []
+        for line in lines.lines:
+            starts = layout(line.text, width)
+            layouts.append(starts)
+            first_rows.append(len(wrapped))
+            for piece, start in enumerate(starts):
+                end = starts[piece+1] if piece+1 < len(starts) else len(line.text)
+                number = line.number if piece == 0 else None
+                if isinstance(line, StyledLine):
+                    wrapped.append(StyledLine(
+                        text=line.text[start:end],
+                        number=number,
+                        styles=[
+                            (max(style_start, start)-start, min(style_end, end)-start, fg)
+                            for style_start, style_end, fg in line.styles
+                            if style_start < end and style_end > start
+                        ]
+                    ))
+                else:
+                    wrapped.append(Line(text=line.text[start:end], number=number))
+        def visual(position, is_end):
+            starts = layouts[position.row]
+            piece = bisect.bisect_right(starts, position.col) - 1
+            if is_end and piece > 0 and starts[piece] == position.col:
+                # A selection that ends where a row starts ends in the row before
+                piece -= 1
+            return (first_rows[position.row]+piece, position.col-starts[piece])
+        selections = []
+        for selection in lines.selections:
+            start_row, start_col = visual(selection.start, False)
+            end_row, end_col = visual(selection.end, selection.end != selection.start)
+            for row in range(start_row, end_row+1):
+                selections.append(Selection(
+                    start=Position(row=row, col=start_col if row == start_row else 0),
+                    end=Position(row=row, col=end_col if row == end_row else len(wrapped[row].text))
+                ))
+        return WrapLines.create(
+            lines=wrapped,
+            selections=selections,
+            meta=Meta(lines=lines)
+        )
+
+    def move_cursor_forward(self):
+        return self.meta.lines.move_cursor_forward()
+
+    def move_cursor_back(self):
+        return self.meta.lines.move_cursor_back()
+
+    def move_cursor_down(self, rows=1):
+        return self.meta.lines.move_cursor_down(rows)
+
+    def move_cursor_up(self, rows=1):
+        return self.meta.lines.move_cursor_up(rows)
+
+    def select_next_word(self, words):
+        return self.meta.lines.select_next_word(words)
+
+    def select_all_occurrences(self, words):
+        return self.meta.lines.select_all_occurrences(words)
+
+    def replace(self, text):
+        return self.meta.lines.replace(text)
+
+    def get_source(self):
+        return self.meta.lines.get_source()